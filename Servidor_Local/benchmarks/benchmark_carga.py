@@ -0,0 +1,87 @@
+"""
+Teste de carga: muitos ESP32 simultâneos no GET /data
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Simula N dispositivos enviando leituras ao mesmo tempo (cada um com seu
+device_id e timestamps próprios, então nenhuma leitura é duplicada) e
+mede vazão, latência e erros. Serve para o A/B entre os dois modos:
+
+    python Servidor_Local/serve.py         # modo Flask (porta 8000)
+    python Servidor_Local/serve_async.py   # modo asyncio (porta 8000)
+
+Uso (grava linhas de teste no banco configurado no servidor):
+    python Servidor_Local/benchmarks/benchmark_carga.py [url] [dispositivos] [leituras_por_dispositivo]
+
+Por padrão cada requisição abre uma conexão nova, como o HTTPClient do
+ESP32; use KEEPALIVE=1 para reaproveitar as conexões.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import aiohttp
+
+URL_PADRAO = "http://127.0.0.1:8000"
+
+
+async def dispositivo(sessao, url, indice, leituras, inicio_ts, tempos, erros):
+    """Um ESP32 virtual: envia suas leituras em sequência."""
+    device_id = f"carga-{indice}"
+    for n in range(leituras):
+        timestamp = (inicio_ts + timedelta(seconds=n)).strftime("%Y-%m-%dT%H:%M:%S")
+        params = (f"device_id={device_id}&timestamp={timestamp}&umidade=40.5&temperatura=24.1"
+                  f"&ph=6.5&fosforo=presente&potassio=ausente&rele=off")
+        inicio = time.perf_counter()
+        try:
+            async with sessao.get(f"{url}/data?{params}") as resposta:
+                corpo = await resposta.text()
+                if resposta.status != 200 or corpo != "OK":
+                    erros[f"HTTP {resposta.status}"] = erros.get(f"HTTP {resposta.status}", 0) + 1
+                    continue
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            erros[type(e).__name__] = erros.get(type(e).__name__, 0) + 1
+            continue
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+
+async def executar(url, dispositivos, leituras):
+    keepalive = os.getenv('KEEPALIVE') == '1'
+    conector = aiohttp.TCPConnector(limit=0, force_close=not keepalive)
+    timeout = aiohttp.ClientTimeout(total=60)
+    tempos = []
+    erros = {}
+    # Um dia diferente por execução: repetir o teste não esbarra na idempotência
+    inicio_ts = datetime(2030, 1, 1) + timedelta(seconds=int(time.time()) % 10_000_000)
+
+    async with aiohttp.ClientSession(connector=conector, timeout=timeout) as sessao:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            dispositivo(sessao, url, i, leituras, inicio_ts, tempos, erros) for i in range(dispositivos)
+        ))
+        duracao = time.perf_counter() - inicio
+
+    total = dispositivos * leituras
+    print(f"URL: {url} | dispositivos simultâneos: {dispositivos} | leituras por dispositivo: {leituras}"
+          f" | keep-alive: {'sim' if keepalive else 'não'}")
+    print(f"Requisições: {total} em {duracao:.2f}s -> {len(tempos) / duracao:.0f} leituras OK/s")
+    if tempos:
+        tempos.sort()
+        print(f"Latência ms: média {statistics.mean(tempos):.1f} | p50 {tempos[len(tempos) // 2]:.1f}"
+              f" | p95 {tempos[int(len(tempos) * 0.95) - 1]:.1f} | p99 {tempos[int(len(tempos) * 0.99) - 1]:.1f}"
+              f" | máx {tempos[-1]:.1f}")
+    print(f"Erros: {sum(erros.values())} {erros if erros else ''}")
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else URL_PADRAO
+    dispositivos = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    leituras = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    asyncio.run(executar(url.rstrip('/'), dispositivos, leituras))
+
+
+if __name__ == "__main__":
+    main()
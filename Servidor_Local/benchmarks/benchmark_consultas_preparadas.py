@@ -0,0 +1,123 @@
+"""
+Benchmark: comandos como texto x comandos preparados (PREPARE/EXECUTE)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Executa cada comando frequente do servidor (os registrados em
+serve.consultas) N vezes pelos dois caminhos, na mesma conexão:
+  1. texto      - SQL completo a cada chamada (parse + planejamento sempre)
+  2. preparado  - PREPARE uma vez, depois só EXECUTE nome(...)
+
+Para cada comando mostra o tempo médio por execução visto pelo cliente e
+o tempo no servidor (planejamento + execução) medido com EXPLAIN ANALYZE
+numa amostra das chamadas.
+
+Tudo roda dentro de uma transação desfeita no final: nenhuma linha de
+teste fica no banco.
+
+Uso:
+    python Servidor_Local/benchmarks/benchmark_consultas_preparadas.py [execuções]
+"""
+
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import serve
+
+from consultas_preparadas import ConsultasPreparadas
+from paginacao import DATA_MINIMA, DATA_MAXIMA
+
+DEVICE_ID = 'bench-preparadas'
+AMOSTRA_EXPLAIN = 20
+
+
+def parametros_de(nome, i, inicio):
+    """Parâmetros de teste para a i-ésima execução do comando `nome`."""
+    data_hora = inicio + timedelta(seconds=i)
+    meteo = (data_hora, 24.5, 70.0, 1013.0, 5.0, 'N', 'Ensolarado', 20.0, 0.0, 5.0, 10.0, 'Camopi', 'Benchmark')
+    if nome == 'inserir_leitura':
+        return (DEVICE_ID, data_hora, 40.0, 22.0, 6.5, True, False, False)
+    if nome == 'inserir_meteorologia':
+        return meteo
+    if nome == 'inserir_integrada':
+        return (DEVICE_ID, data_hora, 40.0, 22.0, 6.5, True, False, False,
+                24.5, 70.0, 1013.0, 5.0, 'Ensolarado', 20.0, 0.0, 2.5, 30.0, 4.2)
+    if nome.startswith('listar_leituras'):
+        # Primeira página do /get_data: limite superior aberto, desde o início
+        pagina = (DATA_MAXIMA, 0, DATA_MINIMA, 101)
+        return (DEVICE_ID,) + pagina if nome.endswith('_dispositivo') else pagina
+    if nome.endswith('_dispositivo'):
+        return (DEVICE_ID,)
+    return ()
+
+
+def tempo_servidor(cursor, sql, parametros):
+    """Planejamento + execução (ms) de um EXPLAIN ANALYZE do comando."""
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", parametros)
+    plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return plano[0]['Planning Time'] + plano[0]['Execution Time']
+
+
+def medir(cursor, registro, nome, execucoes, inicio):
+    """Tempo médio no cliente e no servidor (ms) de `execucoes` chamadas de `nome`."""
+    tempos = []
+    for i in range(execucoes):
+        parametros = parametros_de(nome, i, inicio)
+        antes = time.perf_counter()
+        registro.executar(cursor, nome, parametros)
+        if cursor.description:
+            cursor.fetchall()
+        tempos.append((time.perf_counter() - antes) * 1000)
+
+    servidor = []
+    for i in range(execucoes, execucoes + AMOSTRA_EXPLAIN):
+        parametros = parametros_de(nome, i, inicio)
+        if registro.ativo:
+            marcadores = ', '.join(['%s'] * len(parametros))
+            sql = f"EXECUTE {nome} ({marcadores})" if parametros else f"EXECUTE {nome}"
+            servidor.append(tempo_servidor(cursor, sql, parametros))
+        else:
+            sql = registro.sql(nome)
+            for posicao in range(len(parametros), 0, -1):
+                sql = sql.replace(f"${posicao}", "%s")
+            servidor.append(tempo_servidor(cursor, sql, parametros))
+    return statistics.mean(tempos), statistics.mean(servidor)
+
+
+def main():
+    execucoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    texto = ConsultasPreparadas(ativo=False)
+    preparado = ConsultasPreparadas(ativo=True)
+    for nome in serve.consultas.nomes():
+        texto.registrar(nome, serve.consultas.sql(nome))
+        preparado.registrar(nome, serve.consultas.sql(nome))
+
+    # Timestamps longe dos dados reais (e desfeitos no final de qualquer forma)
+    inicio = datetime(2040, 1, 1)
+    with serve.conexao_pool() as (conn, cursor):
+        print(f"\n{execucoes} execuções por comando ({AMOSTRA_EXPLAIN} com EXPLAIN ANALYZE para o tempo no servidor)\n")
+        print(f"{'comando':<36} {'texto cliente':>14} {'prep. cliente':>14} {'texto servidor':>15} {'prep. servidor':>15}")
+        try:
+            for nome in serve.consultas.nomes():
+                # Inserts da mesma execução repetem os timestamps: ON CONFLICT resolve a leitura,
+                # e as outras tabelas só recebem linhas que a transação desfaz
+                cliente_texto, servidor_texto = medir(cursor, texto, nome, execucoes, inicio)
+                cliente_prep, servidor_prep = medir(cursor, preparado, nome, execucoes, inicio)
+                print(f"{nome:<36} {cliente_texto:11.3f} ms {cliente_prep:11.3f} ms "
+                      f"{servidor_texto:12.3f} ms {servidor_prep:12.3f} ms")
+        finally:
+            conn.rollback()
+
+
+if __name__ == "__main__":
+    main()
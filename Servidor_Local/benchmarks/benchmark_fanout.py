@@ -0,0 +1,72 @@
+"""
+Benchmark: escrita fan-out (1 round-trip) x caminho atual do /data
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Compara, leitura a leitura, o custo de gravar sensores + meteorologia +
+leitura integrada por três caminhos:
+  1. atual     - inserir_dados_ultra_rapido + processar_meteorologia_background
+  2. completo  - inserir_dados_completo (uma transação, conexão avulsa)
+  3. fanout    - inserir_dados_fanout (um comando CTE, conexão do pool)
+
+Uso (grava linhas de teste no banco configurado):
+    python Servidor_Local/benchmarks/benchmark_fanout.py [leituras]
+
+A diferença cresce com a latência de rede até o PostgreSQL: rode contra
+o servidor real para ver o ganho de round-trips.
+"""
+
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import serve
+
+
+def medir(nome, funcao, leituras):
+    """Executa funcao para cada leitura e imprime média, p50 e p95 em ms."""
+    tempos = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for leitura in leituras:
+            inicio = time.perf_counter()
+            funcao(*leitura)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[int(len(tempos) * 0.95) - 1]
+    print(f"{nome:<10} média {statistics.mean(tempos):7.2f} ms | "
+          f"p50 {statistics.median(tempos):7.2f} ms | p95 {p95:7.2f} ms")
+    return statistics.mean(tempos)
+
+
+def caminho_atual(umidade, temperatura, ph, fosforo, potassio, bomba, timestamp):
+    """Insert do sensor pelo pool + gravação meteorológica (executada aqui de forma síncrona)."""
+    if serve.inserir_dados_ultra_rapido(umidade, temperatura, ph, fosforo, potassio, bomba, timestamp):
+        serve.processar_meteorologia_background(umidade, temperatura, ph, fosforo, potassio, bomba, timestamp)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if not serve.inicializar_pool_conexoes():
+        print("Não foi possível inicializar o pool de conexões")
+        return
+
+    leituras = [
+        (40.0 + i % 30, 20.0 + i % 10, 6.0 + (i % 3) * 0.5, i % 2 == 0, i % 3 == 0, i % 5 == 0,
+         f"2030-01-01T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}")
+        for i in range(total)
+    ]
+
+    print(f"Leituras por caminho: {total} | Banco: {serve.DatabaseConfig.HOST}/{serve.DatabaseConfig.DATABASE}")
+    atual = medir("atual", caminho_atual, leituras)
+    medir("completo", serve.inserir_dados_completo, leituras)
+    fanout = medir("fanout", serve.inserir_dados_fanout, leituras)
+    print(f"Ganho do fan-out sobre o caminho atual: {atual / fanout:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: formato por linhas x colunar no /get_data e no /integrated_data
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Para cada rota, tamanho de página e formato (?format=rows, columns e, com
+pyarrow instalado, arrow) mede, do ponto de vista do dashboard:
+  - tamanho da resposta (bytes);
+  - tempo de ponta a ponta: requisição, consulta e serialização no servidor,
+    transferência e montagem do DataFrame no cliente (mediana de N chamadas).
+
+Cada chamada leva um parâmetro `_` diferente para não sair do cache de
+respostas do servidor (cache_respostas.py): o que se mede é o caminho
+completo, com consulta e serialização.
+
+Uso (com o servidor rodando, serve.py ou serve_async.py; só leitura):
+    python Servidor_Local/benchmarks/benchmark_formato_colunar.py [url] [repetições] [limites]
+
+limites: tamanhos de página separados por vírgula (padrão 100,1000; o
+servidor corta em GET_DATA_LIMITE_MAX).
+"""
+
+import json
+import statistics
+import sys
+import time
+import urllib.request
+from urllib.parse import urlencode
+
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+URL_PADRAO = "http://127.0.0.1:8000"
+ROTAS = ('/get_data', '/integrated_data')
+
+
+def para_dataframe(formato, corpo):
+    """Monta o DataFrame como o dashboard faria com cada formato."""
+    if formato == 'arrow':
+        return pyarrow.ipc.open_stream(corpo).read_all().to_pandas()
+    dados = json.loads(corpo)
+    if formato == 'columns':
+        return pd.DataFrame(dados['dados'], columns=dados['colunas'])
+    return pd.DataFrame(dados['dados'])
+
+
+def medir(url, rota, formato, limite, repeticoes):
+    """Retorna (bytes, mediana ms, linhas) de `repeticoes` chamadas."""
+    tempos = []
+    tamanho = linhas = 0
+    for i in range(repeticoes):
+        consulta = urlencode({'limit': limite, 'format': formato, '_': f"{time.time_ns()}-{i}"})
+        inicio = time.perf_counter()
+        with urllib.request.urlopen(f"{url}{rota}?{consulta}", timeout=60) as resposta:
+            corpo = resposta.read()
+        df = para_dataframe(formato, corpo)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        tamanho, linhas = len(corpo), len(df)
+    return tamanho, statistics.median(tempos), linhas
+
+
+def main():
+    url = sys.argv[1] if len(sys.argv) > 1 else URL_PADRAO
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    limites = [int(valor) for valor in sys.argv[3].split(',')] if len(sys.argv) > 3 else [100, 1000]
+    formatos = ['rows', 'columns'] + (['arrow'] if pyarrow is not None else [])
+
+    print(f"URL: {url} | repetições: {repeticoes} | formatos: {', '.join(formatos)}")
+    if pyarrow is None:
+        print("(pyarrow não instalado: format=arrow fica de fora)")
+    print(f"{'rota':<17} {'limite':>6} {'formato':<8} {'linhas':>6} {'bytes':>10} {'x rows':>7} {'ms':>8} {'x rows':>7}")
+    for rota in ROTAS:
+        for limite in limites:
+            base = None
+            for formato in formatos:
+                medir(url, rota, formato, limite, 1)   # Aquecimento
+                tamanho, ms, linhas = medir(url, rota, formato, limite, repeticoes)
+                base = base or (tamanho, ms)
+                print(f"{rota:<17} {limite:>6} {formato:<8} {linhas:>6} {tamanho:>10} {tamanho / base[0]:>7.2f}"
+                      f" {ms:>8.2f} {ms / base[1]:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Microbenchmark: decodificação do GET /data
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Compara o custo de CPU por requisição de:
+  1. antigo - request.args.get x8, float() repetido, converter_para_boolean
+              com lower()/strip() e lista, strptime no insert e no background
+  2. novo   - leitura.decodificar_leitura sobre a query string bruta
+
+Antes de medir confere o resultado do decodificador (timestamps com fuso
+viram horário local sem fuso; formatos incompletos são recusados).
+
+Não acessa o banco. Uso:
+    python Servidor_Local/benchmarks/benchmark_parse_leitura.py [iteracoes]
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leitura import decodificar_leitura
+
+QUERY_ESP32 = ("timestamp=2025-06-01T14:32:07&umidade=38.5&temperatura=24.1&ph=6"
+               "&fosforo=presente&potassio=ausente&rele=on")
+
+
+def _converter_para_boolean_original(valor):
+    """Cópia da conversão original do serve.py."""
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, str):
+        valor = valor.lower().strip()
+        return valor in ['true', 'presente', 'on', '1', 'yes', 'sim']
+    return False
+
+
+def caminho_antigo(environ):
+    """Reproduz o trabalho que o /data fazia por requisição antes do decodificador."""
+    request = Request(environ)
+    timestamp = request.args.get('timestamp')
+    umidade = request.args.get('umidade')
+    temperatura = request.args.get('temperatura')
+    ph = request.args.get('ph')
+    fosforo = request.args.get('fosforo')
+    potassio = request.args.get('potassio')
+    rele = request.args.get('rele')
+    bomba_dagua = request.args.get('bomba_dagua')
+    bomba_param = rele if rele is not None else bomba_dagua
+
+    if umidade and temperatura and ph and fosforo and potassio and bomba_param:
+        fosforo_bool = _converter_para_boolean_original(fosforo)
+        potassio_bool = _converter_para_boolean_original(potassio)
+        bomba_bool = _converter_para_boolean_original(bomba_param)
+        # Insert
+        insert = (datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S"),
+                  float(umidade), float(temperatura), float(ph), fosforo_bool, potassio_bool, bomba_bool)
+        # Argumentos da thread + strptime de novo no background
+        background = (float(umidade), float(temperatura), float(ph), fosforo_bool, potassio_bool, bomba_bool,
+                      datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S"))
+        return insert, background
+    return None
+
+
+def caminho_novo(environ):
+    """Decodificador dedicado: cada campo convertido uma vez, Leitura compartilhada."""
+    request = Request(environ)
+    return decodificar_leitura(request.query_string, 'esp32')
+
+
+def somente_request(environ):
+    """Custo fixo de criar o objeto Request (descontado dos dois caminhos)."""
+    return Request(environ)
+
+
+def medir(funcao, environ, iteracoes):
+    """Melhor de 5 rodadas, em microssegundos por requisição."""
+    tempos = timeit.repeat(lambda: funcao(environ), number=iteracoes, repeat=5)
+    return min(tempos) / iteracoes * 1e6
+
+
+def conferir():
+    """Falha (AssertionError) se o decodificador divergir do contrato do /data."""
+    campos = "&umidade=38.5&temperatura=24.1&ph=6&fosforo=presente&potassio=ausente&rele=on"
+    leitura = decodificar_leitura(QUERY_ESP32.encode(), 'esp32')
+    assert leitura.data_hora_leitura == datetime(2025, 6, 1, 14, 32, 7)
+    # UTC (Z) e offsets explícitos: convertidos para America/Sao_Paulo, sem fuso (coluna TIMESTAMP)
+    for timestamp in ("2025-06-01T17:32:07Z", "2025-06-01T14:32:07-03:00", "2025-06-01T19:32:07%2B02:00"):
+        data = decodificar_leitura(f"timestamp={timestamp}{campos}".encode(), 'esp32').data_hora_leitura
+        assert data == datetime(2025, 6, 1, 14, 32, 7) and data.tzinfo is None, (timestamp, data)
+    # Formatos incompletos não viram meia-noite: a leitura usa o horário do servidor
+    for timestamp in ("20250601", "2025-W22-7", "2025-06-01"):
+        data = decodificar_leitura(f"timestamp={timestamp}{campos}".encode(), 'esp32').data_hora_leitura
+        assert data.date() == datetime.now().date(), (timestamp, data)
+
+
+def main():
+    conferir()
+    iteracoes = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    environ = EnvironBuilder(path='/data', query_string=QUERY_ESP32).get_environ()
+
+    base = medir(somente_request, environ, iteracoes)
+    antigo = medir(caminho_antigo, environ, iteracoes) - base
+    novo = medir(caminho_novo, environ, iteracoes) - base
+
+    print(f"Query: {QUERY_ESP32}")
+    print(f"Iterações: {iteracoes} (melhor de 5, sem o custo de criar o Request: {base:.2f} us)")
+    print(f"antigo  {antigo:7.2f} us/requisição")
+    print(f"novo    {novo:7.2f} us/requisição")
+    print(f"CPU economizada: {antigo - novo:.2f} us/requisição ({antigo / novo:.1f}x mais rápido)")
+
+
+if __name__ == "__main__":
+    main()
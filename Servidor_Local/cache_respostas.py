@@ -0,0 +1,200 @@
+"""
+Cache de respostas com ETag para as rotas de leitura
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O plotter, o dashboard e o run_streamlit.py consultam /get_data, /stats e
+/integrated_data a cada poucos segundos, e cada chamada refazia a consulta
+e a serialização mesmo sem nenhuma leitura nova.
+
+CacheRespostas guarda o corpo já serializado de cada (rota, parâmetros)
+junto com a versão das tabelas que a resposta leu. A versão de uma tabela
+muda quando:
+  - este processo grava nela (invalidar(), chamado pela ingestão);
+  - chega um aviso de alteração pelo LISTEN do canal do schema
+    (config/avisos_alteracao.py), vindo de qualquer processo ou cliente.
+Enquanto as versões não mudam, a resposta sai do dicionário, sem tocar no
+banco. O ETag é o hash do corpo (igual em todos os workers), e um
+If-None-Match que confere recebe 304 sem corpo.
+
+Sem a conexão do LISTEN (banco fora, disjuntor aberto) o processo não tem
+como saber de gravações de fora, então o cache fica desligado até ela
+voltar; ao reconectar todas as versões avançam (avisos perdidos no meio).
+`validade` limita a idade de uma entrada (com réplica de leitura, uma
+resposta pode ter saído da réplica um pouco atrasada).
+"""
+
+import hashlib
+import os
+import select
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+Entrada = namedtuple('Entrada', 'versao etag corpo mimetype criada_em')
+
+
+def etag_de(corpo):
+    """ETag forte do corpo (mesmo corpo, mesmo ETag, em qualquer processo)."""
+    return '"' + hashlib.blake2b(corpo, digest_size=12).hexdigest() + '"'
+
+
+def etag_confere(if_none_match, etag):
+    """True se o cabeçalho If-None-Match contém o ETag (ou '*')."""
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(',')]
+    return '*' in candidatos or etag in candidatos or f"W/{etag}" in candidatos
+
+
+class CacheRespostas:
+    """
+    Respostas serializadas por chave, válidas enquanto as tabelas lidas não mudarem.
+
+    conectar: função sem argumentos que abre uma conexão psycopg2 dedicada ao LISTEN.
+    banco_em_falha: função sem argumentos; True evita tentar reconectar o LISTEN.
+    """
+
+    def __init__(self, conectar, canal, capacidade=256, validade=30.0, ativo=True,
+                 banco_em_falha=None, intervalo_tentativa=5.0):
+        self._conectar = conectar
+        self.canal = canal
+        self.capacidade = max(1, capacidade)
+        self.validade = validade
+        self.ativo = ativo
+        self._banco_em_falha = banco_em_falha or (lambda: False)
+        self.intervalo_tentativa = intervalo_tentativa
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()   # chave -> Entrada (LRU)
+        self._versoes = {}               # tabela -> contador
+        self._geracao = 0                # Avança em invalidar_tudo()
+        self._ouvindo = False
+        self._thread = None
+        self._pid_thread = None
+        self._parando = False
+        self._acordar = threading.Event()
+
+        # Contadores
+        self.acertos = 0
+        self.falhas = 0
+        self.respostas_304 = 0
+        self.avisos_recebidos = 0
+        self.reconexoes = 0
+
+    def disponivel(self):
+        """True se o cache pode responder (ativo e ouvindo os avisos de alteração)."""
+        return self.ativo and self._ouvindo
+
+    def iniciar(self):
+        """Inicia a thread do LISTEN (idempotente; recriada depois de um fork)."""
+        if not self.ativo:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid_thread == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid_thread == os.getpid():
+                return
+            # Depois de um fork a thread e a conexão do pai não existem aqui
+            self._ouvindo = False
+            self._entradas.clear()
+            self._parando = False
+            self._acordar.clear()
+            self._pid_thread = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="cache-listen", daemon=True)
+            self._thread.start()
+
+    def parar(self, timeout=5.0):
+        """Encerra a thread do LISTEN."""
+        self._parando = True
+        self._acordar.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid_thread == os.getpid():
+            self._thread.join(timeout)
+
+    def versao(self, tabelas):
+        """Versão atual do conjunto de tabelas (leia ANTES de consultar o banco)."""
+        with self._lock:
+            return (self._geracao,) + tuple(self._versoes.get(tabela, 0) for tabela in tabelas)
+
+    def invalidar(self, *tabelas):
+        """Avança a versão das tabelas: respostas que as leram deixam de valer."""
+        with self._lock:
+            for tabela in tabelas:
+                self._versoes[tabela] = self._versoes.get(tabela, 0) + 1
+
+    def invalidar_tudo(self):
+        with self._lock:
+            self._geracao += 1
+            self._entradas.clear()
+
+    def obter(self, chave, versao):
+        """Entrada da chave se ainda vale para `versao`, senão None."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada.versao == versao and \
+                    time.monotonic() - entrada.criada_em < self.validade:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada
+            self.falhas += 1
+            return None
+
+    def guardar(self, chave, versao, corpo, mimetype):
+        """Guarda a resposta gerada com as tabelas em `versao`; retorna a Entrada (com o ETag)."""
+        entrada = Entrada(versao, etag_de(corpo), corpo, mimetype, time.monotonic())
+        with self._lock:
+            self._entradas[chave] = entrada
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+        return entrada
+
+    def _loop(self):
+        while not self._parando:
+            conn = None
+            try:
+                if not self._banco_em_falha():
+                    conn = self._conectar()
+                    conn.autocommit = True
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"LISTEN {self.canal}")
+                    # Avisos anteriores a esta conexão se perderam
+                    self.invalidar_tudo()
+                    self.reconexoes += 1
+                    self._ouvindo = True
+                    while not self._parando:
+                        if select.select([conn], [], [], 1.0) == ([], [], []):
+                            continue
+                        conn.poll()
+                        tabelas = set()
+                        while conn.notifies:
+                            tabelas.add(conn.notifies.pop(0).payload)
+                        if tabelas:
+                            self.avisos_recebidos += len(tabelas)
+                            self.invalidar(*tabelas)
+            except Exception as e:
+                if not self._parando:
+                    print(f"CACHE: LISTEN {self.canal} interrompido: {e}")
+            finally:
+                self._ouvindo = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._acordar.wait(self.intervalo_tentativa)
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do cache."""
+        total = self.acertos + self.falhas
+        return {
+            "ativo": self.ativo,
+            "ouvindo": self._ouvindo,
+            "entradas": len(self._entradas),
+            "capacidade": self.capacidade,
+            "validade_s": self.validade,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": round(self.acertos / total, 3) if total else None,
+            "respostas_304": self.respostas_304,
+            "avisos_recebidos": self.avisos_recebidos,
+            "reconexoes": self.reconexoes
+        }
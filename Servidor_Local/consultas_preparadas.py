@@ -0,0 +1,101 @@
+"""
+Registro de comandos preparados no servidor (PREPARE/EXECUTE)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Os comandos mais executados do servidor (INSERT das leituras, INSERTs da
+meteorologia e da leitura integrada, SELECTs do /get_data e do /stats) eram
+enviados como texto a cada chamada, e o PostgreSQL fazia parse e
+planejamento de novo toda vez. Aqui cada comando é registrado uma vez, com
+parâmetros $1..$n, e preparado uma única vez em cada conexão física do pool
+(PREPARE nome AS ...). As chamadas seguintes só fazem EXECUTE nome(...).
+
+Uso:
+    consultas = ConsultasPreparadas()
+    consultas.registrar('inserir_leitura', "INSERT INTO ... VALUES ($1, $2)")
+    consultas.executar(cursor, 'inserir_leitura', (valor1, valor2))
+
+Com ativo=False o mesmo registro envia o comando como texto (para
+comparação ou para poolers que não mantêm a sessão, como PgBouncer em
+modo transaction).
+"""
+
+import re
+import threading
+import weakref
+
+import psycopg2
+
+PARAMETRO = re.compile(r'\$(\d+)')
+
+
+class ConsultasPreparadas:
+    """Comandos nomeados, preparados sob demanda em cada conexão."""
+
+    def __init__(self, ativo=True):
+        self.ativo = ativo
+        self._comandos = {}  # nome -> (sql com $n, sql com %(pN)s, quantidade de parâmetros)
+        self._preparadas = weakref.WeakKeyDictionary()  # conexão -> nomes já preparados nela
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.preparacoes = 0
+        self.execucoes = 0
+
+    def registrar(self, nome, sql):
+        """Registra um comando com parâmetros $1..$n (cada um pode aparecer mais de uma vez)."""
+        if not nome.isidentifier():
+            raise ValueError(f"Nome de comando inválido: {nome}")
+        indices = [int(numero) for numero in PARAMETRO.findall(sql)]
+        quantidade = max(indices) if indices else 0
+        texto = PARAMETRO.sub(lambda m: f"%(p{m.group(1)})s", sql.replace('%', '%%'))
+        self._comandos[nome] = (sql, texto, quantidade)
+
+    def nomes(self):
+        """Nomes dos comandos registrados."""
+        return list(self._comandos)
+
+    def sql(self, nome):
+        """SQL registrado (com $1..$n) do comando `nome`."""
+        return self._comandos[nome][0]
+
+    def executar(self, cursor, nome, parametros=()):
+        """Executa o comando `nome` no cursor (o resultado fica no cursor, como em cursor.execute)."""
+        sql, texto, quantidade = self._comandos[nome]
+        if len(parametros) != quantidade:
+            raise ValueError(f"{nome}: esperava {quantidade} parâmetros, recebeu {len(parametros)}")
+
+        if not self.ativo:
+            cursor.execute(texto, {f"p{i}": valor for i, valor in enumerate(parametros, 1)})
+            self.execucoes += 1
+            return
+
+        conn = cursor.connection
+        with self._lock:
+            preparadas = self._preparadas.get(conn)
+            if preparadas is None:
+                preparadas = self._preparadas[conn] = set()
+        if nome not in preparadas:
+            cursor.execute(f"PREPARE {nome} AS {sql}")
+            preparadas.add(nome)
+            self.preparacoes += 1
+
+        try:
+            if quantidade:
+                cursor.execute(f"EXECUTE {nome} ({', '.join(['%s'] * quantidade)})", parametros)
+            else:
+                cursor.execute(f"EXECUTE {nome}")
+        except psycopg2.errors.InvalidSqlStatementName:
+            # A sessão perdeu os comandos preparados (DISCARD ALL, pooler): prepara de novo no próximo uso
+            preparadas.clear()
+            raise
+        self.execucoes += 1
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do registro."""
+        return {
+            "ativo": self.ativo,
+            "comandos_registrados": len(self._comandos),
+            "conexoes_com_preparados": len(self._preparadas),
+            "preparacoes": self.preparacoes,
+            "execucoes": self.execucoes
+        }
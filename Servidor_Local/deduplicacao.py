@@ -0,0 +1,49 @@
+"""
+Supressão de leituras duplicadas em memória
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Quando o HTTP estoura o timeout o ESP32 reenvia a mesma leitura. O filtro
+guarda as chaves (device_id, data_hora_leitura) gravadas recentemente e
+permite descartar o reenvio sem ir ao banco. O índice único em
+leituras_sensores continua garantindo a correção quando a chave já saiu
+do filtro (ou depois de um restart).
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class FiltroDuplicatas:
+    """Conjunto LRU limitado das chaves de leitura vistas recentemente."""
+
+    def __init__(self, capacidade=100000):
+        self.capacidade = max(1, capacidade)
+        self._chaves = OrderedDict()
+        self._lock = threading.Lock()
+        self.descartadas = 0
+
+    def contem(self, chave):
+        """True se a chave já foi gravada (conta como descarte e renova a posição no LRU)."""
+        with self._lock:
+            if chave in self._chaves:
+                self._chaves.move_to_end(chave)
+                self.descartadas += 1
+                return True
+            return False
+
+    def adicionar(self, chave):
+        """Registra uma chave gravada com sucesso, removendo as mais antigas se necessário."""
+        with self._lock:
+            self._chaves[chave] = None
+            self._chaves.move_to_end(chave)
+            while len(self._chaves) > self.capacidade:
+                self._chaves.popitem(last=False)
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do filtro."""
+        with self._lock:
+            return {
+                "chaves": len(self._chaves),
+                "capacidade": self.capacidade,
+                "duplicadas_descartadas": self.descartadas
+            }
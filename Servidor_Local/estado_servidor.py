@@ -0,0 +1,148 @@
+"""
+Estado do servidor em memória para o /status
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O /status lia e serializava a tabela inteira só para informar o total de
+registros e o último registro, e ainda abria outra conexão para testar o
+banco. Como o run_streamlit.py e balanceadores consultam o /status o tempo
+todo, ele precisa responder em tempo constante, qualquer que seja o volume.
+
+EstadoServidor guarda em memória:
+  - a última leitura de cada dispositivo (atualizada a cada gravação);
+  - estimativas de linhas por tabela, lidas do catálogo (pg_stat_user_tables /
+    pg_class, sem COUNT(*)) por uma thread a cada `intervalo` segundos;
+  - se essa atualização conseguiu falar com o banco.
+O /status só monta a resposta a partir disso, sem tocar no banco.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# Linhas estimadas pelo catálogo: n_live_tup (atualizado a cada commit) quando houver
+# estatística; reltuples (último VACUUM/ANALYZE) para tabelas ainda sem estatística.
+SQL_ESTIMATIVAS = """
+    SELECT c.relname, COALESCE(NULLIF(s.n_live_tup, 0), GREATEST(c.reltuples, 0))::bigint
+    FROM pg_class c
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE c.relnamespace = to_regnamespace(%s) AND c.relname = ANY(%s)
+"""
+
+TABELAS = ('leituras_sensores', 'dados_meteorologicos', 'leituras_integradas')
+
+
+class EstadoServidor:
+    """
+    Estado do /status mantido em memória.
+
+    conexao: função sem argumentos que retorna um context manager (conn, cursor) no primário.
+    ultima_leitura_banco: função (cursor) -> Leitura mais recente gravada, ou None (usada uma
+    vez, para o /status ter um último registro logo depois de reiniciar o servidor).
+    """
+
+    def __init__(self, conexao, schema, ultima_leitura_banco=None, intervalo=15.0, max_dispositivos=10000):
+        self.conexao = conexao
+        self.schema = schema
+        self.ultima_leitura_banco = ultima_leitura_banco
+        self.intervalo = intervalo
+        self.max_dispositivos = max(1, max_dispositivos)
+        self._lock = threading.Lock()
+        self._por_dispositivo = OrderedDict()  # device_id -> Leitura (LRU: o mais antigo sai primeiro)
+        self._ultima = None
+        self._thread = None
+        self._acordar = threading.Event()
+        self._parando = False
+        self._seed_feito = ultima_leitura_banco is None
+
+        # Última atualização do catálogo
+        self.estimativas = {}
+        self.banco_ok = None                # None até a primeira atualização
+        self.atualizado_em = None
+        self.duracao_atualizacao_ms = None
+
+        # Contadores
+        self.leituras_registradas = 0
+        self.iniciado_em = datetime.now()
+
+    def iniciar(self):
+        """Inicia a thread de atualização (idempotente; recriada depois de um fork)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._parando = False
+            self._thread = threading.Thread(target=self._loop, name="estado-servidor", daemon=True)
+            self._thread.start()
+
+    def registrar(self, leituras):
+        """Anota leituras aceitas pela ingestão (última por dispositivo e última geral)."""
+        with self._lock:
+            for leitura in leituras:
+                self.leituras_registradas += 1
+                anterior = self._por_dispositivo.get(leitura.device_id)
+                if anterior is None or leitura.data_hora_leitura >= anterior.data_hora_leitura:
+                    self._por_dispositivo[leitura.device_id] = leitura
+                    self._por_dispositivo.move_to_end(leitura.device_id)
+                    if len(self._por_dispositivo) > self.max_dispositivos:
+                        self._por_dispositivo.popitem(last=False)
+                if self._ultima is None or leitura.data_hora_leitura >= self._ultima.data_hora_leitura:
+                    self._ultima = leitura
+
+    def ultima_leitura(self, device_id=None):
+        """Última leitura geral ou de um dispositivo (None se ainda não houver)."""
+        with self._lock:
+            if device_id is None:
+                return self._ultima
+            return self._por_dispositivo.get(device_id)
+
+    def dispositivos(self):
+        return len(self._por_dispositivo)
+
+    def atualizar(self):
+        """Lê as estimativas do catálogo (e, na primeira vez, a última leitura gravada)."""
+        inicio = time.perf_counter()
+        try:
+            with self.conexao() as (conn, cursor):
+                cursor.execute(SQL_ESTIMATIVAS, (self.schema, list(TABELAS)))
+                self.estimativas = {tabela: linhas for tabela, linhas in cursor.fetchall()}
+                if not self._seed_feito:
+                    leitura = self.ultima_leitura_banco(cursor)
+                    if leitura is not None:
+                        with self._lock:
+                            if self._ultima is None:
+                                self._ultima = leitura
+                                self._por_dispositivo.setdefault(leitura.device_id, leitura)
+                    self._seed_feito = True
+            self.banco_ok = True
+        except Exception as e:
+            print(f"STATUS: erro ao atualizar estimativas: {e}")
+            self.banco_ok = False
+        self.atualizado_em = datetime.now()
+        self.duracao_atualizacao_ms = round((time.perf_counter() - inicio) * 1000, 2)
+
+    def _loop(self):
+        while not self._parando:
+            self.atualizar()
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def parar(self, timeout=5.0):
+        """Encerra a thread de atualização."""
+        self._parando = True
+        self._acordar.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual (sem a lista de dispositivos)."""
+        return {
+            "dispositivos": len(self._por_dispositivo),
+            "leituras_registradas": self.leituras_registradas,
+            "estimativas": self.estimativas,
+            "banco_ok": self.banco_ok,
+            "atualizado_em": self.atualizado_em.isoformat() if self.atualizado_em else None,
+            "duracao_atualizacao_ms": self.duracao_atualizacao_ms,
+            "intervalo_s": self.intervalo
+        }
@@ -0,0 +1,124 @@
+"""
+Executor limitado para o pós-processamento em background
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Substitui o "uma thread nova por requisição" por um número fixo de
+workers consumindo uma fila limitada. Quando a fila enche, a tarefa é
+descartada (shed) ou o chamador espera um tempo máximo (block).
+"""
+
+import queue
+import threading
+import time
+
+# Políticas quando a fila está cheia
+POLITICA_DESCARTAR = 'descartar'
+POLITICA_BLOQUEAR = 'bloquear'
+
+
+class ExecutorLimitado:
+    """Pool fixo de threads com fila limitada e métricas de profundidade e atraso."""
+
+    def __init__(self, nome, workers=4, tamanho_fila=1000,
+                 politica=POLITICA_DESCARTAR, timeout_bloqueio=1.0):
+        if politica not in (POLITICA_DESCARTAR, POLITICA_BLOQUEAR):
+            raise ValueError(f"Política inválida: {politica}")
+        self.nome = nome
+        self.workers = max(1, workers)
+        self.politica = politica
+        self.timeout_bloqueio = timeout_bloqueio
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.submetidas = 0
+        self.executadas = 0
+        self.descartadas = 0
+        self.falhas = 0
+        self.atraso_ultimo = 0.0
+        self.atraso_maximo = 0.0
+        self._atraso_total = 0.0
+
+    def iniciar(self):
+        """Sobe os workers que ainda não estão rodando (idempotente)."""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.nome}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submeter(self, funcao, *args):
+        """
+        Agenda funcao(*args). Retorna False se a tarefa foi descartada
+        porque a fila estava cheia.
+        """
+        if len(self._threads) < self.workers:
+            self.iniciar()
+
+        tarefa = (funcao, args, time.monotonic())
+        try:
+            if self.politica == POLITICA_BLOQUEAR:
+                self._fila.put(tarefa, timeout=self.timeout_bloqueio)
+            else:
+                self._fila.put_nowait(tarefa)
+        except queue.Full:
+            with self._lock:
+                self.descartadas += 1
+            return False
+
+        with self._lock:
+            self.submetidas += 1
+        return True
+
+    def parar(self, timeout=5.0):
+        """Espera a fila esvaziar e encerra os workers."""
+        for _ in self._threads:
+            try:
+                self._fila.put((None, (), time.monotonic()), timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do executor."""
+        with self._lock:
+            executadas = self.executadas
+            return {
+                "workers": self.workers,
+                "politica": self.politica,
+                "profundidade_fila": self._fila.qsize(),
+                "capacidade_fila": self._fila.maxsize,
+                "submetidas": self.submetidas,
+                "executadas": executadas,
+                "descartadas": self.descartadas,
+                "falhas": self.falhas,
+                "atraso_ultimo_ms": round(self.atraso_ultimo * 1000, 2),
+                "atraso_medio_ms": round(self._atraso_total / executadas * 1000, 2) if executadas else 0.0,
+                "atraso_maximo_ms": round(self.atraso_maximo * 1000, 2)
+            }
+
+    def _worker(self):
+        """Laço de cada worker."""
+        while True:
+            funcao, args, enfileirado_em = self._fila.get()
+            if funcao is None:
+                return
+
+            atraso = time.monotonic() - enfileirado_em
+            try:
+                funcao(*args)
+                falhou = False
+            except Exception as e:
+                print(f"{self.nome.upper()}: erro na tarefa: {e}")
+                falhou = True
+
+            with self._lock:
+                self.executadas += 1
+                self.falhas += falhou
+                self.atraso_ultimo = atraso
+                self._atraso_total += atraso
+                if atraso > self.atraso_maximo:
+                    self.atraso_maximo = atraso
@@ -0,0 +1,218 @@
+"""
+Fila de ingestão write-behind para as leituras do ESP32
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+As leituras recebidas em /data são colocadas numa fila em memória e uma
+thread de gravação agrupa o que estiver pendente em um único INSERT
+multi-linha (ou COPY) por janela de gravação. Assim o custo de round-trip
+e de commit no PostgreSQL é dividido entre todas as leituras do lote.
+
+Com vários ESP32, FilaIngestaoParticionada distribui os dispositivos entre
+algumas filas independentes (cada dispositivo sempre na mesma), de modo
+que um dispositivo com rajada de leituras só atrasa a sua partição.
+"""
+
+import queue
+import threading
+import time
+import zlib
+
+# Modos de confirmação (ack) para o ESP32
+ACK_FILA = 'fila'      # Responde assim que a leitura entra na fila
+ACK_COMMIT = 'commit'  # Responde só depois do commit do lote
+
+
+class _Pendente:
+    """Leitura aguardando gravação (com evento para o modo ACK_COMMIT)."""
+
+    __slots__ = ('registro', 'evento', 'sucesso')
+
+    def __init__(self, registro, aguardar):
+        self.registro = registro
+        self.evento = threading.Event() if aguardar else None
+        self.sucesso = False
+
+
+class FilaIngestao:
+    """
+    Fila em memória com uma thread que grava as leituras em lote.
+
+    gravar_lote: função que recebe uma lista de registros e retorna True
+    se o lote inteiro foi gravado (uma transação, um commit).
+    """
+
+    def __init__(self, gravar_lote, tamanho_lote=500, janela_ms=20,
+                 modo_ack=ACK_COMMIT, capacidade=10000, timeout_ack=5.0, nome="fila-ingestao"):
+        if modo_ack not in (ACK_FILA, ACK_COMMIT):
+            raise ValueError(f"Modo de ack inválido: {modo_ack}")
+        self.nome = nome
+        self.gravar_lote = gravar_lote
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.janela = max(0, janela_ms) / 1000.0
+        self.modo_ack = modo_ack
+        self.timeout_ack = timeout_ack
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._parando = False
+
+        # Contadores simples para diagnóstico
+        self.lotes_gravados = 0
+        self.leituras_gravadas = 0
+        self.leituras_perdidas = 0
+
+    def iniciar(self):
+        """Inicia a thread de gravação (idempotente)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._parando = False
+            self._thread = threading.Thread(target=self._loop, name=self.nome, daemon=True)
+            self._thread.start()
+
+    def enfileirar(self, registro):
+        """
+        Coloca uma leitura na fila.
+        No modo ACK_FILA retorna assim que a leitura foi aceita; no modo
+        ACK_COMMIT bloqueia até o commit do lote que a contém.
+        Retorna True/False indicando sucesso.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self.iniciar()
+
+        pendente = _Pendente(registro, self.modo_ack == ACK_COMMIT)
+        try:
+            self._fila.put_nowait(pendente)
+        except queue.Full:
+            print("FILA: capacidade esgotada, leitura recusada")
+            return False
+
+        if pendente.evento is None:
+            return True
+        if not pendente.evento.wait(self.timeout_ack):
+            print("FILA: timeout aguardando commit do lote")
+            return False
+        return pendente.sucesso
+
+    def tamanho(self):
+        """Quantidade de leituras aguardando gravação."""
+        return self._fila.qsize()
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual da fila."""
+        return {
+            "modo_ack": self.modo_ack,
+            "pendentes": self._fila.qsize(),
+            "capacidade": self._fila.maxsize,
+            "lotes_gravados": self.lotes_gravados,
+            "leituras_gravadas": self.leituras_gravadas,
+            "leituras_perdidas": self.leituras_perdidas
+        }
+
+    def parar(self, timeout=5.0):
+        """Grava o que estiver pendente e encerra a thread."""
+        self._parando = True
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _coletar_lote(self):
+        """Espera a primeira leitura e junta as demais até encher o lote ou fechar a janela."""
+        try:
+            primeiro = self._fila.get(timeout=0.2)
+        except queue.Empty:
+            return []
+
+        lote = [primeiro]
+        limite = time.monotonic() + self.janela
+        while len(lote) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            try:
+                if restante > 0:
+                    lote.append(self._fila.get(timeout=restante))
+                else:
+                    lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        """Laço da thread de gravação."""
+        while True:
+            lote = self._coletar_lote()
+            if not lote:
+                if self._parando:
+                    return
+                continue
+
+            try:
+                sucesso = bool(self.gravar_lote([p.registro for p in lote]))
+            except Exception as e:
+                print(f"FILA: erro ao gravar lote: {e}")
+                sucesso = False
+
+            if sucesso:
+                self.lotes_gravados += 1
+                self.leituras_gravadas += len(lote)
+            else:
+                self.leituras_perdidas += len(lote)
+                print(f"FILA: lote de {len(lote)} leituras não foi gravado")
+
+            for pendente in lote:
+                pendente.sucesso = sucesso
+                if pendente.evento is not None:
+                    pendente.evento.set()
+
+
+def particao_do_dispositivo(device_id, particoes):
+    """Partição fixa de um dispositivo (estável entre processos, ao contrário de hash())."""
+    return zlib.crc32(str(device_id).encode('utf-8')) % particoes
+
+
+class FilaIngestaoParticionada:
+    """
+    Conjunto de FilaIngestao, uma thread de gravação por partição.
+    O registro é roteado pelo device_id (primeiro campo de Leitura.registro()).
+    A capacidade informada é o total, dividida entre as partições.
+    """
+
+    def __init__(self, gravar_lote, particoes=4, **opcoes):
+        self.particoes = max(1, particoes)
+        self.modo_ack = opcoes.get('modo_ack', ACK_COMMIT)
+        if 'capacidade' in opcoes:
+            opcoes['capacidade'] = max(1, opcoes['capacidade'] // self.particoes)
+        self._filas = [
+            FilaIngestao(gravar_lote, nome=f"fila-ingestao-{indice}", **opcoes)
+            for indice in range(self.particoes)
+        ]
+
+    def fila_do_dispositivo(self, device_id):
+        return self._filas[particao_do_dispositivo(device_id, self.particoes)]
+
+    def iniciar(self):
+        for fila in self._filas:
+            fila.iniciar()
+
+    def enfileirar(self, registro):
+        """Coloca a leitura na fila da partição do seu dispositivo (mesmo contrato de FilaIngestao)."""
+        return self.fila_do_dispositivo(registro[0]).enfileirar(registro)
+
+    def tamanho(self):
+        return sum(fila.tamanho() for fila in self._filas)
+
+    def metricas(self):
+        """Totais de todas as partições e a profundidade de cada uma."""
+        por_particao = [fila.metricas() for fila in self._filas]
+        return {
+            "modo_ack": self.modo_ack,
+            "particoes": self.particoes,
+            "pendentes": sum(m["pendentes"] for m in por_particao),
+            "capacidade": sum(m["capacidade"] for m in por_particao),
+            "lotes_gravados": sum(m["lotes_gravados"] for m in por_particao),
+            "leituras_gravadas": sum(m["leituras_gravadas"] for m in por_particao),
+            "leituras_perdidas": sum(m["leituras_perdidas"] for m in por_particao),
+            "pendentes_por_particao": [m["pendentes"] for m in por_particao]
+        }
+
+    def parar(self, timeout=5.0):
+        for fila in self._filas:
+            fila.parar(timeout)
@@ -0,0 +1,77 @@
+"""
+Formato colunar das leituras em lote (?format= do /get_data e do /integrated_data)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+No formato original ("rows") cada leitura vira um dict no servidor e um
+objeto JSON com todos os nomes de campo repetidos, e o dashboard lê a lista
+de objetos só para remontar um DataFrame. Com centenas ou milhares de linhas
+quase todo o custo está nesses objetos por linha.
+
+  ?format=columns  JSON com um array por campo ({"id": [...], "umidade": [...]}),
+                   montado transpondo as tuplas do cursor: cada nome vai uma
+                   vez e pandas.DataFrame(dados) monta as colunas direto.
+  ?format=arrow    Arrow IPC (stream) com as mesmas colunas, tipadas (timestamps
+                   e números em binário). Requer pyarrow no servidor; o envelope
+                   (limite, proximo_cursor, ...) vai nos metadados do schema.
+
+Nos formatos colunares os numeric do PostgreSQL saem como número (no "rows"
+o jsonify os transforma em texto).
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:   # Opcional: sem pyarrow só o format=arrow fica indisponível
+    pyarrow = None
+
+FORMATO_LINHAS = 'rows'
+FORMATO_COLUNAS = 'columns'
+FORMATO_ARROW = 'arrow'
+FORMATOS = (FORMATO_LINHAS, FORMATO_COLUNAS, FORMATO_ARROW)
+MIMETYPE_ARROW = 'application/vnd.apache.arrow.stream'
+
+
+class ErroFormato(ValueError):
+    """?format= inválido ou indisponível neste servidor."""
+
+
+def interpretar_formato(valor):
+    """?format= da query string (padrão: rows)."""
+    formato = valor or FORMATO_LINHAS
+    if formato not in FORMATOS:
+        raise ErroFormato(f"format inválido: {formato!r} (use {', '.join(FORMATOS)})")
+    if formato == FORMATO_ARROW and pyarrow is None:
+        raise ErroFormato("format=arrow requer o pacote pyarrow no servidor (use format=columns)")
+    return formato
+
+
+def _normalizar(valores, datas_em_texto):
+    """Converte a coluna inteira pelo tipo do primeiro valor não nulo: Decimal -> float, datas -> ISO 8601."""
+    amostra = next((valor for valor in valores if valor is not None), None)
+    if isinstance(amostra, Decimal):
+        return [None if valor is None else float(valor) for valor in valores]
+    if datas_em_texto and isinstance(amostra, (datetime, date)):
+        return [None if valor is None else valor.isoformat() for valor in valores]
+    return list(valores)
+
+
+def transpor(colunas, linhas, datas_em_texto=True):
+    """{coluna: [valores]} a partir das tuplas do cursor, sem montar um objeto por linha."""
+    if not linhas:
+        return {nome: [] for nome in colunas}
+    return {nome: _normalizar(valores, datas_em_texto) for nome, valores in zip(colunas, zip(*linhas))}
+
+
+def corpo_arrow(colunas, linhas, metadados=None):
+    """Arrow IPC (stream) das linhas; cada item de `metadados` vai no schema como JSON."""
+    tabela = pyarrow.table(transpor(colunas, linhas, datas_em_texto=False))
+    if metadados:
+        tabela = tabela.replace_schema_metadata({chave: json.dumps(valor) for chave, valor in metadados.items()})
+    saida = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return saida.getvalue().to_pybytes()
@@ -0,0 +1,162 @@
+"""
+Group commit para as gravações síncronas do /data
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Sem a fila write-behind, cada requisição grava a sua leitura e faz o seu
+próprio commit: um flush do WAL (fsync) por leitura. Com centenas de
+ESP32 o disco passa a ser o gargalo, não o INSERT.
+
+GrupoCommit junta as operações que chegam quase ao mesmo tempo numa só
+transação. A primeira requisição de um grupo vira a líder: espera uma
+janela curta (só se há outras requisições em andamento, como o
+commit_siblings do PostgreSQL), executa as operações de todas no mesmo
+cursor e faz UM commit. Cada requisição só recebe o resultado depois
+desse commit, então a durabilidade é a mesma do commit individual.
+
+Se uma operação do grupo falha, a transação é desfeita e as operações são
+refeitas uma a uma (cada uma com seu commit), para que uma leitura ruim
+não derrube as outras do grupo.
+"""
+
+import threading
+
+
+class _Operacao:
+    """Operação aguardando o commit do grupo."""
+
+    __slots__ = ('funcao', 'evento', 'resultado')
+
+    def __init__(self, funcao):
+        self.funcao = funcao
+        self.evento = threading.Event()
+        self.resultado = None
+
+
+class GrupoCommit:
+    """
+    Coordenador de commits compartilhados entre threads.
+
+    obter_conexao: função que retorna (conn, cursor) ou (None, None).
+    devolver_conexao: função que recebe a conexão de volta.
+    """
+
+    def __init__(self, obter_conexao, devolver_conexao, janela_ms=2, tamanho_max=200, timeout=5.0):
+        self.obter_conexao = obter_conexao
+        self.devolver_conexao = devolver_conexao
+        self.janela = max(0, janela_ms) / 1000.0
+        self.tamanho_max = max(1, tamanho_max)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pendentes = []
+        self._lider_ativo = False
+        self._cheio = threading.Event()
+        self._em_andamento = 0
+
+        # Contadores
+        self.grupos = 0
+        self.operacoes = 0
+        self.maior_grupo = 0
+        self.grupos_refeitos = 0
+        self.falhas = 0
+
+    def executar(self, funcao):
+        """
+        Executa funcao(cursor) na próxima transação compartilhada.
+        Retorna o valor de funcao depois do commit, ou None se a operação não foi gravada.
+        """
+        operacao = _Operacao(funcao)
+        with self._lock:
+            self._em_andamento += 1
+            self._pendentes.append(operacao)
+            lider = not self._lider_ativo
+            if lider:
+                self._lider_ativo = True
+                self._cheio.clear()
+            elif len(self._pendentes) >= self.tamanho_max:
+                self._cheio.set()
+        try:
+            if lider:
+                self._conduzir()
+            if not operacao.evento.wait(self.timeout):
+                print("GRUPO COMMIT: timeout aguardando o commit do grupo")
+                return None
+            return operacao.resultado
+        finally:
+            with self._lock:
+                self._em_andamento -= 1
+
+    def _conduzir(self):
+        """Líder: fecha o grupo depois da janela e grava tudo com um commit."""
+        with self._lock:
+            outros = self._em_andamento > 1
+        if outros and self.janela:
+            self._cheio.wait(self.janela)
+
+        with self._lock:
+            grupo = self._pendentes
+            self._pendentes = []
+            # Quem chegar a partir de agora forma o próximo grupo (enquanto este faz o commit)
+            self._lider_ativo = False
+
+        try:
+            self._gravar(grupo)
+        finally:
+            for operacao in grupo:
+                operacao.evento.set()
+
+    def _gravar(self, grupo):
+        conn, cursor = self.obter_conexao()
+        if not conn or not cursor:
+            self.falhas += len(grupo)
+            return
+        try:
+            try:
+                resultados = [operacao.funcao(cursor) for operacao in grupo]
+                conn.commit()
+            except Exception as e:
+                if conn.closed:
+                    print(f"GRUPO COMMIT: conexão perdida, {len(grupo)} operações não gravadas: {e}")
+                    self.falhas += len(grupo)
+                    return
+                conn.rollback()
+                self.grupos_refeitos += 1
+                print(f"GRUPO COMMIT: erro no grupo de {len(grupo)} ({e}); refazendo individualmente")
+                self._gravar_individualmente(conn, cursor, grupo)
+                return
+
+            for operacao, resultado in zip(grupo, resultados):
+                operacao.resultado = resultado
+            self.grupos += 1
+            self.operacoes += len(grupo)
+            self.maior_grupo = max(self.maior_grupo, len(grupo))
+        finally:
+            cursor.close()
+            self.devolver_conexao(conn)
+
+    def _gravar_individualmente(self, conn, cursor, grupo):
+        """Uma transação por operação: só as que falham de novo ficam sem resultado."""
+        for operacao in grupo:
+            try:
+                resultado = operacao.funcao(cursor)
+                conn.commit()
+                operacao.resultado = resultado
+            except Exception as e:
+                self.falhas += 1
+                print(f"GRUPO COMMIT: operação não gravada: {e}")
+                if conn.closed:
+                    return
+                conn.rollback()
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do coordenador."""
+        return {
+            "janela_ms": self.janela * 1000,
+            "grupos": self.grupos,
+            "operacoes": self.operacoes,
+            "media_por_grupo": round(self.operacoes / self.grupos, 2) if self.grupos else 0,
+            "maior_grupo": self.maior_grupo,
+            "commits_economizados": self.operacoes - self.grupos,
+            "grupos_refeitos": self.grupos_refeitos,
+            "falhas": self.falhas,
+            "pendentes": len(self._pendentes)
+        }
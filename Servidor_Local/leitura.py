@@ -0,0 +1,196 @@
+"""
+Decodificação rápida das leituras enviadas pelo ESP32
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O GET /data chega como query string. Em vez de montar o MultiDict do
+Flask e converter cada campo várias vezes ao longo do caminho, a query
+string bruta é lida uma vez, cada campo é convertido uma vez e o
+resultado vira um objeto Leitura (com __slots__) compartilhado pela
+gravação, pela fila e pelo pós-processamento.
+"""
+
+import math
+from datetime import datetime
+from urllib.parse import unquote_to_bytes
+
+import pytz
+
+# Valores aceitos como "verdadeiro" (ESP32 pode enviar 'presente'/'ausente', 'on'/'off', 'true'/'false')
+VALORES_VERDADEIROS = frozenset({'true', 'presente', 'on', '1', 'yes', 'sim'})
+
+# Variações já em bytes, com as grafias mais comuns: evita lower()/strip() no caminho normal
+_VERDADEIROS_BYTES = frozenset(
+    variacao.encode()
+    for valor in VALORES_VERDADEIROS
+    for variacao in (valor, valor.upper(), valor.capitalize())
+)
+_FALSOS_BYTES = frozenset(
+    variacao.encode()
+    for valor in ('false', 'ausente', 'off', '0', 'no', 'nao')
+    for variacao in (valor, valor.upper(), valor.capitalize())
+)
+
+# Posição de cada parâmetro da query string no vetor de valores
+_CAMPOS = {
+    b'timestamp': 0,
+    b'umidade': 1,
+    b'temperatura': 2,
+    b'ph': 3,
+    b'fosforo': 4,
+    b'potassio': 5,
+    b'rele': 6,
+    b'bomba_dagua': 7,
+    b'device_id': 8,
+}
+_TOTAL_CAMPOS = len(_CAMPOS)
+
+# O valor absoluto precisa ficar abaixo destes limites para caber nas colunas de leituras_sensores
+# depois do arredondamento para 2 casas: DECIMAL(5,2) (até 999.99) e DECIMAL(4,2) (até 99.99)
+LIMITES_VALORES = {'umidade': 999.995, 'temperatura': 999.995, 'ph': 99.995}
+TAMANHO_MAX_DEVICE_ID = 64   # VARCHAR(64)
+
+# data_hora_leitura é gravada sem fuso, no horário local: timestamps com fuso (...Z, -03:00)
+# são convertidos para este fuso, como em paginacao.interpretar_data
+FUSO_LEITURAS = pytz.timezone('America/Sao_Paulo')
+
+# Cache "YYYY-MM-DDTHH:MM" -> datetime: leituras do mesmo minuto só convertem os segundos
+_TAMANHO_CACHE_TIMESTAMP = 256
+_cache_prefixo_timestamp = {}
+
+
+class Leitura:
+    """Uma leitura dos sensores já convertida para os tipos do banco."""
+
+    __slots__ = ('device_id', 'data_hora_leitura', 'umidade', 'temperatura', 'ph',
+                 'fosforo', 'potassio', 'bomba_dagua')
+
+    def __init__(self, device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua):
+        self.device_id = device_id
+        self.data_hora_leitura = data_hora_leitura
+        self.umidade = umidade
+        self.temperatura = temperatura
+        self.ph = ph
+        self.fosforo = fosforo
+        self.potassio = potassio
+        self.bomba_dagua = bomba_dagua
+
+    def registro(self):
+        """Tupla na ordem das colunas de leituras_sensores (usada nas gravações em lote)."""
+        return (self.device_id, self.data_hora_leitura, self.umidade, self.temperatura, self.ph,
+                self.fosforo, self.potassio, self.bomba_dagua)
+
+    def chave(self):
+        """Chave de idempotência da leitura: (device_id, data_hora_leitura)."""
+        return (self.device_id, self.data_hora_leitura)
+
+    def __repr__(self):
+        return (f"Leitura({self.device_id}, {self.data_hora_leitura}, umidade={self.umidade}, "
+                f"temperatura={self.temperatura}, ph={self.ph}, fosforo={self.fosforo}, "
+                f"potassio={self.potassio}, bomba={self.bomba_dagua})")
+
+
+def validar_valores(device_id, umidade, temperatura, ph):
+    """
+    Lança ValueError se a leitura não cabe nas colunas do banco: valor não finito (nan, inf),
+    fora do DECIMAL da coluna ou device_id maior que VARCHAR(64). Uma leitura assim
+    derrubaria o INSERT/COPY do lote inteiro em que ela entrasse.
+    """
+    if len(device_id) > TAMANHO_MAX_DEVICE_ID:
+        raise ValueError(f"device_id com mais de {TAMANHO_MAX_DEVICE_ID} caracteres")
+    for nome, valor in (('umidade', umidade), ('temperatura', temperatura), ('ph', ph)):
+        if not math.isfinite(valor) or abs(valor) >= LIMITES_VALORES[nome]:
+            raise ValueError(f"{nome} fora do intervalo aceito pela coluna: {valor!r}")
+
+
+def converter_booleano(valor):
+    """Converte o valor bruto (bytes) de um parâmetro para bool."""
+    if valor in _VERDADEIROS_BYTES:
+        return True
+    if valor in _FALSOS_BYTES:
+        return False
+    return valor.strip().lower().decode('utf-8', 'replace') in VALORES_VERDADEIROS
+
+
+def _formato_completo(valor):
+    """True se `valor` começa com 'YYYY-MM-DDTHH:MM:SS' (ou espaço no lugar do T)."""
+    return (len(valor) >= 19 and valor[4] == 0x2D and valor[7] == 0x2D and valor[10] in (0x54, 0x20)
+            and valor[13] == 0x3A and valor[16] == 0x3A)   # '-', '-', 'T'/' ', ':', ':'
+
+
+def converter_timestamp_bytes(valor):
+    """
+    Converte o timestamp ISO do ESP32 (bytes, 'YYYY-MM-DDTHH:MM:SS' completo, com fração
+    e fuso opcionais) para datetime sem fuso, no horário de FUSO_LEITURAS.
+    Retorna None se o valor for inválido.
+    """
+    if not _formato_completo(valor):
+        return None
+
+    # Caminho rápido: "YYYY-MM-DDTHH:MM:SS" com o prefixo do minuto em cache
+    if len(valor) == 19:
+        prefixo = valor[:16]
+        base = _cache_prefixo_timestamp.get(prefixo)
+        if base is None:
+            try:
+                base = datetime.fromisoformat(prefixo.decode('ascii'))
+            except (ValueError, UnicodeDecodeError):
+                return None
+            if len(_cache_prefixo_timestamp) >= _TAMANHO_CACHE_TIMESTAMP:
+                _cache_prefixo_timestamp.clear()
+            _cache_prefixo_timestamp[prefixo] = base
+        try:
+            return base.replace(second=int(valor[17:]))
+        except ValueError:
+            return None
+
+    try:
+        texto = valor.decode('ascii')
+        if texto.endswith('Z'):
+            texto = texto[:-1] + '+00:00'
+        data = datetime.fromisoformat(texto)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if data.tzinfo is not None:
+        data = data.astimezone(FUSO_LEITURAS).replace(tzinfo=None)
+    return data
+
+
+def decodificar_leitura(query_string, device_id_padrao):
+    """
+    Decodifica a query string bruta do GET /data.
+    device_id_padrao identifica o ESP32 quando a query não traz device_id.
+    Retorna uma Leitura, ou None se faltar algum parâmetro obrigatório.
+    Lança ValueError se um valor numérico for inválido ou não couber no banco (validar_valores).
+    Timestamp ausente ou inválido usa o horário do servidor.
+    """
+    valores = [None] * _TOTAL_CAMPOS
+    for par in query_string.split(b'&'):
+        chave, _, valor = par.partition(b'=')
+        indice = _CAMPOS.get(chave)
+        if indice is not None and valores[indice] is None:
+            if b'%' in valor or b'+' in valor:
+                valor = unquote_to_bytes(valor.replace(b'+', b' '))
+            valores[indice] = valor
+
+    timestamp, umidade, temperatura, ph, fosforo, potassio, rele, bomba_dagua, device_id = valores
+
+    # Compatibilidade: aceita tanto 'rele' quanto 'bomba_dagua'
+    bomba = rele if rele is not None else bomba_dagua
+
+    if not (umidade and temperatura and ph and fosforo and potassio and bomba):
+        return None
+
+    data_hora_leitura = converter_timestamp_bytes(timestamp) if timestamp else None
+    device_id = device_id.decode('utf-8', 'replace') if device_id else device_id_padrao
+    umidade, temperatura, ph = float(umidade), float(temperatura), float(ph)
+    validar_valores(device_id, umidade, temperatura, ph)
+    return Leitura(
+        device_id,
+        data_hora_leitura or datetime.now(),
+        umidade,
+        temperatura,
+        ph,
+        converter_booleano(fosforo),
+        converter_booleano(potassio),
+        converter_booleano(bomba)
+    )
@@ -0,0 +1,140 @@
+"""
+Controle de admissão por token bucket para a ingestão
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Um ESP32 mal configurado (INTERVALO_HTTP muito baixo) pode inundar o
+/data e ocupar conexões do pool e workers que seriam dos outros
+dispositivos. Antes de qualquer trabalho no banco, cada requisição de
+ingestão passa por dois baldes de tokens:
+
+  - um por dispositivo (device_id), que limita quem está enviando demais;
+  - um global, que protege o banco quando a soma da frota passa do limite.
+
+Quem está acima do limite recebe 429 com Retry-After, sem tocar no banco.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Motivos de recusa
+MOTIVO_DISPOSITIVO = 'dispositivo'  # throttled: o próprio dispositivo passou do limite
+MOTIVO_GLOBAL = 'global'            # shed: a frota inteira passou do limite do servidor
+
+
+class BaldeTokens:
+    """Token bucket: `taxa` tokens por segundo, acumulando no máximo `capacidade`."""
+
+    __slots__ = ('taxa', 'capacidade', 'tokens', 'atualizado')
+
+    def __init__(self, taxa, capacidade, agora=None):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.tokens = capacidade
+        self.atualizado = time.monotonic() if agora is None else agora
+
+    def reabastecer(self, agora):
+        if agora > self.atualizado:
+            self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+            self.atualizado = agora
+
+    def espera(self, custo):
+        """Segundos até haver `custo` tokens (0 se já há)."""
+        if self.tokens >= custo:
+            return 0.0
+        if self.taxa <= 0:
+            return math.inf
+        return (custo - self.tokens) / self.taxa
+
+
+class ControleAdmissao:
+    """
+    Baldes por dispositivo (LRU limitado a `max_dispositivos`) e um balde global.
+    Taxa <= 0 desativa o respectivo limite.
+    """
+
+    def __init__(self, taxa_dispositivo=2.0, rajada_dispositivo=10, taxa_global=1000.0,
+                 rajada_global=2000, max_dispositivos=10000):
+        self.taxa_dispositivo = taxa_dispositivo
+        self.rajada_dispositivo = max(1, rajada_dispositivo)
+        self.max_dispositivos = max(1, max_dispositivos)
+        self._global = BaldeTokens(taxa_global, max(1, rajada_global)) if taxa_global > 0 else None
+        self._dispositivos = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.admitidas = 0
+        self.limitadas = 0      # throttled (limite do dispositivo)
+        self.descartadas = 0    # shed (limite global)
+        self._limitadas_por_dispositivo = OrderedDict()
+
+    def _balde_do_dispositivo(self, device_id, agora):
+        balde = self._dispositivos.get(device_id)
+        if balde is None:
+            balde = BaldeTokens(self.taxa_dispositivo, self.rajada_dispositivo, agora)
+            self._dispositivos[device_id] = balde
+            if len(self._dispositivos) > self.max_dispositivos:
+                self._dispositivos.popitem(last=False)
+        else:
+            self._dispositivos.move_to_end(device_id)
+        return balde
+
+    def admitir(self, device_id, custo=1):
+        """
+        Decide se a requisição pode seguir.
+        Retorna (True, 0, None) ou (False, segundos_para_tentar_de_novo, motivo).
+        Tokens só são consumidos quando os dois baldes têm saldo.
+        """
+        agora = time.monotonic()
+        with self._lock:
+            balde = None
+            if self.taxa_dispositivo > 0:
+                balde = self._balde_do_dispositivo(device_id, agora)
+                balde.reabastecer(agora)
+                espera = balde.espera(custo)
+                if espera:
+                    self.limitadas += 1
+                    self._contar_limitada(device_id)
+                    return False, espera, MOTIVO_DISPOSITIVO
+
+            if self._global is not None:
+                self._global.reabastecer(agora)
+                espera = self._global.espera(custo)
+                if espera:
+                    self.descartadas += 1
+                    return False, espera, MOTIVO_GLOBAL
+                self._global.tokens -= custo
+
+            if balde is not None:
+                balde.tokens -= custo
+            self.admitidas += 1
+            return True, 0.0, None
+
+    def _contar_limitada(self, device_id):
+        self._limitadas_por_dispositivo[device_id] = self._limitadas_por_dispositivo.get(device_id, 0) + 1
+        self._limitadas_por_dispositivo.move_to_end(device_id)
+        if len(self._limitadas_por_dispositivo) > self.max_dispositivos:
+            self._limitadas_por_dispositivo.popitem(last=False)
+
+    def metricas(self):
+        """Contadores de admissão e os dispositivos mais limitados."""
+        with self._lock:
+            mais_limitados = sorted(self._limitadas_por_dispositivo.items(), key=lambda item: item[1], reverse=True)
+            return {
+                "admitidas": self.admitidas,
+                "limitadas_dispositivo": self.limitadas,
+                "descartadas_global": self.descartadas,
+                "dispositivos_rastreados": len(self._dispositivos),
+                "taxa_dispositivo": self.taxa_dispositivo,
+                "rajada_dispositivo": self.rajada_dispositivo,
+                "taxa_global": self._global.taxa if self._global is not None else None,
+                "mais_limitados": dict(mais_limitados[:10])
+            }
+
+
+def retry_after(segundos):
+    """Valor do cabeçalho Retry-After (segundos inteiros, mínimo 1)."""
+    if math.isinf(segundos):
+        return "60"
+    return str(max(1, math.ceil(segundos)))
@@ -0,0 +1,97 @@
+"""
+Paginação por keyset do /get_data
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O /get_data devolvia a tabela inteira (e o plotter usava só os últimos 20
+pontos): o tempo de resposta crescia com o histórico. Agora cada chamada
+devolve uma página de `limit` leituras, da mais recente para a mais antiga,
+e um cursor opaco para a próxima página.
+
+O cursor guarda a chave da última leitura entregue, (data_hora_leitura, id),
+e a próxima página começa logo depois dela com WHERE (data_hora_leitura, id)
+< (..., ...): o índice vai direto ao ponto, sem OFFSET, então a página N
+custa o mesmo que a primeira, com mil ou milhões de linhas.
+
+`until` também vira um limite superior da mesma chave, ((until, 0): todo id
+é >= 1), então cursor e until usam a mesma consulta preparada.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+import pytz
+
+# Sem since/until/cursor: intervalo aberto (valores que o PostgreSQL aceita em TIMESTAMP)
+DATA_MINIMA = datetime(1, 1, 1)
+DATA_MAXIMA = datetime(9999, 12, 31, 23, 59, 59)
+
+
+class ErroPaginacao(ValueError):
+    """Parâmetro de paginação inválido (limit, since, until ou cursor)."""
+
+
+def codificar_cursor(data_hora_leitura, id_leitura):
+    """Cursor opaco (base64 url-safe) apontando para depois da leitura (data_hora_leitura, id)."""
+    bruto = json.dumps([data_hora_leitura.isoformat(), id_leitura], separators=(',', ':'))
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (data_hora_leitura, id) do cursor; ErroPaginacao se ele não foi gerado por codificar_cursor."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data_hora, id_leitura = json.loads(bruto)
+        data_hora, id_leitura = datetime.fromisoformat(data_hora), int(id_leitura)
+    except (ValueError, TypeError) as e:
+        raise ErroPaginacao(f"cursor inválido: {cursor!r}") from e
+    # codificar_cursor só grava horário local sem fuso: com fuso o cursor foi montado à mão
+    # (e compará-lo com DATA_MAXIMA/until, sem fuso, lançaria TypeError)
+    if data_hora.tzinfo is not None:
+        raise ErroPaginacao(f"cursor inválido: {cursor!r}")
+    return data_hora, id_leitura
+
+
+def interpretar_data(valor, nome, fuso):
+    """
+    Converte since/until (ISO 8601) para o horário local sem fuso gravado em data_hora_leitura.
+    Datas com fuso (ex.: ...Z) são convertidas para `fuso`.
+    """
+    try:
+        data = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    except ValueError as e:
+        raise ErroPaginacao(f"{nome} inválido (use ISO 8601, ex.: 2025-06-01T12:00:00): {valor!r}") from e
+    if data.tzinfo is not None:
+        data = data.astimezone(fuso).replace(tzinfo=None)
+    return data
+
+
+def interpretar_limite(valor, padrao, maximo):
+    """limit da query string: padrão se ausente, entre 1 e maximo."""
+    if valor in (None, ''):
+        return padrao
+    try:
+        limite = int(valor)
+    except ValueError as e:
+        raise ErroPaginacao(f"limit inválido: {valor!r}") from e
+    if limite < 1:
+        raise ErroPaginacao("limit deve ser maior que zero")
+    return min(limite, maximo)
+
+
+def parametros_pagina(argumentos, padrao, maximo, fuso=pytz.timezone('America/Sao_Paulo')):
+    """
+    Lê limit, since, until e cursor da query string.
+    Retorna (limite, desde, limite_superior) onde limite_superior é a chave (data_hora_leitura, id)
+    exclusiva da página: o menor entre o cursor e (until, 0).
+    """
+    limite = interpretar_limite(argumentos.get('limit'), padrao, maximo)
+    desde = DATA_MINIMA
+    if argumentos.get('since'):
+        desde = interpretar_data(argumentos['since'], 'since', fuso)
+    superior = (DATA_MAXIMA, 0)
+    if argumentos.get('until'):
+        superior = (interpretar_data(argumentos['until'], 'until', fuso), 0)
+    if argumentos.get('cursor'):
+        superior = min(superior, decodificar_cursor(argumentos['cursor']))
+    return limite, desde, superior
@@ -0,0 +1,76 @@
+"""
+Protocolo binário compacto para leituras do ESP32
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Cada leitura é um registro de 13 bytes, little-endian, sem separadores:
+
+    offset  tipo    campo
+    0       uint16  device_id
+    2       uint32  epoch (segundos UTC)
+    6       int16   umidade * 10
+    8       int16   temperatura * 10
+    10      int16   ph * 100
+    12      uint8   flags: bit0 fósforo, bit1 potássio, bit2 bomba d'água
+
+O corpo da requisição pode conter um registro ou vários registros
+concatenados (tamanho múltiplo de 13). A decodificação usa struct sobre
+um memoryview, sem criar strings intermediárias.
+"""
+
+import struct
+from datetime import datetime
+
+from leitura import FUSO_LEITURAS, validar_valores
+
+FORMATO_REGISTRO = struct.Struct('<HIhhhB')
+TAMANHO_REGISTRO = FORMATO_REGISTRO.size  # 13 bytes
+
+FLAG_FOSFORO = 0x01
+FLAG_POTASSIO = 0x02
+FLAG_BOMBA = 0x04
+
+class ErroProtocolo(ValueError):
+    """Corpo binário com tamanho ou conteúdo inválido."""
+
+
+def decodificar_registros(dados):
+    """
+    Decodifica um ou mais registros binários.
+    Retorna lista de tuplas (device_id, data_hora_leitura, umidade, temperatura,
+    ph, fosforo, potassio, bomba_dagua), com device_id como texto.
+    Lança ErroProtocolo se algum valor não couber nas colunas do banco (ex.: ph acima de 99.99).
+    """
+    visao = memoryview(dados)
+    if not visao.nbytes or visao.nbytes % TAMANHO_REGISTRO:
+        raise ErroProtocolo(
+            f"Tamanho {visao.nbytes} não é múltiplo de {TAMANHO_REGISTRO} bytes"
+        )
+
+    registros = []
+    for device_id, epoch, umidade, temperatura, ph, flags in FORMATO_REGISTRO.iter_unpack(visao):
+        # O ESP32 envia leituras no horário de Brasília: o epoch vai para o mesmo fuso, sem tzinfo
+        data_hora = datetime.fromtimestamp(epoch, FUSO_LEITURAS).replace(tzinfo=None)
+        umidade, temperatura, ph = umidade / 10.0, temperatura / 10.0, ph / 100.0
+        try:
+            validar_valores(str(device_id), umidade, temperatura, ph)
+        except ValueError as e:
+            raise ErroProtocolo(f"Registro {len(registros)}: {e}") from e
+        registros.append((
+            str(device_id),
+            data_hora,
+            umidade,
+            temperatura,
+            ph,
+            bool(flags & FLAG_FOSFORO),
+            bool(flags & FLAG_POTASSIO),
+            bool(flags & FLAG_BOMBA)
+        ))
+    return registros
+
+
+def codificar_registro(device_id, epoch, umidade, temperatura, ph, fosforo, potassio, bomba_dagua):
+    """Monta um registro binário (usado em testes manuais e simuladores)."""
+    flags = (FLAG_FOSFORO if fosforo else 0) | (FLAG_POTASSIO if potassio else 0) | (FLAG_BOMBA if bomba_dagua else 0)
+    return FORMATO_REGISTRO.pack(
+        device_id, int(epoch), round(umidade * 10), round(temperatura * 10), round(ph * 100), flags
+    )
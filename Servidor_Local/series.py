@@ -0,0 +1,216 @@
+"""
+Séries temporais reduzidas para gráficos (/series)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O plotter e o dashboard buscavam leituras cruas e mostravam só os últimos
+20 pontos: um gráfico de semanas exigiria transferir centenas de milhares
+de linhas. O /series devolve o intervalo já reduzido:
+
+  1. o PostgreSQL agrupa em baldes de tempo de largura fixa (date_bin) e
+     calcula um agregado por métrica (avg, min, max ou last), então só sai
+     do banco uma linha por balde. Baldes múltiplos de um minuto são
+     montados a partir de leituras_sensores_minuto (config/agregados_minuto.py),
+     uma linha por dispositivo e minuto em vez de uma por leitura; baldes
+     menores agrupam as leituras cruas;
+  2. opcionalmente, Largest-Triangle-Three-Buckets (LTTB) escolhe `points`
+     desses baldes preservando a forma visual da curva (picos e vales que
+     uma média simples apagaria).
+
+A origem dos baldes é fixa (DATA_ORIGEM), então a mesma largura sempre gera
+os mesmos limites, de uma consulta para a outra.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from config.agregados_minuto import METRICAS
+from paginacao import interpretar_data
+
+DATA_ORIGEM = datetime(2000, 1, 1)
+MINUTO = timedelta(minutes=1)
+
+METRICAS_PADRAO = ('umidade', 'temperatura', 'ph')
+
+# Agregado por balde nas leituras cruas; last = valor da leitura mais recente do balde
+# (max de [instante, valor], sem ordenar)
+AGREGADOS = {
+    'avg': "avg({expr})::float8",
+    'min': "min({expr})::float8",
+    'max': "max({expr})::float8",
+    'last': "(max(ARRAY[extract(epoch FROM data_hora_leitura)::float8, ({expr})::float8])"
+            " FILTER (WHERE {expr} IS NOT NULL))[2]",
+}
+# O mesmo agregado a partir das colunas de leituras_sensores_minuto
+AGREGADOS_MINUTO = {
+    'avg': "sum(soma_{m}) / NULLIF(sum(n_{m}), 0)",
+    'min': "min(min_{m})",
+    'max': "max(max_{m})",
+    'last': "(max(ARRAY[extract(epoch FROM minuto)::float8, ultimo_{m}]) FILTER (WHERE ultimo_{m} IS NOT NULL))[2]",
+}
+
+UNIDADES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class ErroSerie(ValueError):
+    """Parâmetro inválido do /series."""
+
+
+def interpretar_largura(valor):
+    """Largura do balde: segundos ('300') ou número com unidade s/m/h/d ('30s', '5m', '1h', '1d')."""
+    encontrado = re.fullmatch(r'\s*(\d+)\s*([smhd]?)\s*', valor or '')
+    if not encontrado:
+        raise ErroSerie(f"bucket inválido (use ex.: 30s, 5m, 1h, 1d): {valor!r}")
+    segundos = int(encontrado.group(1)) * UNIDADES[encontrado.group(2) or 's']
+    if segundos < 1:
+        raise ErroSerie("bucket deve ser de pelo menos 1 segundo")
+    return timedelta(seconds=segundos)
+
+
+def interpretar_metricas(valor, agregado_padrao='avg'):
+    """
+    ?metrics=umidade,temperatura:max,ph:last -> [(métrica, agregado)].
+    Métrica sem ':agregado' usa ?agg= (padrão avg).
+    """
+    if agregado_padrao not in AGREGADOS:
+        raise ErroSerie(f"agg inválido: {agregado_padrao!r} (use {', '.join(AGREGADOS)})")
+    nomes = [nome.strip() for nome in valor.split(',') if nome.strip()] if valor else list(METRICAS_PADRAO)
+    metricas = []
+    for item in nomes:
+        nome, _, agregado = item.partition(':')
+        agregado = agregado or agregado_padrao
+        if nome not in METRICAS:
+            raise ErroSerie(f"métrica inválida: {nome!r} (use {', '.join(METRICAS)})")
+        if agregado not in AGREGADOS:
+            raise ErroSerie(f"agregado inválido para {nome}: {agregado!r} (use {', '.join(AGREGADOS)})")
+        if (nome, agregado) not in metricas:
+            metricas.append((nome, agregado))
+    return metricas
+
+
+def parametros_serie(argumentos, fuso, periodo_padrao_h=24.0, baldes_auto=1000, baldes_max=20000):
+    """
+    Lê since, until, bucket, metrics, agg e points da query string.
+    Sem until: agora; sem since: `periodo_padrao_h` horas antes de until; sem bucket:
+    largura que divide o intervalo em `baldes_auto` baldes.
+    Retorna (desde, ate, largura, metricas, pontos).
+    """
+    ate = interpretar_data(argumentos['until'], 'until', fuso) if argumentos.get('until') \
+        else datetime.now(fuso).replace(tzinfo=None)
+    desde = interpretar_data(argumentos['since'], 'since', fuso) if argumentos.get('since') \
+        else ate - timedelta(hours=periodo_padrao_h)
+    if desde >= ate:
+        raise ErroSerie("since deve ser anterior a until")
+
+    periodo = (ate - desde).total_seconds()
+    if argumentos.get('bucket') and argumentos['bucket'] != 'auto':
+        largura = interpretar_largura(argumentos['bucket'])
+        if periodo / largura.total_seconds() > baldes_max:
+            raise ErroSerie(f"bucket pequeno demais para o intervalo (máximo de {baldes_max} baldes)")
+    else:
+        segundos = max(1, -(-int(periodo) // baldes_auto))
+        if segundos >= 60:
+            segundos = -(-segundos // 60) * 60   # Minutos inteiros: usa os agregados por minuto
+        largura = timedelta(seconds=segundos)
+
+    metricas = interpretar_metricas(argumentos.get('metrics'), argumentos.get('agg') or 'avg')
+
+    pontos = None
+    if argumentos.get('points'):
+        try:
+            pontos = int(argumentos['points'])
+        except ValueError as e:
+            raise ErroSerie(f"points inválido: {argumentos['points']!r}") from e
+        if pontos < 3:
+            raise ErroSerie("points deve ser pelo menos 3")
+    return desde, ate, largura, metricas, pontos
+
+
+def usa_agregados_minuto(largura):
+    """Baldes múltiplos de um minuto saem de leituras_sensores_minuto."""
+    return largura % MINUTO == timedelta(0)
+
+
+def alinhar_minuto(desde, ate):
+    """Intervalo em minutos inteiros (os agregados por minuto não dividem um minuto)."""
+    inicio = desde.replace(second=0, microsecond=0)
+    fim = ate.replace(second=0, microsecond=0)
+    if fim < ate:
+        fim += MINUTO
+    return inicio, fim
+
+
+def sql_serie(schema, metricas, por_dispositivo=False, por_minuto=False, marcadores=('%s', '%s', '%s', '%s')):
+    """
+    Consulta agrupada por balde (nas leituras cruas ou, com por_minuto, em leituras_sensores_minuto).
+    Parâmetros: largura (interval), desde, até e, com por_dispositivo, device_id.
+    `marcadores` troca os %s do psycopg2 pelos $n do asyncpg.
+    """
+    filtro = f"AND device_id = {marcadores[3]}" if por_dispositivo else ""
+    if por_minuto:
+        colunas = ",\n               ".join(AGREGADOS_MINUTO[agregado].format(m=nome) for nome, agregado in metricas)
+        tabela, instante, contagem = "leituras_sensores_minuto", "minuto", "sum(n)"
+    else:
+        colunas = ",\n               ".join(
+            AGREGADOS[agregado].format(expr=METRICAS[nome]) for nome, agregado in metricas)
+        tabela, instante, contagem = "leituras_sensores", "data_hora_leitura", "count(*)"
+    return f"""
+        SELECT date_bin({marcadores[0]}, {instante}, TIMESTAMP '{DATA_ORIGEM.isoformat()}') AS balde,
+               {contagem}::bigint,
+               {colunas}
+        FROM {schema}.{tabela}
+        WHERE {instante} >= {marcadores[1]} AND {instante} < {marcadores[2]} {filtro}
+        GROUP BY balde
+        ORDER BY balde
+    """
+
+
+def lttb(xs, ys, alvo):
+    """
+    Largest-Triangle-Three-Buckets: índices de até `alvo` pontos de (xs, ys), com xs crescente.
+    O primeiro e o último ponto sempre ficam; de cada faixa intermediária fica o ponto que forma
+    o maior triângulo com o ponto escolhido antes e a média da faixa seguinte.
+    """
+    n = len(xs)
+    if alvo >= n or alvo < 3:
+        return list(range(n))
+    escolhidos = [0]
+    tamanho = (n - 2) / (alvo - 2)
+    a = 0
+    for i in range(alvo - 2):
+        inicio = int(i * tamanho) + 1
+        fim = int((i + 1) * tamanho) + 1
+        prox_fim = min(int((i + 2) * tamanho) + 1, n)
+        media_x = sum(xs[fim:prox_fim]) / (prox_fim - fim)
+        media_y = sum(ys[fim:prox_fim]) / (prox_fim - fim)
+        ax, ay = xs[a], ys[a]
+        maior, escolhido = -1.0, inicio
+        for j in range(inicio, fim):
+            area = abs((ax - media_x) * (ys[j] - ay) - (ax - xs[j]) * (media_y - ay))
+            if area > maior:
+                maior, escolhido = area, j
+        escolhidos.append(escolhido)
+        a = escolhido
+    escolhidos.append(n - 1)
+    return escolhidos
+
+
+def montar_serie(linhas, metricas, pontos=None):
+    """
+    Converte as linhas de sql_serie em {métrica: {"agregado", "pontos": [[instante ISO, valor], ...]}}
+    (chave 'métrica:agregado' quando a mesma métrica vem com mais de um agregado).
+    Com `pontos`, cada série passa pelo LTTB. Baldes sem valor da métrica ficam de fora da série dela.
+    """
+    repetidas = {nome for nome, _ in metricas if sum(1 for m, _ in metricas if m == nome) > 1}
+    series = {}
+    for posicao, (nome, agregado) in enumerate(metricas, start=2):
+        baldes = [(linha[0], linha[posicao]) for linha in linhas if linha[posicao] is not None]
+        if pontos is not None and len(baldes) > pontos:
+            xs = [(balde - DATA_ORIGEM).total_seconds() for balde, _ in baldes]
+            ys = [valor for _, valor in baldes]
+            baldes = [baldes[i] for i in lttb(xs, ys, pontos)]
+        chave = f"{nome}:{agregado}" if nome in repetidas else nome
+        series[chave] = {
+            "agregado": agregado,
+            "pontos": [[balde.isoformat(), round(valor, 3)] for balde, valor in baldes]
+        }
+    return series
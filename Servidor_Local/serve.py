@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, make_response, g, has_request_context
 import sys
 import os
 from datetime import datetime
@@ -7,9 +7,15 @@ import random
 import math
 import psycopg2
 from psycopg2 import sql, pool
+from psycopg2.extras import execute_values
 import threading
 import time
 import atexit
+import csv
+import io
+import json
+from contextlib import ExitStack
+from functools import wraps
 
 # --- INÍCIO: Adicionado para o Plotter ---
 # Template HTML para a página do plotter.
@@ -182,6 +188,13 @@ PLOTTER_HTML = """
         <a href="http://localhost:8501" class="btn-dashboard" target="_self">
             Voltar ao Dashboard Principal
         </a>
+        <select id="periodo" class="btn-dashboard" onchange="updateCharts()">
+            <option value="600">Últimos 10 minutos</option>
+            <option value="3600">Última hora</option>
+            <option value="86400">Últimas 24 horas</option>
+            <option value="604800">Últimos 7 dias</option>
+            <option value="2592000">Últimos 30 dias</option>
+        </select>
     </div>
 
     <div class="chart-container">
@@ -200,8 +213,8 @@ PLOTTER_HTML = """
     </div>
 
     <script>
-        // Função para converter booleano de string ('true'/'false') para número (1/0)
-        const boolToNum = (val) => val === true || val === 'true' ? 1 : 0;
+        // Série do /series ([[instante, valor], ...]) no formato {x, y} do Chart.js
+        const toPoints = (serie) => serie ? serie.pontos.map(p => ({ x: new Date(p[0]), y: p[1] })) : [];
 
         // Configuração inicial dos gráficos
         const tempHumidityCtx = document.getElementById('tempHumidityChart').getContext('2d');
@@ -242,7 +255,7 @@ PLOTTER_HTML = """
                 scales: {
                     x: { 
                         type: 'time', 
-                        time: { unit: 'second', displayFormats: { second: 'HH:mm:ss' } },
+                        time: { tooltipFormat: 'dd/MM HH:mm:ss' },
                         title: { display: true, text: 'Horário da Leitura' }
                     },
                     yTemp: {
@@ -278,7 +291,7 @@ PLOTTER_HTML = """
                 pointRadius: 5
             }]
             },
-            options: { scales: { x: { type: 'time', time: { unit: 'second', displayFormats: { second: 'HH:mm:ss' } } } } }
+            options: { scales: { x: { type: 'time', time: { tooltipFormat: 'dd/MM HH:mm:ss' } } } }
         });
         
         const statusCtx = document.getElementById('statusChart').getContext('2d');
@@ -327,7 +340,7 @@ PLOTTER_HTML = """
             },
             options: {
                 scales: {
-                    x: { type: 'time', time: { unit: 'second', displayFormats: { second: 'HH:mm:ss' } } },
+                    x: { type: 'time', time: { tooltipFormat: 'dd/MM HH:mm:ss' } },
                     y: {
                         ticks: {
                             stepSize: 1,
@@ -349,41 +362,35 @@ PLOTTER_HTML = """
                 // Mostra indicador de loading
                 document.querySelector('.status-indicator').textContent = 'Atualizando...';
                 
-                const response = await fetch('/get_data');
+                // Intervalo escolhido já reduzido pelo servidor (baldes de tempo + LTTB):
+                // no máximo maxDataPoints pontos por série, de 10 minutos a 30 dias
+                const maxDataPoints = 300;
+                const periodo = Number(document.getElementById('periodo').value);
+                const until = new Date();
+                const since = new Date(until.getTime() - periodo * 1000);
+                const response = await fetch('/series?since=' + since.toISOString() + '&until=' + until.toISOString() +
+                    '&points=' + maxDataPoints +
+                    '&metrics=temperatura,umidade,ph,bomba_dagua:last,fosforo:last,potassio:last');
                 const result = await response.json();
-                let data = result.dados;
+                const series = result.series;
 
-                // Os dados vêm em ordem decrescente, vamos invertê-los para o gráfico
-                data.reverse();
-                
-                // Limita a 20 pontos de dados para não sobrecarregar a tela
-                const maxDataPoints = 20;
-                if(data.length > maxDataPoints) {
-                    data = data.slice(data.length - maxDataPoints);
-                }
-
-                // Extrai os dados para os gráficos
-                const labels = data.map(d => new Date(d.data_hora_leitura));
-                const temperatures = data.map(d => d.temperatura);
-                const humidities = data.map(d => d.umidade);
-                const phs = data.map(d => d.ph);
-                const pumpStatus = data.map(d => boolToNum(d.bomba_dagua));
-                const phosphorusStatus = data.map(d => boolToNum(d.fosforo));
-                const potassiumStatus = data.map(d => boolToNum(d.potassio));
+                const temperatures = toPoints(series.temperatura);
+                const humidities = toPoints(series.umidade);
+                const phs = toPoints(series.ph);
+                const pumpStatus = toPoints(series.bomba_dagua);
+                const phosphorusStatus = toPoints(series.fosforo);
+                const potassiumStatus = toPoints(series.potassio);
 
                 // Atualiza o gráfico de Temperatura e Umidade
-                tempHumidityChart.data.labels = labels;
                 tempHumidityChart.data.datasets[0].data = temperatures;
                 tempHumidityChart.data.datasets[1].data = humidities;
                 tempHumidityChart.update();
 
                 // Atualiza o gráfico de pH
-                phChart.data.labels = labels;
                 phChart.data.datasets[0].data = phs;
                 phChart.update();
                 
                 // Atualiza o gráfico de Status
-                statusChart.data.labels = labels;
                 statusChart.data.datasets[0].data = pumpStatus;
                 statusChart.data.datasets[1].data = phosphorusStatus;
                 statusChart.data.datasets[2].data = potassiumStatus;
@@ -413,7 +420,37 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from config.database_config import _config as DatabaseConfig, conectar_postgres, criar_schema_e_tabela
+from config.database_config import (
+    _config as DatabaseConfig, criar_schema_e_tabela, conexao_pool, conexao_leitura, BancoIndisponivel,
+    inicializar_pool_conexoes, obter_conexao_pool, devolver_conexao_pool, fechar_pool_conexoes, metricas_pool,
+    metricas_replica, metricas_disjuntor, banco_em_falha, disjuntor_banco, nova_conexao_dedicada
+)
+from config.avisos_alteracao import canal_alteracoes
+from config.estatisticas_agregadas import ler_estatisticas, reconstruir_desatualizadas
+from config.exportacao import (
+    COLUNAS_LEITURAS, FORMATOS, TIPOS_CONTEUDO, sql_exportar_leituras, ler_em_blocos, serializar_em_blocos
+)
+from config.settings import settings
+from fila_ingestao import FilaIngestaoParticionada
+from executor_background import ExecutorLimitado
+from protocolo_binario import decodificar_registros, ErroProtocolo
+from leitura import Leitura, decodificar_leitura, converter_timestamp_bytes, validar_valores, VALORES_VERDADEIROS
+from deduplicacao import FiltroDuplicatas
+from spool import SpoolLocal, ErroPermanente
+from grupo_commit import GrupoCommit
+from consultas_preparadas import ConsultasPreparadas
+from limite_taxa import ControleAdmissao, MOTIVO_DISPOSITIVO, retry_after
+from estado_servidor import EstadoServidor
+from cache_respostas import CacheRespostas, Entrada, etag_de, etag_confere
+from paginacao import (
+    parametros_pagina, codificar_cursor, interpretar_data, interpretar_limite, ErroPaginacao, DATA_MINIMA, DATA_MAXIMA
+)
+from formato_colunar import (
+    FORMATO_LINHAS, FORMATO_ARROW, MIMETYPE_ARROW, interpretar_formato, transpor, corpo_arrow, ErroFormato
+)
+from series import (
+    parametros_serie, sql_serie, montar_serie, usa_agregados_minuto, alinhar_minuto, ErroSerie
+)
 
 # Timezone brasileiro
 BRASIL_TZ = pytz.timezone('America/Sao_Paulo')
@@ -430,53 +467,56 @@ except Exception as e:
     print("Servidor continuará rodando. Você pode configurar o banco depois.")
 
 # === POOL DE CONEXÕES PARA PERFORMANCE ===
-connection_pool = None
-
-def inicializar_pool_conexoes():
-    """Inicializa pool de conexões para performance ultra-rápida."""
-    global connection_pool
-    try:
-        connection_pool = psycopg2.pool.ThreadedConnectionPool(
-            minconn=2,  # Mínimo 2 conexões sempre abertas
-            maxconn=10, # Máximo 10 conexões simultâneas
-            **DatabaseConfig.get_connection_params()
-        )
-        print("Pool de conexões PostgreSQL inicializado (2-10 conexões)")
-        return True
-    except Exception as e:
-        print(f"Erro ao inicializar pool: {e}")
-        return False
-
-def obter_conexao_pool():
-    """Obtém conexão do pool (ULTRA-RÁPIDO)."""
-    global connection_pool
-    if connection_pool:
-        try:
-            conn = connection_pool.getconn()
-            if conn:
-                cursor = conn.cursor()
-                # Configurações rápidas
-                cursor.execute(f"SET search_path TO {DatabaseConfig.SCHEMA}, public")
-                return conn, cursor
-        except Exception as e:
-            print(f"Erro ao obter conexão do pool: {e}")
-    return None, None
+# O pool é o de config/database_config.py: um por processo, criado sob demanda (no modo
+# multi-processo cada worker cria o seu depois do fork) e fechado no atexit. Rotas usam
+# `with conexao_pool() as (conn, cursor)`; consultas passam autocommit=True.
+# As consultas analíticas (/get_data, /stats, /integrated_data) usam conexao_leitura():
+# réplica de leitura se POSTGRES_REPLICA_DSN estiver configurado e em dia, senão o primário.
 
-def devolver_conexao_pool(conn):
-    """Devolve conexão para o pool."""
-    global connection_pool
-    if connection_pool and conn:
-        connection_pool.putconn(conn)
+# === COMANDOS PREPARADOS (um PREPARE por conexão do pool, depois só EXECUTE) ===
+consultas = ConsultasPreparadas(settings.CONSULTAS_PREPARADAS)
 
-def fechar_pool_conexoes():
-    """Fecha o pool de conexões."""
-    global connection_pool
-    if connection_pool:
-        connection_pool.closeall()
-        print("Pool de conexões fechado")
+consultas.registrar('inserir_leitura', f"""
+    INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores 
+    (device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT DO NOTHING
+""")
+consultas.registrar('inserir_meteorologia', f"""
+    INSERT INTO {DatabaseConfig.SCHEMA}.dados_meteorologicos 
+    (data_hora_coleta, temperatura_externa, umidade_ar, pressao_atmosferica, 
+     velocidade_vento, direcao_vento, condicao_clima, probabilidade_chuva, 
+     quantidade_chuva, indice_uv, visibilidade, cidade, fonte_dados)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+""")
+consultas.registrar('inserir_integrada', f"""
+    INSERT INTO {DatabaseConfig.SCHEMA}.leituras_integradas 
+    (device_id, data_hora_leitura, umidade_solo, temperatura_solo, ph_solo, fosforo, potassio, bomba_dagua,
+     temperatura_externa, umidade_ar, pressao_atmosferica, velocidade_vento, condicao_clima,
+     probabilidade_chuva, quantidade_chuva, diferenca_temperatura, deficit_umidade, fator_evapotranspiracao)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18)
+""")
+# Página do /get_data por keyset (paginacao.py), mais recentes primeiro.
+# listar_leituras: $1, $2 = limite superior exclusivo (data_hora_leitura, id),
+#   $3 = since (inclusivo), $4 = linhas. Usa ix_leituras_sensores_data_hora_id.
+# listar_leituras_dispositivo: $1 = device_id, $2, $3 = limite superior exclusivo
+#   (data_hora_leitura, id), $4 = since (inclusivo), $5 = linhas. O índice único
+#   (device_id, data_hora_leitura) já define a ordem.
+consultas.registrar('listar_leituras', f"""
+    SELECT id, device_id, data_hora_leitura, criacaots, umidade, temperatura, ph, fosforo, potassio, bomba_dagua 
+    FROM {DatabaseConfig.SCHEMA}.leituras_sensores 
+    WHERE (data_hora_leitura, id) < ($1, $2) AND data_hora_leitura >= $3
+    ORDER BY data_hora_leitura DESC, id DESC
+    LIMIT $4
+""")
+consultas.registrar('listar_leituras_dispositivo', f"""
+    SELECT id, device_id, data_hora_leitura, criacaots, umidade, temperatura, ph, fosforo, potassio, bomba_dagua 
+    FROM {DatabaseConfig.SCHEMA}.leituras_sensores 
+    WHERE device_id = $1 AND (data_hora_leitura, id) < ($2, $3) AND data_hora_leitura >= $4
+    ORDER BY data_hora_leitura DESC, id DESC
+    LIMIT $5
+""")
 
-# Registra função para fechar pool ao encerrar aplicação
-atexit.register(fechar_pool_conexoes)
 
 def converter_para_boolean(valor):
     """
@@ -487,96 +527,150 @@ def converter_para_boolean(valor):
         return valor
     
     if isinstance(valor, str):
-        valor = valor.lower().strip()
-        return valor in ['true', 'presente', 'on', '1', 'yes', 'sim']
+        return valor.lower().strip() in VALORES_VERDADEIROS
     
     # Default para False se não conseguir determinar
     return False
 
-def inserir_dados(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None):
+def converter_timestamp(timestamp_esp32):
+    """
+    Converte o timestamp ISO do ESP32 para datetime com o mesmo parser do GET /data
+    (leitura.py); usa o horário do servidor se ausente ou inválido.
+    """
+    if isinstance(timestamp_esp32, datetime):
+        return timestamp_esp32
+    if timestamp_esp32 and isinstance(timestamp_esp32, str):
+        return converter_timestamp_bytes(timestamp_esp32.encode('utf-8')) or datetime.now()
+    return datetime.now()
+
+def inserir_dados(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None, device_id=None):
     """Insere uma nova leitura de dados na tabela 'leituras_sensores' do PostgreSQL."""
-    conn, cursor = conectar_postgres()
-    if conn and cursor:
-        # Usa timestamp do ESP32 se fornecido, senão usa timestamp do servidor
-        if timestamp_esp32:
-            # Converte string para timestamp se necessário
-            if isinstance(timestamp_esp32, str):
-                try:
-                    # Tenta formato ISO primeiro (YYYY-MM-DDTHH:MM:SS)
-                    data_hora_leitura = datetime.strptime(timestamp_esp32, "%Y-%m-%dT%H:%M:%S")
-                except ValueError:
-                    try:
-                        # Fallback para formato com espaço
-                        data_hora_leitura = datetime.strptime(timestamp_esp32, "%Y-%m-%d %H:%M:%S")
-                    except ValueError:
-                        print(f"Formato de timestamp inválido: {timestamp_esp32}")
-                        data_hora_leitura = datetime.now()
-            else:
-                data_hora_leitura = timestamp_esp32
-            timestamp_source = "ESP32"
-        else:
-            data_hora_leitura = datetime.now()
-            timestamp_source = "Servidor"
-            
-        try:
-            # Nova estrutura: id (autoincremento), data_hora_leitura, criacaots (auto), dados sensores
-            # Força timestamp brasileiro para criacaots
-            timestamp_brasil = datetime.now(BRASIL_TZ)
-            
-            cursor.execute(f"""
-                INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores 
-                (data_hora_leitura, criacaots, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (data_hora_leitura, timestamp_brasil, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
-            )
+    # Usa timestamp do ESP32 se fornecido, senão usa timestamp do servidor
+    data_hora_leitura = converter_timestamp(timestamp_esp32)
+    timestamp_source = "ESP32" if timestamp_esp32 else "Servidor"
+        
+    try:
+        # Nova estrutura: id (autoincremento), data_hora_leitura, criacaots (auto, horário de Brasília), dados sensores
+        with conexao_pool() as (conn, cursor):
+            consultas.executar(cursor, 'inserir_leitura', (
+                device_id or settings.DEVICE_ID_PADRAO, data_hora_leitura,
+                umidade, temperatura, ph, fosforo, potassio, bomba_dagua
+            ))
             conn.commit()
-            print(f"Dados inseridos no PostgreSQL ({DatabaseConfig.SCHEMA}) em {data_hora_leitura}!")
-            print(f"Timestamp fonte: {timestamp_source}")
-            print(f"Umidade: {umidade}% | Temperatura: {temperatura}%C | pH: {ph}")
-            print(f"Fosforo: {'Detectado' if fosforo else 'Nao detectado'}")
-            print(f"Potassio: {'Detectado' if potassio else 'Nao detectado'}")
-            print(f"Bomba: {'Ligada' if bomba_dagua else 'Desligada'}")
-            print("ID gerado automaticamente pelo banco | Timestamp de criacao definido automaticamente")
-            return True
-        except Exception as error:
-            print(f"Erro ao inserir dados no PostgreSQL: {error}")
-            conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    else:
+        print(f"Dados inseridos no PostgreSQL ({DatabaseConfig.SCHEMA}) em {data_hora_leitura}!")
+        print(f"Timestamp fonte: {timestamp_source}")
+        print(f"Umidade: {umidade}% | Temperatura: {temperatura}%C | pH: {ph}")
+        print(f"Fosforo: {'Detectado' if fosforo else 'Nao detectado'}")
+        print(f"Potassio: {'Detectado' if potassio else 'Nao detectado'}")
+        print(f"Bomba: {'Ligada' if bomba_dagua else 'Desligada'}")
+        print("ID gerado automaticamente pelo banco | Timestamp de criacao definido automaticamente")
+        return True
+    except BancoIndisponivel:
         print("Não foi possível conectar ao banco de dados.")
         return False
+    except Exception as error:
+        print(f"Erro ao inserir dados no PostgreSQL: {error}")
+        return False
 
-def listar_dados():
-    """Lista todas as leituras da tabela 'leituras_sensores' do PostgreSQL."""
-    conn, cursor = conectar_postgres()
-    registros = []
-    if conn and cursor:
-        try:
-            cursor.execute(f"""
-                SELECT id, data_hora_leitura, criacaots, umidade, temperatura, ph, fosforo, potassio, bomba_dagua 
-                FROM {DatabaseConfig.SCHEMA}.leituras_sensores 
-                ORDER BY data_hora_leitura DESC
-            """)
+def consultar_pagina(device_id=None, limite=None, desde=DATA_MINIMA, superior=(DATA_MAXIMA, 0)):
+    """
+    Uma página de leituras como veio do cursor (ver listar_dados).
+    Retorna (colunas, linhas, proximo_cursor); erro no banco vira página vazia.
+    """
+    limite = settings.GET_DATA_LIMITE_PADRAO if limite is None else limite
+    # Uma linha a mais só para saber se existe próxima página
+    parametros = (superior[0], superior[1], desde, limite + 1)
+    try:
+        with conexao_leitura() as (conn, cursor):
+            if device_id:
+                consultas.executar(cursor, 'listar_leituras_dispositivo', (device_id,) + parametros)
+            else:
+                consultas.executar(cursor, 'listar_leituras', parametros)
             colunas = [desc[0] for desc in cursor.description]
-            for row in cursor:
-                registro = dict(zip(colunas, row))
-                # Converte timestamps para string para serialização JSON
-                if registro['data_hora_leitura']:
-                    registro['data_hora_leitura'] = registro['data_hora_leitura'].isoformat()
-                if registro['criacaots']:
-                    registro['criacaots'] = registro['criacaots'].isoformat()
-                # Boolean já é serializado corretamente pelo JSON
-                registros.append(registro)
-        except Exception as error:
-            print(f"Erro ao listar dados do PostgreSQL: {error}")
-        finally:
-            cursor.close()
-            conn.close()
-    return registros
+            linhas = cursor.fetchall()
+    except Exception as error:
+        print(f"Erro ao listar dados do PostgreSQL: {error}")
+        nao_guardar_em_cache()
+        return [], [], None
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = dict(zip(colunas, linhas[-1]))
+        proximo_cursor = codificar_cursor(ultima['data_hora_leitura'], ultima['id'])
+    return colunas, linhas, proximo_cursor
+
+def listar_dados(device_id=None, limite=None, desde=DATA_MINIMA, superior=(DATA_MAXIMA, 0)):
+    """
+    Lista uma página de leituras da tabela 'leituras_sensores', da mais recente para a mais antiga.
+    Com device_id, só as daquele dispositivo (usa o índice (device_id, data_hora_leitura)).
+    desde: data_hora_leitura mínima (inclusiva); superior: chave (data_hora_leitura, id) exclusiva
+    de onde a página começa (ver paginacao.py).
+    Retorna (registros, proximo_cursor); proximo_cursor é None na última página.
+    """
+    colunas, linhas, proximo_cursor = consultar_pagina(device_id, limite, desde, superior)
+    registros = []
+    for row in linhas:
+        registro = dict(zip(colunas, row))
+        # Converte timestamps para string para serialização JSON
+        if registro['data_hora_leitura']:
+            registro['data_hora_leitura'] = registro['data_hora_leitura'].isoformat()
+        if registro['criacaots']:
+            registro['criacaots'] = registro['criacaots'].isoformat()
+        # Boolean já é serializado corretamente pelo JSON
+        registros.append(registro)
+    return registros, proximo_cursor
+
+# Respostas de /get_data, /stats e /integrated_data guardadas até a próxima gravação nas tabelas
+# lidas (ingestão deste processo ou aviso LISTEN/NOTIFY de qualquer outro); ETag + 304 sem corpo
+cache_respostas = CacheRespostas(
+    nova_conexao_dedicada,
+    canal_alteracoes(DatabaseConfig.SCHEMA),
+    capacidade=settings.CACHE_RESPOSTAS_CAPACIDADE,
+    validade=settings.CACHE_RESPOSTAS_VALIDADE_S,
+    ativo=settings.CACHE_RESPOSTAS_ATIVO,
+    banco_em_falha=banco_em_falha
+)
+atexit.register(cache_respostas.parar)
+
+def nao_guardar_em_cache():
+    """A resposta desta requisição não vai para o cache (ex.: erro engolido que virou lista vazia)."""
+    if has_request_context():
+        g.sem_cache = True
+
+def resposta_em_cache(*tabelas):
+    """
+    Decorator das rotas de leitura: serve a resposta do cache enquanto `tabelas` não mudarem
+    e responde 304 quando o If-None-Match confere com o ETag. Só respostas 200 são guardadas.
+    """
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            cache_respostas.iniciar()
+            chave = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entrada = None
+            usar_cache = cache_respostas.disponivel()
+            if usar_cache:
+                versao = cache_respostas.versao(tabelas)   # Antes da consulta: gravação no meio invalida
+                entrada = cache_respostas.obter(chave, versao)
+            if entrada is None:
+                resposta = make_response(funcao(*args, **kwargs))
+                if resposta.status_code != 200 or g.get('sem_cache'):
+                    return resposta
+                corpo = resposta.get_data()
+                if usar_cache:
+                    entrada = cache_respostas.guardar(chave, versao, corpo, resposta.mimetype)
+                else:
+                    entrada = Entrada(None, etag_de(corpo), corpo, resposta.mimetype, 0.0)
+            if etag_confere(request.headers.get('If-None-Match'), entrada.etag):
+                cache_respostas.respostas_304 += 1
+                resposta = Response(status=304)
+            else:
+                resposta = Response(entrada.corpo, mimetype=entrada.mimetype)
+            resposta.headers['ETag'] = entrada.etag
+            resposta.headers['Cache-Control'] = 'no-cache'   # Sempre revalidar (If-None-Match)
+            return resposta
+        return envolvida
+    return decorador
 
 # --- ROTA PARA O PLOTTER ---
 @app.route('/plotter')
@@ -585,36 +679,135 @@ def plotter():
     return Response(PLOTTER_HTML, mimetype='text/html')
 
 @app.route('/get_data', methods=['GET'])
+@resposta_em_cache('leituras_sensores')
 def get_all_data():
-    """Retorna todos os dados em formato JSON."""
-    dados = listar_dados()
-    return jsonify({
+    """
+    Retorna uma página de leituras em JSON, da mais recente para a mais antiga.
+    ?device_id=... filtra por dispositivo; ?limit=N (padrão GET_DATA_LIMITE_PADRAO);
+    ?since=/?until= (ISO 8601, until exclusivo); ?cursor= vem do proximo_cursor da página anterior.
+    ?format=columns|arrow devolve a página em colunas (formato_colunar.py).
+    """
+    device_id = request.args.get('device_id')
+    try:
+        limite, desde, superior = parametros_pagina(
+            request.args, settings.GET_DATA_LIMITE_PADRAO, settings.GET_DATA_LIMITE_MAX, BRASIL_TZ)
+        formato = interpretar_formato(request.args.get('format'))
+    except (ErroPaginacao, ErroFormato) as e:
+        return jsonify({"erro": str(e)}), 400
+    envelope = {
         "schema": DatabaseConfig.SCHEMA,
         "host": DatabaseConfig.HOST,
         "database": DatabaseConfig.DATABASE,
-        "total_registros": len(dados),
+        "device_id": device_id,
+        "limite": limite
+    }
+    if formato != FORMATO_LINHAS:
+        colunas, linhas, proximo_cursor = consultar_pagina(device_id, limite, desde, superior)
+        envelope.update(total_registros=len(linhas), proximo_cursor=proximo_cursor)
+        return resposta_colunar(formato, envelope, colunas, linhas)
+    dados, proximo_cursor = listar_dados(device_id, limite, desde, superior)
+    return jsonify({
+        **envelope,
+        "total_registros": len(dados),  # Registros desta página
+        "proximo_cursor": proximo_cursor,
         "dados": dados
     })
 
-def processar_meteorologia_background(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp):
+def resposta_colunar(formato, envelope, colunas, linhas):
+    """Resposta em colunas: JSON com um array por campo (format=columns) ou Arrow IPC (format=arrow)."""
+    if formato == FORMATO_ARROW:
+        return Response(corpo_arrow(colunas, linhas, envelope), mimetype=MIMETYPE_ARROW)
+    return jsonify({**envelope, "formato": formato, "colunas": list(colunas), "dados": transpor(colunas, linhas)})
+
+@app.route('/series', methods=['GET'])
+def get_series():
+    """
+    Série temporal reduzida para gráficos (series.py): leituras agrupadas em baldes de tempo no banco.
+    ?since=/?until= (ISO 8601; padrão: últimas SERIES_PERIODO_PADRAO_H horas), ?bucket= (30s, 5m, 1h, 1d;
+    padrão: SERIES_BALDES_AUTO baldes no intervalo), ?metrics=umidade,temperatura:max (?agg= avg, min, max
+    ou last para as métricas sem agregado), ?points=N reduz cada série com LTTB, ?device_id= filtra.
+    """
+    device_id = request.args.get('device_id')
+    try:
+        desde, ate, largura, metricas, pontos = parametros_serie(
+            request.args, BRASIL_TZ, settings.SERIES_PERIODO_PADRAO_H,
+            settings.SERIES_BALDES_AUTO, settings.SERIES_BALDES_MAX)
+    except (ErroSerie, ErroPaginacao) as e:
+        return jsonify({"erro": str(e)}), 400
+    
+    por_minuto = usa_agregados_minuto(largura)
+    if por_minuto:
+        desde, ate = alinhar_minuto(desde, ate)
+    parametros = (largura, desde, ate, device_id) if device_id else (largura, desde, ate)
+    try:
+        with conexao_leitura() as (conn, cursor):
+            cursor.execute(sql_serie(DatabaseConfig.SCHEMA, metricas, bool(device_id), por_minuto), parametros)
+            linhas = cursor.fetchall()
+    except BancoIndisponivel:
+        return jsonify({"erro": "Erro de conexão com banco"}), 503
+    except psycopg2.Error as e:
+        return jsonify({"erro": f"Erro ao consultar série: {e}"}), 500
+    
+    return jsonify({
+        "device_id": device_id,
+        "since": desde.isoformat(),
+        "until": ate.isoformat(),
+        "bucket_s": int(largura.total_seconds()),
+        "fonte": "agregados_minuto" if por_minuto else "leituras",
+        "baldes": len(linhas),
+        "leituras": sum(linha[1] for linha in linhas),
+        "points": pontos,
+        "series": montar_serie(linhas, metricas, pontos)
+    })
+
+def parametros_exportacao(argumentos):
+    """?format= (ndjson ou csv), ?since= e ?until= do /export. Retorna (formato, desde, ate)."""
+    formato = argumentos.get('format', 'ndjson')
+    if formato not in FORMATOS:
+        raise ErroPaginacao(f"format inválido: {formato!r} (use {', '.join(FORMATOS)})")
+    desde = interpretar_data(argumentos['since'], 'since', BRASIL_TZ) if argumentos.get('since') else DATA_MINIMA
+    ate = interpretar_data(argumentos['until'], 'until', BRASIL_TZ) if argumentos.get('until') else DATA_MAXIMA
+    return formato, desde, ate
+
+@app.route('/export', methods=['GET'])
+def exportar_leituras():
+    """
+    Exporta leituras em ordem cronológica como NDJSON (padrão) ou CSV, em streaming: um cursor
+    server-side entrega EXPORTACAO_TAMANHO_BLOCO linhas por vez e cada bloco é enviado antes do
+    próximo, então a memória não cresce com o histórico. ?since=/?until= (ISO 8601), ?device_id=.
     """
-    Processa dados meteorológicos em background thread.
+    device_id = request.args.get('device_id')
+    try:
+        formato, desde, ate = parametros_exportacao(request.args)
+    except ErroPaginacao as e:
+        return jsonify({"erro": str(e)}), 400
+    
+    # A conexão fica emprestada até o fim do envio (fechada pelo call_on_close)
+    pilha = ExitStack()
+    try:
+        conn, _ = pilha.enter_context(conexao_leitura())
+    except BancoIndisponivel:
+        return jsonify({"erro": "Erro de conexão com banco"}), 503
+    parametros = (desde, ate, device_id) if device_id else (desde, ate)
+    blocos = ler_em_blocos(conn, sql_exportar_leituras(DatabaseConfig.SCHEMA, por_dispositivo=bool(device_id)),
+                           parametros, settings.EXPORTACAO_TAMANHO_BLOCO)
+    resposta = Response(serializar_em_blocos(formato, COLUNAS_LEITURAS, blocos), content_type=TIPOS_CONTEUDO[formato])
+    resposta.headers['Content-Disposition'] = f'attachment; filename="leituras_sensores.{formato}"'
+    resposta.call_on_close(blocos.close)   # Encerra a transação do cursor antes de devolver a conexão
+    resposta.call_on_close(pilha.close)
+    return resposta
+
+def processar_meteorologia_background(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp,
+                                      device_id=None):
+    """
+    Processa dados meteorológicos em um worker do executor_meteorologia.
     Não bloqueia a resposta para o ESP32.
     """
     try:
         print("BACKGROUND: Iniciando processamento meteorológico...")
         
-        # Pequeno delay para garantir que dados básicos foram salvos
-        time.sleep(0.1)
-        
         # Usa timestamp do ESP32 se fornecido
-        if timestamp:
-            if isinstance(timestamp, str):
-                data_hora = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S")
-            else:
-                data_hora = timestamp
-        else:
-            data_hora = datetime.now()
+        data_hora = converter_timestamp(timestamp)
         
         # Organiza dados dos sensores
         dados_sensores = {
@@ -629,18 +822,10 @@ def processar_meteorologia_background(umidade, temperatura, ph, fosforo, potassi
         # Coleta dados meteorológicos
         dados_meteo = coletar_dados_meteorologicos()
         
-        # Conecta ao banco para salvar dados meteorológicos e integrados
-        conn, cursor = conectar_postgres()
-        if conn and cursor:
-            try:
+        try:
+            with conexao_pool() as (conn, cursor):
                 # Salva dados meteorológicos
-                cursor.execute(f"""
-                    INSERT INTO {DatabaseConfig.SCHEMA}.dados_meteorologicos 
-                    (data_hora_coleta, temperatura_externa, umidade_ar, pressao_atmosferica, 
-                     velocidade_vento, direcao_vento, condicao_clima, probabilidade_chuva, 
-                     quantidade_chuva, indice_uv, visibilidade, cidade, fonte_dados)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
+                consultas.executar(cursor, 'inserir_meteorologia', (
                     data_hora,
                     dados_meteo['temperatura_externa'],
                     dados_meteo['umidade_ar'],
@@ -666,13 +851,8 @@ def processar_meteorologia_background(umidade, temperatura, ph, fosforo, potassi
                 ) / 10
                 
                 # Salva dados integrados
-                cursor.execute(f"""
-                    INSERT INTO {DatabaseConfig.SCHEMA}.leituras_integradas 
-                    (data_hora_leitura, umidade_solo, temperatura_solo, ph_solo, fosforo, potassio, bomba_dagua,
-                     temperatura_externa, umidade_ar, pressao_atmosferica, velocidade_vento, condicao_clima,
-                     probabilidade_chuva, quantidade_chuva, diferenca_temperatura, deficit_umidade, fator_evapotranspiracao)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
+                consultas.executar(cursor, 'inserir_integrada', (
+                    device_id or settings.DEVICE_ID_PADRAO,
                     data_hora,
                     dados_sensores['umidade'],
                     dados_sensores['temperatura'],
@@ -693,65 +873,275 @@ def processar_meteorologia_background(umidade, temperatura, ph, fosforo, potassi
                 ))
                 
                 conn.commit()
-                print(f"BACKGROUND: Dados meteorológicos e integrados salvos! ({dados_meteo['condicao_clima']})")
-                
-            except Exception as e:
-                print(f"BACKGROUND: Erro ao salvar dados meteorológicos: {e}")
-                conn.rollback()
-            finally:
-                cursor.close()
-                conn.close()
-        else:
+            cache_respostas.invalidar('dados_meteorologicos', 'leituras_integradas')
+            print(f"BACKGROUND: Dados meteorológicos e integrados salvos! ({dados_meteo['condicao_clima']})")
+        except BancoIndisponivel:
             print("BACKGROUND: Erro de conexão com banco")
+        except Exception as e:
+            print(f"BACKGROUND: Erro ao salvar dados meteorológicos: {e}")
             
     except Exception as e:
         print(f"BACKGROUND: Erro geral no processamento: {e}")
 
+def leitura_duplicada(leitura):
+    """True se a leitura já foi gravada recentemente (reenvio do ESP32)."""
+    return filtro_duplicatas is not None and filtro_duplicatas.contem(leitura.chave())
+
+def marcar_gravadas(leituras):
+    """Registra no filtro de duplicatas (e no estado do /status) as leituras gravadas com sucesso."""
+    if filtro_duplicatas is not None:
+        for leitura in leituras:
+            filtro_duplicatas.adicionar(leitura.chave())
+    estado_servidor.registrar(leituras)
+    cache_respostas.invalidar('leituras_sensores')
+
+def registrar_leitura(leitura):
+    """
+    Grava uma Leitura ao vivo pelo caminho configurado (fan-out, fila ou pool)
+    e agenda o pós-processamento meteorológico. Retorna True/False.
+    Reenvios de uma leitura já gravada são confirmados sem ir ao banco.
+    """
+    if leitura_duplicada(leitura):
+        print(f"ESP32 ({leitura.device_id}): reenvio de {leitura.data_hora_leitura} ignorado")
+        return True
+
+    if spool_local is not None and banco_em_falha():
+        # Disjuntor aberto: direto para o spool, sem fila nem group commit esperando o banco
+        # (vencido DISJUNTOR_TEMPO_ABERTO, a próxima leitura segue o caminho normal e vira a sonda)
+        sucesso = guardar_no_spool(leitura)
+        if sucesso:
+            marcar_gravadas((leitura,))
+        return sucesso
+
+    args = (leitura.umidade, leitura.temperatura, leitura.ph,
+            leitura.fosforo, leitura.potassio, leitura.bomba_dagua, leitura.data_hora_leitura)
+
+    if settings.INGESTAO_FANOUT:
+        # Modo fan-out: sensores + meteorologia + integrada em um round-trip, sem background
+        sucesso = inserir_dados_fanout(*args, device_id=leitura.device_id) is not None
+        if not sucesso:
+            sucesso = guardar_no_spool(leitura)
+        if sucesso:
+            marcar_gravadas((leitura,))
+        return sucesso
+
+    if fila_ingestao is not None:
+        # Fila write-behind: a leitura é gravada junto com as demais do mesmo lote
+        # (o lote vai para o spool local se o banco estiver fora)
+        sucesso_basico = fila_ingestao.enfileirar(leitura.registro())
+    else:
+        # RESPOSTA ULTRA-RÁPIDA: Pool de conexões
+        sucesso_basico = inserir_dados_ultra_rapido(*args, device_id=leitura.device_id)
+        if not sucesso_basico:
+            # Banco fora: sem meteorologia agora, a leitura espera o replay do spool
+            sucesso = guardar_no_spool(leitura)
+            if sucesso:
+                marcar_gravadas((leitura,))
+            return sucesso
+
+    if sucesso_basico:
+        marcar_gravadas((leitura,))
+        # AGENDA PROCESSAMENTO EM BACKGROUND (NÃO BLOQUEIA RESPOSTA)
+        if not executor_meteorologia.submeter(processar_meteorologia_background, *args, leitura.device_id):
+            print("BACKGROUND: fila cheia, meteorologia descartada para esta leitura")
+    return sucesso_basico
+
+def guardar_no_spool(leitura):
+    """Guarda a leitura no spool local quando o banco está indisponível."""
+    return spool_local is not None and spool_local.gravar([leitura.registro()])
+
+def gravar_leituras_lote(leituras):
+    """
+    Grava leituras de buffer (batch/binário) de uma vez, descartando reenvios.
+    Retorna (gravado, duplicadas, recusadas): índices ignorados por reenvio e índices
+    que o banco recusou (em quarentena, não adianta reenviar).
+    """
+    novas = []
+    duplicadas = set()
+    chaves_no_lote = set()
+    for indice, leitura in enumerate(leituras):
+        chave = leitura.chave()
+        if chave in chaves_no_lote or leitura_duplicada(leitura):
+            duplicadas.add(indice)
+        else:
+            chaves_no_lote.add(chave)
+            novas.append(leitura)
+
+    gravado, recusadas = gravar_ou_guardar([leitura.registro() for leitura in novas], metodo='copy')
+    chaves_recusadas = {(registro[0], registro[1]) for registro in recusadas}
+    recusadas = {indice for indice, leitura in enumerate(leituras)
+                 if indice not in duplicadas and leitura.chave() in chaves_recusadas}
+    if gravado:
+        marcar_gravadas([leitura for leitura in novas if leitura.chave() not in chaves_recusadas])
+    return gravado, duplicadas, recusadas
+
+def admissao_recusada(device_id):
+    """
+    Passa a requisição pelos token buckets (dispositivo e global) antes de qualquer acesso ao banco.
+    Retorna None se admitida, ou (status_texto, cabeçalhos) para a resposta 429.
+    """
+    if controle_admissao is None:
+        return None
+    admitida, espera, motivo = controle_admissao.admitir(device_id)
+    if admitida:
+        return None
+    status_texto = "THROTTLED" if motivo == MOTIVO_DISPOSITIVO else "OVERLOADED"
+    return status_texto, {"Retry-After": retry_after(espera)}
+
 @app.route('/data', methods=['GET'])
 def receive_data():
     """Recebe dados do ESP32 via GET parameters com RESPOSTA ULTRA-RÁPIDA."""
-    if request.method == 'GET':
-        timestamp = request.args.get('timestamp')    # Timestamp do ESP32
-        umidade = request.args.get('umidade')
-        temperatura = request.args.get('temperatura')
-        ph = request.args.get('ph')
-        fosforo = request.args.get('fosforo')
-        potassio = request.args.get('potassio')
-        rele = request.args.get('rele')
-        bomba_dagua = request.args.get('bomba_dagua')
-        
-        # Compatibilidade: aceita tanto 'rele' quanto 'bomba_dagua'
-        bomba_param = rele if rele is not None else bomba_dagua
+    # Decodificador dedicado: lê a query string bruta e converte cada campo uma única vez
+    try:
+        leitura = decodificar_leitura(request.query_string, settings.DEVICE_ID_PADRAO)
+    except ValueError:
+        return "INVALID_PARAMS", 400
 
-        # LOG MÍNIMO
-        print(f"ESP32: {umidade}%/{temperatura}°C/pH{ph}")
+    if leitura is None:
+        return "MISSING_PARAMS", 400
 
-        if umidade and temperatura and ph and fosforo and potassio and bomba_param:
-            # Converte para tipos corretos (minimal processing)
-            fosforo_bool = converter_para_boolean(fosforo)
-            potassio_bool = converter_para_boolean(potassio)
-            bomba_bool = converter_para_boolean(bomba_param)
-            
-            # RESPOSTA ULTRA-RÁPIDA: Pool de conexões
-            sucesso_basico = inserir_dados_ultra_rapido(float(umidade), float(temperatura), float(ph), 
-                                                       fosforo_bool, potassio_bool, bomba_bool, timestamp)
-            
-            if sucesso_basico:
-                # INICIA PROCESSAMENTO EM BACKGROUND (NÃO BLOQUEIA RESPOSTA)
-                thread_meteorologia = threading.Thread(
-                    target=processar_meteorologia_background,
-                    args=(float(umidade), float(temperatura), float(ph), 
-                          fosforo_bool, potassio_bool, bomba_bool, timestamp),
-                    daemon=True
-                )
-                thread_meteorologia.start()
-                
-                # RESPOSTA MÍNIMA E RÁPIDA
-                return "OK", 200
+    recusa = admissao_recusada(leitura.device_id)
+    if recusa:
+        return recusa[0], 429, recusa[1]
+
+    # LOG MÍNIMO
+    print(f"ESP32: {leitura.umidade}%/{leitura.temperatura}°C/pH{leitura.ph}")
+
+    # RESPOSTA MÍNIMA E RÁPIDA
+    return ("OK", 200) if registrar_leitura(leitura) else ("ERROR", 500)
+
+@app.route('/data/bin', methods=['POST'])
+def receive_data_binary():
+    """
+    Recebe leituras no protocolo binário compacto (ver protocolo_binario.py).
+    Um registro é tratado como leitura ao vivo (mesmo caminho do GET /data);
+    vários registros concatenados são gravados de uma vez, como no /data/batch.
+    """
+    try:
+        registros = decodificar_registros(request.get_data(cache=False))
+    except ErroProtocolo as e:
+        print(f"ESP32 BIN: {e}")
+        return "BAD_PAYLOAD", 400
+
+    # Uma requisição = um token, mesmo com várias leituras (buffer do ESP32)
+    recusa = admissao_recusada(registros[0][0])
+    if recusa:
+        return recusa[0], 429, recusa[1]
+
+    leituras = [Leitura(*registro) for registro in registros]
+    if len(leituras) == 1:
+        sucesso = registrar_leitura(leituras[0])
+    else:
+        sucesso, _, _ = gravar_leituras_lote(leituras)
+
+    return ("OK", 200) if sucesso else ("ERROR", 500)
+
+def interpretar_leitura_lote(item, device_id):
+    """
+    Valida uma leitura recebida em /data/batch.
+    Retorna (Leitura, None) se válida ou (None, status_de_erro).
+    """
+    if not isinstance(item, dict):
+        return None, "INVALID_ITEM"
+
+    bomba_param = item.get('rele', item.get('bomba_dagua'))
+    campos = (item.get('timestamp'), item.get('umidade'), item.get('temperatura'), item.get('ph'),
+              item.get('fosforo'), item.get('potassio'), bomba_param)
+    if any(campo is None or campo == "" for campo in campos):
+        return None, "MISSING_PARAMS"
+
+    # Leituras de buffer só fazem sentido com o horário do próprio ESP32: mesmo parser do /data
+    # ('YYYY-MM-DDTHH:MM:SS' completo; com fuso vira horário local sem fuso), sem cair no do servidor
+    data_hora_leitura = converter_timestamp_bytes(str(item['timestamp']).encode('utf-8'))
+    if data_hora_leitura is None:
+        return None, "INVALID_TIMESTAMP"
+
+    try:
+        umidade = float(item['umidade'])
+        temperatura = float(item['temperatura'])
+        ph = float(item['ph'])
+        device_id = str(item.get('device_id') or device_id)
+        validar_valores(device_id, umidade, temperatura, ph)
+    except (TypeError, ValueError):
+        return None, "INVALID_VALUE"
+
+    return Leitura(device_id, data_hora_leitura, umidade, temperatura, ph,
+                   converter_para_boolean(item['fosforo']),
+                   converter_para_boolean(item['potassio']),
+                   converter_para_boolean(bomba_param)), None
+
+@app.route('/data/batch', methods=['POST'])
+def receive_data_batch():
+    """
+    Recebe várias leituras em uma única requisição e grava todas com um único COPY.
+    Formatos aceitos:
+      - JSON: {"device_id": "...", "leituras": [{...}, ...]} ou apenas a lista [{...}, ...]
+      - NDJSON (application/x-ndjson): uma leitura JSON por linha
+    Cada leitura usa os mesmos campos do GET /data (timestamp obrigatório).
+    Reenvios de leituras já gravadas voltam com status DUPLICATE; leituras que o banco
+    recusa (valor fora da coluna, restrição) voltam com REJECTED e não devem ser reenviadas.
+    """
+    device_id = request.args.get('device_id')
+    corpo = request.get_data(as_text=True)
+
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+            itens = [json.loads(linha) for linha in corpo.splitlines() if linha.strip()]
+        else:
+            payload = json.loads(corpo)
+            if isinstance(payload, dict):
+                device_id = payload.get('device_id', device_id)
+                itens = payload.get('leituras')
             else:
-                return "ERROR", 500
+                itens = payload
+    except ValueError:
+        return jsonify({"erro": "JSON inválido"}), 400
+
+    if not isinstance(itens, list) or not itens:
+        return jsonify({"erro": "Nenhuma leitura recebida"}), 400
+    if len(itens) > settings.INGESTAO_BATCH_MAX_ITENS:
+        return jsonify({"erro": f"Lote acima do limite de {settings.INGESTAO_BATCH_MAX_ITENS} leituras"}), 413
+
+    device_id = device_id or settings.DEVICE_ID_PADRAO
+    recusa = admissao_recusada(device_id)
+    if recusa:
+        return jsonify({"erro": recusa[0]}), 429, recusa[1]
+
+    status_itens = []
+    leituras = []
+    indices_validos = []
+    for indice, item in enumerate(itens):
+        leitura, erro = interpretar_leitura_lote(item, device_id)
+        if erro:
+            status_itens.append({"indice": indice, "status": erro})
         else:
-            return "MISSING_PARAMS", 400
+            status_itens.append({"indice": indice, "status": "OK"})
+            leituras.append(leitura)
+            indices_validos.append(indice)
+
+    gravado, duplicadas, recusadas = gravar_leituras_lote(leituras)
+    for posicao, indice in enumerate(indices_validos):
+        if posicao in duplicadas:
+            status_itens[indice]["status"] = "DUPLICATE"
+        elif posicao in recusadas:
+            status_itens[indice]["status"] = "REJECTED"
+        elif not gravado:
+            status_itens[indice]["status"] = "ERROR"
+
+    # Reenvios contam como aceitos: o ESP32 pode descartá-los do buffer
+    aceitas = len(leituras) - len(recusadas) if gravado else len(duplicadas)
+    ultimo_timestamp = max(l.data_hora_leitura for l in leituras).isoformat() if leituras and gravado else None
+    print(f"ESP32 BATCH ({device_id}): {aceitas}/{len(itens)} leituras aceitas, {len(duplicadas)} reenvios")
+
+    return jsonify({
+        "device_id": device_id,
+        "recebidas": len(itens),
+        "aceitas": aceitas,
+        "duplicadas": len(duplicadas),
+        "rejeitadas": len(itens) - aceitas,
+        "ultimo_timestamp": ultimo_timestamp,
+        "itens": status_itens
+    }), (200 if gravado else 500)
 
 @app.route('/', methods=['GET'])
 def home():
@@ -761,9 +1151,14 @@ def home():
     <h2>Endpoints Disponíveis:</h2>
     <ul>
         <li><strong>GET /data</strong> - Recebe dados do ESP32</li>
-        <li><strong>GET /get_data</strong> - Lista todos os dados armazenados</li>
+        <li><strong>POST /data/batch</strong> - Recebe várias leituras de uma vez (JSON ou NDJSON)</li>
+        <li><strong>POST /data/bin</strong> - Recebe leituras no protocolo binário compacto (13 bytes por leitura)</li>
+        <li><strong>GET /get_data</strong> - Leituras paginadas, mais recentes primeiro (?limit=, ?since=, ?until=, ?cursor=, ?device_id=, ?format=rows|columns|arrow)</li>
+        <li><strong>GET /export</strong> - Exporta leituras em streaming, NDJSON ou CSV (?format=, ?since=, ?until=, ?device_id=)</li>
+        <li><strong>GET /series</strong> - Série agregada em baldes de tempo para gráficos (?since=, ?until=, ?bucket=, ?metrics=, ?agg=, ?points=, ?device_id=)</li>
         <li><strong>GET /status</strong> - Status do sistema</li>
-        <li><strong>GET /stats</strong> - Estatísticas dos dados</li>
+        <li><strong>GET /stats</strong> - Estatísticas dos dados (?device_id= filtra por ESP32)</li>
+        <li><strong>GET /metricas</strong> - Métricas da fila de ingestão e do processamento em background</li>
     </ul>
     <h2>Configuração:</h2>
     <p>Servidor rodando</p>
@@ -773,17 +1168,32 @@ def home():
     <p>Database: <strong>{DatabaseConfig.DATABASE}</strong></p>
     '''
 
+def leitura_para_json(leitura):
+    """Leitura do estado em memória no formato dos registros do /get_data."""
+    if leitura is None:
+        return None
+    return {
+        "device_id": leitura.device_id,
+        "data_hora_leitura": leitura.data_hora_leitura.isoformat(),
+        "umidade": float(leitura.umidade),
+        "temperatura": float(leitura.temperatura),
+        "ph": float(leitura.ph),
+        "fosforo": leitura.fosforo,
+        "potassio": leitura.potassio,
+        "bomba_dagua": leitura.bomba_dagua
+    }
+
 @app.route('/status', methods=['GET'])
 def status():
-    """Retorna status do sistema."""
-    dados = listar_dados()
-    
-    # Testa conexão
-    conn, cursor = conectar_postgres()
-    conexao_ok = conn is not None
-    if conn:
-        cursor.close()
-        conn.close()
+    """
+    Retorna status do sistema a partir do estado em memória (não consulta o banco).
+    Totais são estimativas do catálogo atualizadas a cada STATUS_INTERVALO_ATUALIZACAO segundos;
+    ?device_id=... devolve o último registro daquele dispositivo.
+    """
+    estado_servidor.iniciar()
+    device_id = request.args.get('device_id')
+    pool = metricas_pool()
+    estado_disjuntor = disjuntor_banco.estado
     
     return jsonify({
         "status": "online",
@@ -791,100 +1201,131 @@ def status():
         "host": DatabaseConfig.HOST,
         "database": DatabaseConfig.DATABASE,
         "schema": DatabaseConfig.SCHEMA,
-        "conexao_ok": conexao_ok,
-        "total_registros": len(dados),
-        "ultimo_registro": dados[0] if dados else None
+        "conexao_ok": estado_servidor.banco_ok is not False and estado_disjuntor == "fechado",
+        "disjuntor": estado_disjuntor,
+        "total_registros": estado_servidor.estimativas.get('leituras_sensores', 0),  # Estimativa
+        "estimativas": estado_servidor.estimativas,
+        "estimativas_atualizadas_em": (estado_servidor.atualizado_em.isoformat()
+                                       if estado_servidor.atualizado_em else None),
+        "dispositivos": estado_servidor.dispositivos(),
+        "device_id": device_id,
+        "ultimo_registro": leitura_para_json(estado_servidor.ultima_leitura(device_id)),
+        "pool": {chave: pool[chave] for chave in ("em_uso", "ociosas", "total", "maximo",
+                                                   "aguardando", "falhas_checkout")} if pool else None
+    })
+
+@app.route('/metricas', methods=['GET'])
+def metricas():
+    """Retorna métricas internas de ingestão e processamento em background."""
+    return jsonify({
+        "fila_ingestao": fila_ingestao.metricas() if fila_ingestao is not None else None,
+        "executor_meteorologia": executor_meteorologia.metricas(),
+        "executor_estatisticas": executor_estatisticas.metricas(),
+        "deduplicacao": filtro_duplicatas.metricas() if filtro_duplicatas is not None else None,
+        "spool": spool_local.metricas() if spool_local is not None else None,
+        "grupo_commit": grupo_commit.metricas() if grupo_commit is not None else None,
+        "estado_status": estado_servidor.metricas(),
+        "cache_respostas": cache_respostas.metricas(),
+        "consultas_preparadas": consultas.metricas(),
+        "pool": metricas_pool(),
+        "disjuntor": metricas_disjuntor(),
+        "replica": metricas_replica(),
+        "admissao": controle_admissao.metricas() if controle_admissao is not None else None
     })
 
+def ler_resumo_estatisticas(cursor, device_id=None):
+    """
+    Lê o resumo incremental (estatisticas_agregadas.py) das três tabelas.
+    Retorna ((sensores, meteorologia, integrado), desatualizado).
+    """
+    sensores, d_sensores = ler_estatisticas(cursor, DatabaseConfig.SCHEMA, 'leituras_sensores', device_id)
+    meteo, d_meteo = ler_estatisticas(cursor, DatabaseConfig.SCHEMA, 'dados_meteorologicos')
+    integrado, d_integrado = ler_estatisticas(cursor, DatabaseConfig.SCHEMA, 'leituras_integradas', device_id)
+    return (sensores, meteo, integrado), d_sensores or d_meteo or d_integrado
+
+def atualizar_estatisticas_desatualizadas():
+    """UPDATE/DELETE no dashboard marcam dispositivos: recalcula só esses, no primário."""
+    with conexao_pool() as (conn, cursor):
+        recalculados = reconstruir_desatualizadas(cursor, DatabaseConfig.SCHEMA)
+        conn.commit()
+    return recalculados
+
+def marcar_stats_desatualizado(stats):
+    """
+    Resumo com dispositivos marcados: responde com os valores anteriores e a marca
+    `desatualizado` e agenda o recálculo em background (a rota não guarda a resposta em cache).
+    """
+    executor_estatisticas.submeter(atualizar_estatisticas_desatualizadas)
+    stats["desatualizado"] = True
+
+def _arredondar(estatisticas, coluna, campo="media"):
+    valor = estatisticas.get(coluna, {}).get(campo)
+    return round(float(valor), 1) if valor else 0
+
+def _resumo_coluna(estatisticas, coluna, media="media", minimo="minima", maximo="maxima"):
+    return {
+        media: _arredondar(estatisticas, coluna),
+        minimo: _arredondar(estatisticas, coluna, "minimo"),
+        maximo: _arredondar(estatisticas, coluna, "maximo"),
+        "desvio_padrao": _arredondar(estatisticas, coluna, "desvio_padrao")
+    }
+
+def montar_resposta_stats(sensores, meteo, integrado, device_id=None):
+    """JSON do /stats a partir do resumo das três tabelas (compartilhado com o serve_async)."""
+    total = sensores.get('*', {}).get('n', 0)
+    total_meteo = meteo.get('*', {}).get('n', 0)
+    if total == 0:
+        return {"erro": "Nenhum dado disponível"}
+    return {
+        "device_id": device_id,
+        "sensores": {
+            "total_registros": total,
+            "umidade": _resumo_coluna(sensores, 'umidade'),
+            "temperatura": _resumo_coluna(sensores, 'temperatura'),
+            "ph": _resumo_coluna(sensores, 'ph', "medio", "minimo", "maximo")
+        },
+        "meteorologia": {
+            "total_registros": total_meteo,
+            "temperatura_externa_media": _arredondar(meteo, 'temperatura_externa'),
+            "umidade_ar_media": _arredondar(meteo, 'umidade_ar'),
+            "probabilidade_chuva_media": _arredondar(meteo, 'probabilidade_chuva')
+        },
+        "integrado": {
+            "total_registros": integrado.get('*', {}).get('n', 0),
+            "evapotranspiracao_media": _arredondar(integrado, 'fator_evapotranspiracao'),
+            "previsoes_chuva": int(integrado.get('previsao_chuva', {}).get('soma') or 0)
+        },
+        "status_integracao": "Ativo" if total_meteo > 0 else "Sem dados meteorológicos"
+    }
+
 @app.route('/stats', methods=['GET'])
+@resposta_em_cache('leituras_sensores', 'dados_meteorologicos', 'leituras_integradas')
 def get_statistics():
-    """Retorna estatísticas dos dados incluindo dados integrados."""
-    conn, cursor = conectar_postgres()
-    stats = {}
+    """
+    Retorna estatísticas dos dados incluindo dados integrados.
+    ?device_id=... restringe sensores e dados integrados a um dispositivo
+    (a meteorologia é da região, comum a todos).
+    Lê o resumo mantido na ingestão: o custo não depende do número de linhas.
+    Com registros alterados/removidos pelo CRUD ainda não recalculados, devolve o resumo
+    anterior com "desatualizado": true (o recálculo roda em background).
+    """
+    device_id = request.args.get('device_id')
     
-    if conn and cursor:
-        try:
-            # Estatísticas da tabela básica
-            cursor.execute(f"""
-                SELECT 
-                    COUNT(*) as total_registros,
-                    AVG(umidade) as umidade_media,
-                    MIN(umidade) as umidade_min,
-                    MAX(umidade) as umidade_max,
-                    AVG(temperatura) as temp_media,
-                    MIN(temperatura) as temp_min,
-                    MAX(temperatura) as temp_max,
-                    AVG(ph) as ph_medio,
-                    MIN(ph) as ph_min,
-                    MAX(ph) as ph_max
-                FROM {DatabaseConfig.SCHEMA}.leituras_sensores
-            """)
-            result = cursor.fetchone()
-            
-            # Estatísticas da tabela meteorológica
-            cursor.execute(f"""
-                SELECT 
-                    COUNT(*) as total_meteo,
-                    AVG(temperatura_externa) as temp_ext_media,
-                    AVG(umidade_ar) as umidade_ar_media,
-                    AVG(probabilidade_chuva) as prob_chuva_media
-                FROM {DatabaseConfig.SCHEMA}.dados_meteorologicos
-            """)
-            meteo_result = cursor.fetchone()
-            
-            # Estatísticas da tabela integrada
-            cursor.execute(f"""
-                SELECT 
-                    COUNT(*) as total_integrado,
-                    AVG(fator_evapotranspiracao) as evapo_media,
-                    COUNT(CASE WHEN probabilidade_chuva > 70 THEN 1 END) as previsoes_chuva
-                FROM {DatabaseConfig.SCHEMA}.leituras_integradas
-            """)
-            integrado_result = cursor.fetchone()
-            
-            if result and result[0] > 0:
-                stats = {
-                    "sensores": {
-                        "total_registros": result[0],
-                        "umidade": {
-                            "media": round(float(result[1]), 1) if result[1] else 0,
-                            "minima": round(float(result[2]), 1) if result[2] else 0,
-                            "maxima": round(float(result[3]), 1) if result[3] else 0
-                        },
-                        "temperatura": {
-                            "media": round(float(result[4]), 1) if result[4] else 0,
-                            "minima": round(float(result[5]), 1) if result[5] else 0,
-                            "maxima": round(float(result[6]), 1) if result[6] else 0
-                        },
-                        "ph": {
-                            "medio": round(float(result[7]), 1) if result[7] else 0,
-                            "minimo": round(float(result[8]), 1) if result[8] else 0,
-                            "maximo": round(float(result[9]), 1) if result[9] else 0
-                        }
-                    },
-                    "meteorologia": {
-                        "total_registros": meteo_result[0] if meteo_result else 0,
-                        "temperatura_externa_media": round(float(meteo_result[1]), 1) if meteo_result and meteo_result[1] else 0,
-                        "umidade_ar_media": round(float(meteo_result[2]), 1) if meteo_result and meteo_result[2] else 0,
-                        "probabilidade_chuva_media": round(float(meteo_result[3]), 1) if meteo_result and meteo_result[3] else 0
-                    },
-                    "integrado": {
-                        "total_registros": integrado_result[0] if integrado_result else 0,
-                        "evapotranspiracao_media": round(float(integrado_result[1]), 1) if integrado_result and integrado_result[1] else 0,
-                        "previsoes_chuva": integrado_result[2] if integrado_result else 0
-                    },
-                    "status_integracao": "Ativo" if (meteo_result and meteo_result[0] > 0) else "Sem dados meteorológicos"
-                }
-            else:
-                stats = {"erro": "Nenhum dado disponível"}
+    try:
+        with conexao_leitura() as (conn, cursor):
+            (sensores, meteo, integrado), desatualizado = ler_resumo_estatisticas(cursor, device_id)
+        
+        stats = montar_resposta_stats(sensores, meteo, integrado, device_id)
+        if desatualizado:
+            marcar_stats_desatualizado(stats)
+            nao_guardar_em_cache()
                 
-        except Exception as e:
-            stats = {"erro": f"Erro ao calcular estatísticas: {e}"}
-        finally:
-            cursor.close()
-            conn.close()
-    else:
+    except BancoIndisponivel:
         stats = {"erro": "Erro de conexão com banco"}
+        nao_guardar_em_cache()
+    except Exception as e:
+        stats = {"erro": f"Erro ao calcular estatísticas: {e}"}
+        nao_guardar_em_cache()
     
     return jsonify(stats)
 
@@ -942,39 +1383,53 @@ def test_integration():
         }), 500
 
 @app.route('/integrated_data', methods=['GET'])
+@resposta_em_cache('leituras_integradas')
 def get_integrated_data():
-    """Retorna dados da tabela integrada para análise ML."""
-    conn, cursor = conectar_postgres()
-    registros = []
+    """
+    Retorna dados da tabela integrada para análise ML (?device_id=... filtra por dispositivo).
+    ?limit=N (padrão 50, até GET_DATA_LIMITE_MAX); ?format=columns|arrow devolve em colunas.
+    """
+    device_id = request.args.get('device_id')
+    try:
+        limite = interpretar_limite(request.args.get('limit'), 50, settings.GET_DATA_LIMITE_MAX)
+        formato = interpretar_formato(request.args.get('format'))
+    except (ErroPaginacao, ErroFormato) as e:
+        return jsonify({"erro": str(e)}), 400
+    colunas, linhas = [], []
     
-    if conn and cursor:
-        try:
+    try:
+        with conexao_leitura() as (conn, cursor):
+            filtro = "WHERE device_id = %s" if device_id else ""
             cursor.execute(f"""
                 SELECT * FROM {DatabaseConfig.SCHEMA}.view_ml_completa 
+                {filtro}
                 ORDER BY data_hora_leitura DESC
-                LIMIT 50
-            """)
+                LIMIT %s
+            """, (device_id, limite) if device_id else (limite,))
             colunas = [desc[0] for desc in cursor.description]
-            for row in cursor:
-                registro = dict(zip(colunas, row))
-                # Converte timestamps para string
-                if registro.get('data_hora_leitura'):
-                    registro['data_hora_leitura'] = registro['data_hora_leitura'].isoformat()
-                registros.append(registro)
+            linhas = cursor.fetchall()
                 
-        except Exception as error:
-            print(f"Erro ao listar dados integrados: {error}")
-        finally:
-            cursor.close()
-            conn.close()
+    except Exception as error:
+        print(f"Erro ao listar dados integrados: {error}")
+        nao_guardar_em_cache()
     
-    return jsonify({
+    envelope = {
         "schema": DatabaseConfig.SCHEMA,
         "view": "view_ml_completa",
-        "total_features": len(registros[0]) if registros else 0,
-        "total_registros": len(registros),
-        "dados": registros
-    })
+        "total_features": len(colunas) if linhas else 0,
+        "total_registros": len(linhas)
+    }
+    if formato != FORMATO_LINHAS:
+        return resposta_colunar(formato, envelope, colunas, linhas)
+    
+    registros = []
+    for row in linhas:
+        registro = dict(zip(colunas, row))
+        # Converte timestamps para string
+        if registro.get('data_hora_leitura'):
+            registro['data_hora_leitura'] = registro['data_hora_leitura'].isoformat()
+        registros.append(registro)
+    return jsonify({**envelope, "dados": registros})
 
 # === NOVAS FUNÇÕES PARA DADOS METEOROLÓGICOS AUTOMÁTICOS ===
 def coletar_dados_meteorologicos():
@@ -1105,18 +1560,11 @@ def salvar_dados_meteorologicos(dados_meteo, timestamp=None):
     """
     Salva dados meteorológicos na tabela dados_meteorologicos.
     """
-    conn, cursor = conectar_postgres()
-    if conn and cursor:
-        try:
+    try:
+        with conexao_pool() as (conn, cursor):
             data_coleta = timestamp if timestamp else datetime.now(BRASIL_TZ)
             
-            cursor.execute(f"""
-                INSERT INTO {DatabaseConfig.SCHEMA}.dados_meteorologicos 
-                (data_hora_coleta, temperatura_externa, umidade_ar, pressao_atmosferica, 
-                 velocidade_vento, direcao_vento, condicao_clima, probabilidade_chuva, 
-                 quantidade_chuva, indice_uv, visibilidade, cidade, fonte_dados)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
+            consultas.executar(cursor, 'inserir_meteorologia', (
                 data_coleta,
                 dados_meteo['temperatura_externa'],
                 dados_meteo['umidade_ar'],
@@ -1136,14 +1584,9 @@ def salvar_dados_meteorologicos(dados_meteo, timestamp=None):
             print("Dados meteorologicos salvos no banco!")
             return True
             
-        except Exception as error:
-            print(f"Erro ao salvar dados meteorologicos: {error}")
-            conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+    except Exception as error:
+        print(f"Erro ao salvar dados meteorologicos: {error}")
+        return False
 
 def calcular_fatores_avancados(dados_sensores, dados_meteo):
     """
@@ -1178,22 +1621,16 @@ def calcular_fatores_avancados(dados_sensores, dados_meteo):
             'fator_evapotranspiracao': 5.0
         }
 
-def criar_leitura_integrada(dados_sensores, dados_meteo, fatores, timestamp=None):
+def criar_leitura_integrada(dados_sensores, dados_meteo, fatores, timestamp=None, device_id=None):
     """
     Cria uma entrada na tabela leituras_integradas combinando todos os dados.
     """
-    conn, cursor = conectar_postgres()
-    if conn and cursor:
-        try:
-            data_leitura = timestamp if timestamp else datetime.now(BRASIL_TZ)
+    try:
+        with conexao_pool() as (conn, cursor):
+            data_leitura = converter_timestamp(timestamp) if timestamp else datetime.now(BRASIL_TZ)
             
-            cursor.execute(f"""
-                INSERT INTO {DatabaseConfig.SCHEMA}.leituras_integradas 
-                (data_hora_leitura, umidade_solo, temperatura_solo, ph_solo, fosforo, potassio, bomba_dagua,
-                 temperatura_externa, umidade_ar, pressao_atmosferica, velocidade_vento, condicao_clima,
-                 probabilidade_chuva, quantidade_chuva, diferenca_temperatura, deficit_umidade, fator_evapotranspiracao)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
+            consultas.executar(cursor, 'inserir_integrada', (
+                device_id or settings.DEVICE_ID_PADRAO,
                 data_leitura,
                 dados_sensores['umidade'],
                 dados_sensores['temperatura'],
@@ -1217,16 +1654,12 @@ def criar_leitura_integrada(dados_sensores, dados_meteo, fatores, timestamp=None
             print("Leitura integrada (sensores + meteorologia) salva!")
             return True
             
-        except Exception as error:
-            print(f"Erro ao salvar leitura integrada: {error}")
-            conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+    except Exception as error:
+        print(f"Erro ao salvar leitura integrada: {error}")
+        return False
 
-def inserir_dados_completo(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None):
+def inserir_dados_completo(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None,
+                           device_id=None):
     """
     Versão OTIMIZADA que salva dados de sensores + meteorologia rapidamente.
     
@@ -1237,20 +1670,8 @@ def inserir_dados_completo(umidade, temperatura, ph, fosforo, potassio, bomba_da
     4. Resposta rápida para o ESP32
     """
     # Usa timestamp do ESP32 se fornecido, senão usa timestamp do servidor
-    if timestamp_esp32:
-        if isinstance(timestamp_esp32, str):
-            try:
-                data_hora_leitura = datetime.strptime(timestamp_esp32, "%Y-%m-%dT%H:%M:%S")
-            except ValueError:
-                try:
-                    data_hora_leitura = datetime.strptime(timestamp_esp32, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    print(f"Formato de timestamp inválido: {timestamp_esp32}")
-                    data_hora_leitura = datetime.now()
-        else:
-            data_hora_leitura = timestamp_esp32
-    else:
-        data_hora_leitura = datetime.now()
+    data_hora_leitura = converter_timestamp(timestamp_esp32)
+    device_id = device_id or settings.DEVICE_ID_PADRAO
         
     # Organiza dados dos sensores
     dados_sensores = {
@@ -1265,131 +1686,382 @@ def inserir_dados_completo(umidade, temperatura, ph, fosforo, potassio, bomba_da
     print(f"PROCESSO OTIMIZADO: Salvando dados em transacao unica...")
     
     # OTIMIZAÇÃO: Uma única conexão para tudo
-    conn, cursor = conectar_postgres()
-    if not conn or not cursor:
-        print("Erro de conexão com banco!")
-        return False
-    
     try:
-        # Inicia transação
-        cursor.execute("BEGIN")
-        
-        # 1. Salva dados dos sensores (RÁPIDO)
-        cursor.execute(f"""
-            INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores 
-            (data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua
-        ))
+        # Transação aberta pelo primeiro comando, confirmada no commit
+        with conexao_pool() as (conn, cursor):
+            # 1. Salva dados dos sensores (RÁPIDO)
+            consultas.executar(cursor, 'inserir_leitura', (
+                device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua
+            ))
         
-        # 2. Coleta dados meteorológicos (RÁPIDO - sem I/O)
-        dados_meteo = coletar_dados_meteorologicos()
+            # 2. Coleta dados meteorológicos (RÁPIDO - sem I/O)
+            dados_meteo = coletar_dados_meteorologicos()
         
-        # 3. Salva dados meteorológicos (RÁPIDO)
-        cursor.execute(f"""
-            INSERT INTO {DatabaseConfig.SCHEMA}.dados_meteorologicos 
-            (data_hora_coleta, temperatura_externa, umidade_ar, pressao_atmosferica, 
-             velocidade_vento, direcao_vento, condicao_clima, probabilidade_chuva, 
-             quantidade_chuva, indice_uv, visibilidade, cidade, fonte_dados)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            data_hora_leitura,
-            dados_meteo['temperatura_externa'],
-            dados_meteo['umidade_ar'],
-            dados_meteo['pressao_atmosferica'],
-            dados_meteo['velocidade_vento'],
-            dados_meteo['direcao_vento'],
-            dados_meteo['condicao_clima'],
-            dados_meteo['probabilidade_chuva'],
-            dados_meteo['quantidade_chuva'],
-            dados_meteo['indice_uv'],
-            dados_meteo['visibilidade'],
-            dados_meteo['cidade'],
-            dados_meteo['fonte_dados']
-        ))
+            # 3. Salva dados meteorológicos (RÁPIDO)
+            consultas.executar(cursor, 'inserir_meteorologia', (
+                data_hora_leitura,
+                dados_meteo['temperatura_externa'],
+                dados_meteo['umidade_ar'],
+                dados_meteo['pressao_atmosferica'],
+                dados_meteo['velocidade_vento'],
+                dados_meteo['direcao_vento'],
+                dados_meteo['condicao_clima'],
+                dados_meteo['probabilidade_chuva'],
+                dados_meteo['quantidade_chuva'],
+                dados_meteo['indice_uv'],
+                dados_meteo['visibilidade'],
+                dados_meteo['cidade'],
+                dados_meteo['fonte_dados']
+            ))
         
-        # 4. Calcula fatores derivados (RÁPIDO - apenas matemática)
-        diferenca_temp = dados_meteo['temperatura_externa'] - dados_sensores['temperatura']
-        deficit_umidade = dados_meteo['umidade_ar'] - dados_sensores['umidade']
-        fator_evapo = (
-            (dados_meteo['temperatura_externa'] * 0.4) +
-            (dados_meteo['velocidade_vento'] * 0.3) +
-            ((100 - dados_meteo['umidade_ar']) * 0.3)
-        ) / 10
+            # 4. Calcula fatores derivados (RÁPIDO - apenas matemática)
+            diferenca_temp = dados_meteo['temperatura_externa'] - dados_sensores['temperatura']
+            deficit_umidade = dados_meteo['umidade_ar'] - dados_sensores['umidade']
+            fator_evapo = (
+                (dados_meteo['temperatura_externa'] * 0.4) +
+                (dados_meteo['velocidade_vento'] * 0.3) +
+                ((100 - dados_meteo['umidade_ar']) * 0.3)
+            ) / 10
         
-        # 5. Cria entrada integrada (RÁPIDO)
-        cursor.execute(f"""
-            INSERT INTO {DatabaseConfig.SCHEMA}.leituras_integradas 
-            (data_hora_leitura, umidade_solo, temperatura_solo, ph_solo, fosforo, potassio, bomba_dagua,
-             temperatura_externa, umidade_ar, pressao_atmosferica, velocidade_vento, condicao_clima,
-             probabilidade_chuva, quantidade_chuva, diferenca_temperatura, deficit_umidade, fator_evapotranspiracao)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            data_hora_leitura,
-            dados_sensores['umidade'],
-            dados_sensores['temperatura'],
-            dados_sensores['ph'],
-            dados_sensores['fosforo'],
-            dados_sensores['potassio'],
-            dados_sensores['bomba_dagua'],
-            dados_meteo['temperatura_externa'],
-            dados_meteo['umidade_ar'],
-            dados_meteo['pressao_atmosferica'],
-            dados_meteo['velocidade_vento'],
-            dados_meteo['condicao_clima'],
-            dados_meteo['probabilidade_chuva'],
-            dados_meteo['quantidade_chuva'],
-            round(diferenca_temp, 2),
-            round(deficit_umidade, 2),
-            round(fator_evapo, 2)
-        ))
+            # 5. Cria entrada integrada (RÁPIDO)
+            consultas.executar(cursor, 'inserir_integrada', (
+                device_id,
+                data_hora_leitura,
+                dados_sensores['umidade'],
+                dados_sensores['temperatura'],
+                dados_sensores['ph'],
+                dados_sensores['fosforo'],
+                dados_sensores['potassio'],
+                dados_sensores['bomba_dagua'],
+                dados_meteo['temperatura_externa'],
+                dados_meteo['umidade_ar'],
+                dados_meteo['pressao_atmosferica'],
+                dados_meteo['velocidade_vento'],
+                dados_meteo['condicao_clima'],
+                dados_meteo['probabilidade_chuva'],
+                dados_meteo['quantidade_chuva'],
+                round(diferenca_temp, 2),
+                round(deficit_umidade, 2),
+                round(fator_evapo, 2)
+            ))
         
-        # Confirma transação
-        conn.commit()
+            # Confirma transação
+            conn.commit()
         
-        print(f"OTIMIZADO: Dados salvos em 3 tabelas simultaneamente!")
-        print(f"Meteorologia: {dados_meteo['condicao_clima']}, {dados_meteo['temperatura_externa']}%C")
+            print(f"OTIMIZADO: Dados salvos em 3 tabelas simultaneamente!")
+            print(f"Meteorologia: {dados_meteo['condicao_clima']}, {dados_meteo['temperatura_externa']}%C")
         
-        return True
+            return True
         
+    except BancoIndisponivel:
+        print("Erro de conexão com banco!")
+        return False
     except Exception as error:
         print(f"Erro na transacao otimizada: {error}")
-        conn.rollback()
         return False
-    finally:
-        cursor.close()
-        conn.close()
-
-def inserir_dados_ultra_rapido(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None):
-    """Versão ULTRA-RÁPIDA usando pool de conexões."""
-    conn, cursor = obter_conexao_pool()
-    if conn and cursor:
-        # Timestamp processing (minimal)
-        if timestamp_esp32 and isinstance(timestamp_esp32, str):
-            try:
-                data_hora_leitura = datetime.strptime(timestamp_esp32, "%Y-%m-%dT%H:%M:%S")
-            except ValueError:
-                data_hora_leitura = datetime.now()
-        else:
-            data_hora_leitura = datetime.now()
-            
-        try:
+
+def inserir_dados_fanout(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None, device_id=None):
+    """
+    Grava sensores, meteorologia e leitura integrada em UM round-trip ao servidor.
+    
+    Um único comando (CTE com INSERT ... RETURNING) insere as três linhas e
+    liga a leitura integrada às linhas de origem pelos ids retornados. A
+    conexão do pool fica em autocommit só durante o comando: o próprio
+    comando é a transação, sem BEGIN/COMMIT separados. Com o group commit
+    ativo o comando entra na transação compartilhada do grupo.
+    Retorna (id_leitura_sensor, id_dados_meteorologicos, id_leitura_integrada),
+    () se a leitura já existia (nada é gravado) ou None em caso de erro.
+    """
+    data_hora_leitura = converter_timestamp(timestamp_esp32)
+    dados_sensores = {
+        'umidade': umidade,
+        'temperatura': temperatura,
+        'ph': ph,
+        'fosforo': fosforo,
+        'potassio': potassio,
+        'bomba_dagua': bomba_dagua
+    }
+    dados_meteo = coletar_dados_meteorologicos()
+    fatores = calcular_fatores_avancados(dados_sensores, dados_meteo)
+
+    parametros = {'device_id': device_id or settings.DEVICE_ID_PADRAO, 'data_hora': data_hora_leitura,
+                  **dados_sensores, **dados_meteo, **fatores}
+
+    def gravar(cursor):
+        cursor.execute(f"""
+            WITH sensor AS (
+                INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores
+                (device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
+                VALUES (%(device_id)s, %(data_hora)s, %(umidade)s, %(temperatura)s, %(ph)s,
+                        %(fosforo)s, %(potassio)s, %(bomba_dagua)s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            ), meteo AS (
+                -- Só grava meteorologia se a leitura do sensor for nova (SELECT ... FROM sensor)
+                INSERT INTO {DatabaseConfig.SCHEMA}.dados_meteorologicos
+                (data_hora_coleta, temperatura_externa, umidade_ar, pressao_atmosferica,
+                 velocidade_vento, direcao_vento, condicao_clima, probabilidade_chuva,
+                 quantidade_chuva, indice_uv, visibilidade, cidade, fonte_dados)
+                SELECT %(data_hora)s, %(temperatura_externa)s, %(umidade_ar)s, %(pressao_atmosferica)s,
+                       %(velocidade_vento)s, %(direcao_vento)s, %(condicao_clima)s, %(probabilidade_chuva)s,
+                       %(quantidade_chuva)s, %(indice_uv)s, %(visibilidade)s, %(cidade)s, %(fonte_dados)s
+                FROM sensor
+                RETURNING id
+            )
+            INSERT INTO {DatabaseConfig.SCHEMA}.leituras_integradas
+            (device_id, data_hora_leitura, umidade_solo, temperatura_solo, ph_solo, fosforo, potassio, bomba_dagua,
+             temperatura_externa, umidade_ar, pressao_atmosferica, velocidade_vento, condicao_clima,
+             probabilidade_chuva, quantidade_chuva, diferenca_temperatura, deficit_umidade, fator_evapotranspiracao,
+             id_leitura_sensor, id_dados_meteorologicos)
+            SELECT %(device_id)s, %(data_hora)s, %(umidade)s, %(temperatura)s, %(ph)s, %(fosforo)s, %(potassio)s, %(bomba_dagua)s,
+                   %(temperatura_externa)s, %(umidade_ar)s, %(pressao_atmosferica)s, %(velocidade_vento)s, %(condicao_clima)s,
+                   %(probabilidade_chuva)s, %(quantidade_chuva)s, %(diferenca_temperatura)s, %(deficit_umidade)s,
+                   %(fator_evapotranspiracao)s, sensor.id, meteo.id
+            FROM sensor, meteo
+            RETURNING id_leitura_sensor, id_dados_meteorologicos, id
+        """, parametros)
+        return cursor.fetchone() or ()
+
+    if grupo_commit is not None:
+        # O comando entra na transação compartilhada do grupo (um commit para várias leituras)
+        return grupo_commit.executar(gravar)
+
+    try:
+        with conexao_pool(autocommit=True) as (conn, cursor):
+            return gravar(cursor)
+    except BancoIndisponivel:
+        return None
+    except Exception as error:
+        print(f"Erro na escrita fan-out: {error}")
+        return None
+
+def inserir_dados_ultra_rapido(umidade, temperatura, ph, fosforo, potassio, bomba_dagua, timestamp_esp32=None,
+                               device_id=None):
+    """
+    Versão ULTRA-RÁPIDA usando pool de conexões (reenvios já gravados são ignorados).
+    Com o group commit ativo, requisições simultâneas dividem a mesma transação e o mesmo commit.
+    """
+    # Timestamp processing (minimal)
+    registro = (device_id or settings.DEVICE_ID_PADRAO, converter_timestamp(timestamp_esp32),
+                umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
+
+    def gravar(cursor):
+        consultas.executar(cursor, 'inserir_leitura', registro)
+        return True
+
+    if grupo_commit is not None:
+        return grupo_commit.executar(gravar) is True
+
+    try:
+        with conexao_pool() as (conn, cursor):
             # Ultra-fast insert usando pool
-            cursor.execute(f"""
-                INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores 
-                (data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua))
+            gravar(cursor)
             conn.commit()
             return True
-        except Exception:
+    except Exception:
+        return False
+
+# === GRAVAÇÃO EM LOTE (FILA WRITE-BEHIND) ===
+COLUNAS_LEITURA = "device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua"
+
+# Banco fora (passageiro): o lote vai para o spool e volta no replay
+ERROS_CONEXAO = (psycopg2.OperationalError, psycopg2.InterfaceError, BancoIndisponivel)
+# Leitura que o banco recusa (fora da coluna, restrição): falharia igual em toda nova tentativa
+ERROS_DADOS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+def inserir_lote_leituras(registros, metodo=None):
+    """
+    Grava várias leituras em uma única transação e um único commit.
+    Cada registro é uma tupla na ordem de COLUNAS_LEITURA (ver Leitura.registro()).
+    metodo: 'values' (INSERT multi-linha) ou 'copy' (COPY FROM STDIN).
+    Leituras já existentes (mesmo device_id e data_hora_leitura) são ignoradas.
+
+    Retorna a lista de registros recusados pelo banco (vazia se todos foram gravados),
+    ou None se o banco está indisponível (nada garantido: o lote inteiro deve ir para o spool).
+    """
+    if not registros:
+        return []
+
+    metodo = metodo or settings.INGESTAO_METODO
+    try:
+        with conexao_pool() as (conn, cursor):
+            try:
+                if metodo == 'copy':
+                    # COPY não aceita ON CONFLICT: carrega numa tabela temporária e insere a partir dela
+                    cursor.execute("""
+                        CREATE TEMP TABLE IF NOT EXISTS leituras_copy (
+                            device_id VARCHAR(64), data_hora_leitura TIMESTAMP, umidade DECIMAL(5,2),
+                            temperatura DECIMAL(5,2), ph DECIMAL(4,2), fosforo BOOLEAN, potassio BOOLEAN,
+                            bomba_dagua BOOLEAN
+                        ) ON COMMIT DELETE ROWS
+                    """)
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(registros)
+                    buffer.seek(0)
+                    cursor.copy_expert(f"COPY leituras_copy ({COLUNAS_LEITURA}) FROM STDIN WITH (FORMAT csv)", buffer)
+                    cursor.execute(f"""
+                        INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores ({COLUNAS_LEITURA})
+                        SELECT {COLUNAS_LEITURA} FROM leituras_copy
+                        ON CONFLICT DO NOTHING
+                    """)
+                else:
+                    execute_values(
+                        cursor,
+                        f"INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores ({COLUNAS_LEITURA}) VALUES %s "
+                        f"ON CONFLICT DO NOTHING",
+                        registros,
+                        page_size=len(registros)
+                    )
+                conn.commit()
+                return []
+            except ERROS_DADOS as error:
+                # Uma leitura ruim derruba o lote todo: refaz uma a uma para gravar as demais
+                conn.rollback()
+                print(f"Lote de {len(registros)} leituras recusado ({error}); gravando uma a uma")
+                return inserir_leituras_individualmente(conn, cursor, registros)
+    except ERROS_CONEXAO:
+        return None
+    except Exception as error:
+        print(f"Erro ao gravar lote de {len(registros)} leituras: {error}")
+        return None
+
+def inserir_leituras_individualmente(conn, cursor, registros):
+    """
+    Uma transação por leitura (como GrupoCommit._gravar_individualmente).
+    Retorna as recusadas; erro de conexão no meio sobe (o lote inteiro vai para o spool,
+    as já gravadas são ignoradas no replay pelo ON CONFLICT).
+    """
+    recusadas = []
+    for registro in registros:
+        try:
+            consultas.executar(cursor, 'inserir_leitura', registro)
+            conn.commit()
+        except ERROS_DADOS as error:
             conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            devolver_conexao_pool(conn)
-    return False
+            print(f"Leitura recusada pelo banco ({registro[0]}, {registro[1]}): {error}")
+            recusadas.append(registro)
+    return recusadas
+
+def descartar_recusadas(registros):
+    """Leituras recusadas pelo banco não vão para o spool (travariam o replay): ficam na quarentena."""
+    if registros and spool_local is not None:
+        spool_local.quarentenar(registros, "recusadas pelo banco")
+
+def gravar_ou_guardar(registros, metodo=None):
+    """
+    Grava o lote no banco; se o banco estiver indisponível, guarda no spool local.
+    Retorna (salvo, recusadas): salvo é True se as leituras ficaram no banco ou no spool;
+    recusadas são as que o banco não aceita (registradas e postas em quarentena).
+    """
+    recusadas = inserir_lote_leituras(registros, metodo)
+    if recusadas is None:
+        return spool_local is not None and spool_local.gravar(registros), []
+    descartar_recusadas(recusadas)
+    return True, recusadas
+
+def gravar_lote_ou_spool(registros, metodo=None):
+    """Gravação da fila de ingestão: True se o lote foi resolvido (banco, spool ou quarentena)."""
+    return gravar_ou_guardar(registros, metodo)[0]
+
+def reenviar_lote_spool(registros):
+    """Gravação usada pelo replay do spool: COPY em lotes grandes (o pool é recriado sob demanda)."""
+    recusadas = inserir_lote_leituras(registros, metodo='copy')
+    if recusadas is None:
+        return False
+    if recusadas:
+        raise ErroPermanente("recusadas pelo banco", recusadas)
+    return True
+
+# Pós-processamento meteorológico: workers fixos e fila limitada (sem thread por requisição)
+executor_meteorologia = ExecutorLimitado(
+    "meteorologia",
+    workers=settings.METEOROLOGIA_WORKERS,
+    tamanho_fila=settings.METEOROLOGIA_FILA_MAX,
+    politica=settings.METEOROLOGIA_POLITICA,
+    timeout_bloqueio=settings.METEOROLOGIA_TIMEOUT_BLOQUEIO
+)
+atexit.register(executor_meteorologia.parar)
+
+# Recálculo das estatísticas marcadas por UPDATE/DELETE, fora do /stats: um worker e
+# no máximo um recálculo esperando (os pedidos seguintes são descartados, ele já cobre)
+executor_estatisticas = ExecutorLimitado("estatisticas", workers=1, tamanho_fila=1)
+atexit.register(executor_estatisticas.parar)
+
+# Group commit: gravações síncronas simultâneas (sem a fila) dividem uma transação e um commit
+grupo_commit = None
+if settings.INGESTAO_GRUPO_COMMIT:
+    grupo_commit = GrupoCommit(
+        obter_conexao_pool,
+        devolver_conexao_pool,
+        janela_ms=settings.INGESTAO_GRUPO_JANELA_MS,
+        tamanho_max=settings.INGESTAO_GRUPO_MAX
+    )
+
+# Controle de admissão: token buckets por dispositivo e global, verificados antes do banco
+controle_admissao = None
+if settings.LIMITE_ATIVO:
+    controle_admissao = ControleAdmissao(
+        taxa_dispositivo=settings.LIMITE_TAXA_DISPOSITIVO,
+        rajada_dispositivo=settings.LIMITE_RAJADA_DISPOSITIVO,
+        taxa_global=settings.LIMITE_TAXA_GLOBAL,
+        rajada_global=settings.LIMITE_RAJADA_GLOBAL,
+        max_dispositivos=settings.LIMITE_MAX_DISPOSITIVOS
+    )
+
+# Filtro de reenvios: descarta leituras (device_id, data_hora_leitura) gravadas recentemente
+filtro_duplicatas = FiltroDuplicatas(settings.DEDUP_CAPACIDADE) if settings.DEDUP_ATIVO else None
+
+# Spool local: guarda as leituras em disco enquanto o PostgreSQL estiver fora e reenvia depois
+spool_local = None
+if settings.SPOOL_ATIVO:
+    spool_local = SpoolLocal(
+        settings.SPOOL_DIR,
+        reenviar_lote_spool,
+        lote_replay=settings.SPOOL_LOTE_REPLAY,
+        intervalo_replay=settings.SPOOL_INTERVALO_REPLAY,
+        fsync=settings.SPOOL_FSYNC
+    )
+    # Registrado antes da fila: o atexit roda em ordem inversa, então a fila ainda pode usar o spool
+    atexit.register(spool_local.parar)
+    # Banco de volta: reenvia o spool agora, sem esperar o intervalo de replay (que cresce durante a queda)
+    disjuntor_banco.ao_fechar.append(spool_local.acordar)
+
+def ler_ultima_leitura(cursor):
+    """Leitura mais recente gravada (índice (data_hora_leitura, id)), para o /status depois de reiniciar."""
+    cursor.execute(f"""
+        SELECT device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua
+        FROM {DatabaseConfig.SCHEMA}.leituras_sensores
+        ORDER BY data_hora_leitura DESC, id DESC
+        LIMIT 1
+    """)
+    linha = cursor.fetchone()
+    return Leitura(*linha) if linha else None
+
+# Estado do /status: última leitura por dispositivo (atualizada na ingestão) e estimativas
+# de linhas do catálogo atualizadas em background; o /status não consulta o banco
+estado_servidor = EstadoServidor(
+    lambda: conexao_pool(autocommit=True),
+    DatabaseConfig.SCHEMA,
+    ultima_leitura_banco=ler_ultima_leitura,
+    intervalo=settings.STATUS_INTERVALO_ATUALIZACAO,
+    max_dispositivos=settings.STATUS_MAX_DISPOSITIVOS
+)
+atexit.register(estado_servidor.parar)
+
+# Fila write-behind particionada por dispositivo: agrupa as leituras do /data em lotes
+# (threads iniciadas no primeiro uso)
+fila_ingestao = None
+if settings.INGESTAO_FILA_ATIVA:
+    fila_ingestao = FilaIngestaoParticionada(
+        gravar_lote_ou_spool,
+        particoes=settings.INGESTAO_PARTICOES,
+        tamanho_lote=settings.INGESTAO_LOTE_MAX,
+        janela_ms=settings.INGESTAO_JANELA_MS,
+        modo_ack=settings.INGESTAO_MODO_ACK,
+        capacidade=settings.INGESTAO_CAPACIDADE
+    )
+    # Registrado depois do pool: o atexit roda em ordem inversa, então a fila esvazia antes do pool fechar
+    atexit.register(fila_ingestao.parar)
 
 if __name__ == '__main__':
     print("Iniciando Farm Tech Solutions - Servidor PostgreSQL")
@@ -1404,9 +2076,16 @@ if __name__ == '__main__':
     else:
         print("Pool não inicializado, usando conexões individuais")
     
+    # Reenvia leituras que ficaram no spool de uma execução anterior
+    if spool_local is not None:
+        spool_local.iniciar()
+    estado_servidor.iniciar()
+    cache_respostas.iniciar()
+    
     print("Servidor disponível em:")
     print("   - http://127.0.0.1:8000")
     print("   - http://192.168.2.126:8000")
     print("\nAguardando dados do ESP32...")
+    print("(servidor de desenvolvimento; em produção use python servidor_producao.py)")
     
     app.run(host='0.0.0.0', port=8000, debug=True)
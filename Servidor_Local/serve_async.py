@@ -0,0 +1,775 @@
+"""
+Modo de serviço assíncrono (asyncio) do servidor Farm Tech Solutions
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Alternativa ao app Flask de serve.py para muitos ESP32 conectados ao mesmo
+tempo: um único event loop (aiohttp) atende todas as conexões, sem uma
+thread por requisição, e o banco é acessado por um pool assíncrono
+(asyncpg). Expõe as mesmas rotas e respostas do modo Flask:
+
+    GET /data, /get_data, /series, /export, /stats, /status, /integrated_data, /plotter
+
+As leituras do /data entram numa fila write-behind assíncrona (mesmas
+configurações INGESTAO_* do modo Flask) e o pós-processamento
+meteorológico roda como tarefas asyncio limitadas por METEOROLOGIA_*.
+Com o banco fora do ar as leituras vão para o mesmo spool local do modo
+Flask (spool.py), reenviado pela thread de replay quando o banco volta.
+
+Uso:
+    python Servidor_Local/serve_async.py
+"""
+
+import asyncio
+import contextvars
+import json
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+
+import asyncpg
+from aiohttp import web
+
+from serve import (
+    BRASIL_TZ,
+    DatabaseConfig,
+    PLOTTER_HTML,
+    admissao_recusada,
+    cache_respostas,
+    calcular_fatores_avancados,
+    coletar_dados_meteorologicos,
+    controle_admissao,
+    estado_servidor,
+    leitura_para_json,
+    marcar_stats_desatualizado,
+    montar_resposta_stats,
+    parametros_exportacao,
+    settings,
+    spool_local,
+)
+from config.estatisticas_agregadas import sql_ler_estatisticas, montar_estatisticas
+from config.exportacao import COLUNAS_LEITURAS, TIPOS_CONTEUDO, sql_exportar_leituras, cabecalho, serializar_bloco
+from cache_respostas import Entrada, etag_de, etag_confere
+from leitura import Leitura, decodificar_leitura
+from deduplicacao import FiltroDuplicatas
+from fila_ingestao import ACK_FILA, particao_do_dispositivo
+from paginacao import parametros_pagina, codificar_cursor, interpretar_limite, ErroPaginacao, DATA_MINIMA, DATA_MAXIMA
+from formato_colunar import (
+    FORMATO_LINHAS, FORMATO_ARROW, MIMETYPE_ARROW, interpretar_formato, transpor, corpo_arrow, ErroFormato
+)
+from series import parametros_serie, sql_serie, montar_serie, usa_agregados_minuto, alinhar_minuto, ErroSerie
+
+CHAVE_POOL = web.AppKey("pool", asyncpg.Pool)
+CHAVE_FILA = web.AppKey("fila", object)
+CHAVE_METEOROLOGIA = web.AppKey("meteorologia", object)
+
+SQL_INSERIR_LEITURA = f"""
+    INSERT INTO {DatabaseConfig.SCHEMA}.leituras_sensores
+    (device_id, data_hora_leitura, umidade, temperatura, ph, fosforo, potassio, bomba_dagua)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    ON CONFLICT DO NOTHING
+"""
+
+SQL_INSERIR_METEOROLOGIA = f"""
+    INSERT INTO {DatabaseConfig.SCHEMA}.dados_meteorologicos
+    (data_hora_coleta, temperatura_externa, umidade_ar, pressao_atmosferica,
+     velocidade_vento, direcao_vento, condicao_clima, probabilidade_chuva,
+     quantidade_chuva, indice_uv, visibilidade, cidade, fonte_dados)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+"""
+
+SQL_INSERIR_INTEGRADA = f"""
+    INSERT INTO {DatabaseConfig.SCHEMA}.leituras_integradas
+    (data_hora_leitura, umidade_solo, temperatura_solo, ph_solo, fosforo, potassio, bomba_dagua,
+     temperatura_externa, umidade_ar, pressao_atmosferica, velocidade_vento, condicao_clima,
+     probabilidade_chuva, quantidade_chuva, diferenca_temperatura, deficit_umidade, fator_evapotranspiracao,
+     device_id)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18)
+"""
+
+# Leitura que o banco recusa (fora da coluna, restrição): refeita sozinha, nunca vai para o spool
+ERROS_DADOS = (asyncpg.exceptions.DataError, asyncpg.exceptions.IntegrityConstraintViolationError)
+
+# Filtro de reenvios compartilhado pelas requisições do event loop
+filtro_duplicatas = FiltroDuplicatas(settings.DEDUP_CAPACIDADE) if settings.DEDUP_ATIVO else None
+
+
+def _serializar(valor):
+    """Mesma conversão do jsonify do Flask para os tipos que o asyncpg devolve."""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def resposta_json(dados, status=200):
+    """web.json_response com a serialização compatível com o modo Flask."""
+    return web.json_response(dados, status=status, dumps=lambda d: json.dumps(d, default=_serializar))
+
+
+def resposta_texto(texto, status=200):
+    return web.Response(text=texto, status=status)
+
+
+# Cada requisição roda na sua própria task, então o contexto é por requisição
+_sem_cache = contextvars.ContextVar('sem_cache', default=False)
+
+
+def nao_guardar_em_cache():
+    """A resposta desta requisição não vai para o cache (ex.: erro engolido que virou lista vazia)."""
+    _sem_cache.set(True)
+
+
+def resposta_em_cache(*tabelas):
+    """Mesmo cache com ETag/304 do serve.py, para handlers aiohttp."""
+    def decorador(handler):
+        @wraps(handler)
+        async def envolvido(request):
+            cache_respostas.iniciar()
+            chave = (request.path, tuple(sorted(request.query.items())))
+            entrada = None
+            usar_cache = cache_respostas.disponivel()
+            if usar_cache:
+                versao = cache_respostas.versao(tabelas)   # Antes da consulta: gravação no meio invalida
+                entrada = cache_respostas.obter(chave, versao)
+            if entrada is None:
+                _sem_cache.set(False)
+                resposta = await handler(request)
+                if resposta.status != 200 or _sem_cache.get():
+                    return resposta
+                if usar_cache:
+                    entrada = cache_respostas.guardar(chave, versao, resposta.body, resposta.content_type)
+                else:
+                    entrada = Entrada(None, etag_de(resposta.body), resposta.body, resposta.content_type, 0.0)
+            if etag_confere(request.headers.get('If-None-Match'), entrada.etag):
+                cache_respostas.respostas_304 += 1
+                resposta = web.Response(status=304)
+            else:
+                resposta = web.Response(body=entrada.corpo, content_type=entrada.mimetype)
+            resposta.headers['ETag'] = entrada.etag
+            resposta.headers['Cache-Control'] = 'no-cache'   # Sempre revalidar (If-None-Match)
+            return resposta
+        return envolvido
+    return decorador
+
+
+async def guardar_no_spool(registros):
+    """Grava no spool local fora do event loop (escrita em disco com fsync)."""
+    if spool_local is None:
+        return False
+    return await asyncio.to_thread(spool_local.gravar, registros)
+
+
+async def quarentenar(registros):
+    """Leituras recusadas pelo banco vão para a quarentena do spool (não travam o replay)."""
+    if spool_local is not None:
+        await asyncio.to_thread(spool_local.quarentenar, registros, "recusadas pelo banco")
+
+
+class FilaIngestaoAsync:
+    """
+    Versão asyncio da FilaIngestaoParticionada: cada partição agrupa as
+    leituras dos seus dispositivos e grava cada lote com um único
+    executemany. No modo 'commit' a requisição só recebe OK depois do
+    COMMIT do lote que contém a sua leitura.
+    """
+
+    def __init__(self, pool, tamanho_lote=500, janela_ms=20, modo_ack="commit", capacidade=10000, particoes=4):
+        self.pool = pool
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.janela = janela_ms / 1000.0
+        self.modo_ack = modo_ack
+        self.particoes = max(1, particoes)
+        self._filas = [asyncio.Queue(maxsize=max(1, capacidade // self.particoes)) for _ in range(self.particoes)]
+        self._tarefas = []
+        self.lotes_gravados = 0
+        self.leituras_gravadas = 0
+        self.leituras_recusadas = 0
+        self.leituras_perdidas = 0
+
+    def iniciar(self):
+        if not self._tarefas:
+            loop = asyncio.get_running_loop()
+            self._tarefas = [loop.create_task(self._loop(fila)) for fila in self._filas]
+
+    async def enfileirar(self, registro):
+        """Enfileira um registro; retorna False se a fila estiver cheia ou o lote falhar."""
+        futuro = None if self.modo_ack == ACK_FILA else asyncio.get_running_loop().create_future()
+        fila = self._filas[particao_do_dispositivo(registro[0], self.particoes)]
+        try:
+            fila.put_nowait((registro, futuro))
+        except asyncio.QueueFull:
+            print("FILA ASYNC: capacidade esgotada, leitura recusada")
+            return False
+        if futuro is None:
+            return True
+        return await futuro
+
+    async def _coletar_lote(self, fila):
+        lote = [await fila.get()]
+        limite = time.monotonic() + self.janela
+        while len(lote) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(await asyncio.wait_for(fila.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _gravar(self, registros):
+        """
+        Grava o lote e retorna as leituras recusadas pelo banco. O executemany é atômico:
+        com uma leitura ruim nada entra, então o lote é refeito uma leitura por transação.
+        Erro de conexão sobe (o lote inteiro vai para o spool).
+        """
+        async with self.pool.acquire() as conn:
+            try:
+                await conn.executemany(SQL_INSERIR_LEITURA, registros)
+                return []
+            except ERROS_DADOS as e:
+                print(f"FILA ASYNC: lote de {len(registros)} leituras recusado ({e}); gravando uma a uma")
+            recusadas = []
+            for registro in registros:
+                try:
+                    await conn.execute(SQL_INSERIR_LEITURA, *registro)
+                except ERROS_DADOS as e:
+                    print(f"FILA ASYNC: leitura recusada pelo banco ({registro[0]}, {registro[1]}): {e}")
+                    recusadas.append(registro)
+            return recusadas
+
+    async def _loop(self, fila):
+        while True:
+            lote = await self._coletar_lote(fila)
+            registros = [registro for registro, _ in lote]
+            sucesso = True
+            try:
+                recusadas = await self._gravar(registros)
+                self.lotes_gravados += 1
+                self.leituras_gravadas += len(registros) - len(recusadas)
+                estado_servidor.registrar(Leitura(*registro) for registro in registros if registro not in recusadas)
+                cache_respostas.invalidar('leituras_sensores')
+                if recusadas:
+                    self.leituras_recusadas += len(recusadas)
+                    await quarentenar(recusadas)
+            except Exception as e:
+                # Banco indisponível: só aqui o lote vai para o spool e volta no replay
+                print(f"FILA ASYNC: erro ao gravar lote de {len(lote)} leituras: {e}")
+                sucesso = await guardar_no_spool(registros)
+                if not sucesso:
+                    self.leituras_perdidas += len(lote)
+            for _, futuro in lote:
+                if futuro is not None and not futuro.done():
+                    futuro.set_result(sucesso)
+
+    async def parar(self):
+        """Grava o que ainda está nas filas e encerra as tarefas de gravação."""
+        if not self._tarefas:
+            return
+        while any(not fila.empty() for fila in self._filas):
+            await asyncio.sleep(self.janela)
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+
+    def metricas(self):
+        return {
+            "modo_ack": self.modo_ack,
+            "particoes": self.particoes,
+            "pendentes": sum(fila.qsize() for fila in self._filas),
+            "capacidade": sum(fila.maxsize for fila in self._filas),
+            "lotes_gravados": self.lotes_gravados,
+            "leituras_gravadas": self.leituras_gravadas,
+            "leituras_recusadas": self.leituras_recusadas,
+            "leituras_perdidas": self.leituras_perdidas,
+            "pendentes_por_particao": [fila.qsize() for fila in self._filas]
+        }
+
+
+class MeteorologiaAsync:
+    """
+    Pós-processamento meteorológico como tarefas asyncio: no máximo `workers`
+    em execução e `tamanho_fila` aguardando; acima disso a leitura é descartada.
+    """
+
+    def __init__(self, pool, workers=4, tamanho_fila=1000):
+        self.pool = pool
+        self.workers = max(1, workers)
+        self.tamanho_fila = tamanho_fila
+        self._semaforo = asyncio.Semaphore(self.workers)
+        self._tarefas = set()
+        self.executadas = 0
+        self.descartadas = 0
+        self.falhas = 0
+
+    def submeter(self, leitura):
+        if len(self._tarefas) >= self.tamanho_fila:
+            self.descartadas += 1
+            return False
+        tarefa = asyncio.get_running_loop().create_task(self._processar(leitura))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return True
+
+    async def _processar(self, leitura):
+        async with self._semaforo:
+            dados_sensores = {
+                'umidade': leitura.umidade,
+                'temperatura': leitura.temperatura,
+                'ph': leitura.ph,
+                'fosforo': leitura.fosforo,
+                'potassio': leitura.potassio,
+                'bomba_dagua': leitura.bomba_dagua
+            }
+            dados_meteo = coletar_dados_meteorologicos()
+            fatores = calcular_fatores_avancados(dados_sensores, dados_meteo)
+            try:
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute(
+                            SQL_INSERIR_METEOROLOGIA,
+                            leitura.data_hora_leitura,
+                            dados_meteo['temperatura_externa'],
+                            dados_meteo['umidade_ar'],
+                            dados_meteo['pressao_atmosferica'],
+                            dados_meteo['velocidade_vento'],
+                            dados_meteo['direcao_vento'],
+                            dados_meteo['condicao_clima'],
+                            dados_meteo['probabilidade_chuva'],
+                            dados_meteo['quantidade_chuva'],
+                            dados_meteo['indice_uv'],
+                            dados_meteo['visibilidade'],
+                            dados_meteo['cidade'],
+                            dados_meteo['fonte_dados']
+                        )
+                        await conn.execute(
+                            SQL_INSERIR_INTEGRADA,
+                            leitura.data_hora_leitura,
+                            leitura.umidade,
+                            leitura.temperatura,
+                            leitura.ph,
+                            leitura.fosforo,
+                            leitura.potassio,
+                            leitura.bomba_dagua,
+                            dados_meteo['temperatura_externa'],
+                            dados_meteo['umidade_ar'],
+                            dados_meteo['pressao_atmosferica'],
+                            dados_meteo['velocidade_vento'],
+                            dados_meteo['condicao_clima'],
+                            dados_meteo['probabilidade_chuva'],
+                            dados_meteo['quantidade_chuva'],
+                            fatores['diferenca_temperatura'],
+                            fatores['deficit_umidade'],
+                            fatores['fator_evapotranspiracao'],
+                            leitura.device_id
+                        )
+                cache_respostas.invalidar('dados_meteorologicos', 'leituras_integradas')
+                self.executadas += 1
+            except Exception as e:
+                self.falhas += 1
+                print(f"BACKGROUND ASYNC: Erro ao salvar dados meteorológicos: {e}")
+
+    async def parar(self):
+        """Aguarda as tarefas em andamento."""
+        if self._tarefas:
+            await asyncio.gather(*self._tarefas, return_exceptions=True)
+
+    def metricas(self):
+        return {
+            "workers": self.workers,
+            "em_andamento": len(self._tarefas),
+            "capacidade_fila": self.tamanho_fila,
+            "executadas": self.executadas,
+            "descartadas": self.descartadas,
+            "falhas": self.falhas
+        }
+
+
+# --- ROTAS ---
+
+async def receive_data(request):
+    """Recebe dados do ESP32 via GET parameters (mesmo contrato do modo Flask)."""
+    try:
+        leitura = decodificar_leitura(request.rel_url.raw_query_string.encode(), settings.DEVICE_ID_PADRAO)
+    except ValueError:
+        return resposta_texto("INVALID_PARAMS", 400)
+
+    if leitura is None:
+        return resposta_texto("MISSING_PARAMS", 400)
+
+    recusa = admissao_recusada(leitura.device_id)
+    if recusa:
+        return web.Response(text=recusa[0], status=429, headers=recusa[1])
+
+    if filtro_duplicatas is not None and filtro_duplicatas.contem(leitura.chave()):
+        return resposta_texto("OK")
+
+    app = request.app
+    fila = app[CHAVE_FILA]
+    if fila is not None:
+        sucesso = await fila.enfileirar(leitura.registro())
+    else:
+        try:
+            await app[CHAVE_POOL].execute(SQL_INSERIR_LEITURA, *leitura.registro())
+            estado_servidor.registrar([leitura])
+            cache_respostas.invalidar('leituras_sensores')
+            sucesso = True
+        except Exception as e:
+            print(f"Erro ao inserir leitura: {e}")
+            if not await guardar_no_spool([leitura.registro()]):
+                return resposta_texto("ERROR", 500)
+            if filtro_duplicatas is not None:
+                filtro_duplicatas.adicionar(leitura.chave())
+            return resposta_texto("OK")
+
+    if not sucesso:
+        return resposta_texto("ERROR", 500)
+
+    if filtro_duplicatas is not None:
+        filtro_duplicatas.adicionar(leitura.chave())
+    app[CHAVE_METEOROLOGIA].submeter(leitura)
+    return resposta_texto("OK")
+
+
+async def consultar_pagina(pool, device_id=None, limite=None, desde=DATA_MINIMA, superior=(DATA_MAXIMA, 0)):
+    """
+    Uma página de leituras (mais recentes primeiro), opcionalmente de um dispositivo, como veio do banco.
+    Mesma paginação por keyset do serve.py. Retorna (colunas, linhas, proximo_cursor).
+    """
+    limite = settings.GET_DATA_LIMITE_PADRAO if limite is None else limite
+    filtro = "AND device_id = $5" if device_id else ""
+    try:
+        linhas = await pool.fetch(f"""
+            SELECT id, device_id, data_hora_leitura, criacaots, umidade, temperatura, ph, fosforo, potassio, bomba_dagua
+            FROM {DatabaseConfig.SCHEMA}.leituras_sensores
+            WHERE (data_hora_leitura, id) < ($1, $2) AND data_hora_leitura >= $3 {filtro}
+            ORDER BY data_hora_leitura DESC, id DESC
+            LIMIT $4
+        """, superior[0], superior[1], desde, limite + 1, *((device_id,) if device_id else ()))
+    except Exception as error:
+        print(f"Erro ao listar dados do PostgreSQL: {error}")
+        nao_guardar_em_cache()
+        return [], [], None
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = codificar_cursor(linhas[-1]['data_hora_leitura'], linhas[-1]['id'])
+    return list(linhas[0].keys()) if linhas else [], linhas, proximo_cursor
+
+
+async def listar_dados(pool, device_id=None, limite=None, desde=DATA_MINIMA, superior=(DATA_MAXIMA, 0)):
+    """Lista uma página de leituras como dicts. Retorna (registros, proximo_cursor)."""
+    _, linhas, proximo_cursor = await consultar_pagina(pool, device_id, limite, desde, superior)
+    return [dict(linha) for linha in linhas], proximo_cursor
+
+
+def resposta_colunar(formato, envelope, colunas, linhas):
+    """Resposta em colunas (format=columns ou arrow), como no serve.py."""
+    if formato == FORMATO_ARROW:
+        return web.Response(body=corpo_arrow(colunas, linhas, envelope), content_type=MIMETYPE_ARROW)
+    return resposta_json({**envelope, "formato": formato, "colunas": list(colunas), "dados": transpor(colunas, linhas)})
+
+
+async def plotter(request):
+    """Serve a página HTML do plotter."""
+    return web.Response(text=PLOTTER_HTML, content_type='text/html')
+
+
+@resposta_em_cache('leituras_sensores')
+async def get_all_data(request):
+    """Retorna uma página de leituras em JSON (mesmos parâmetros do /get_data do serve.py)."""
+    device_id = request.query.get('device_id')
+    try:
+        limite, desde, superior = parametros_pagina(
+            request.query, settings.GET_DATA_LIMITE_PADRAO, settings.GET_DATA_LIMITE_MAX, BRASIL_TZ)
+        formato = interpretar_formato(request.query.get('format'))
+    except (ErroPaginacao, ErroFormato) as e:
+        return resposta_json({"erro": str(e)}, status=400)
+    envelope = {
+        "schema": DatabaseConfig.SCHEMA,
+        "host": DatabaseConfig.HOST,
+        "database": DatabaseConfig.DATABASE,
+        "device_id": device_id,
+        "limite": limite
+    }
+    if formato != FORMATO_LINHAS:
+        colunas, linhas, proximo_cursor = await consultar_pagina(
+            request.app[CHAVE_POOL], device_id, limite, desde, superior)
+        envelope.update(total_registros=len(linhas), proximo_cursor=proximo_cursor)
+        return resposta_colunar(formato, envelope, colunas, linhas)
+    dados, proximo_cursor = await listar_dados(request.app[CHAVE_POOL], device_id, limite, desde, superior)
+    return resposta_json({
+        **envelope,
+        "total_registros": len(dados),  # Registros desta página
+        "proximo_cursor": proximo_cursor,
+        "dados": dados
+    })
+
+
+async def get_series(request):
+    """Série temporal reduzida para gráficos (mesmos parâmetros do /series do serve.py)."""
+    device_id = request.query.get('device_id')
+    try:
+        desde, ate, largura, metricas, pontos = parametros_serie(
+            request.query, BRASIL_TZ, settings.SERIES_PERIODO_PADRAO_H,
+            settings.SERIES_BALDES_AUTO, settings.SERIES_BALDES_MAX)
+    except (ErroSerie, ErroPaginacao) as e:
+        return resposta_json({"erro": str(e)}, status=400)
+
+    por_minuto = usa_agregados_minuto(largura)
+    if por_minuto:
+        desde, ate = alinhar_minuto(desde, ate)
+    parametros = (largura, desde, ate, device_id) if device_id else (largura, desde, ate)
+    try:
+        linhas = await request.app[CHAVE_POOL].fetch(
+            sql_serie(DatabaseConfig.SCHEMA, metricas, bool(device_id), por_minuto, ('$1', '$2', '$3', '$4')),
+            *parametros)
+    except Exception as e:
+        return resposta_json({"erro": f"Erro ao consultar série: {e}"}, status=500)
+
+    return resposta_json({
+        "device_id": device_id,
+        "since": desde.isoformat(),
+        "until": ate.isoformat(),
+        "bucket_s": int(largura.total_seconds()),
+        "fonte": "agregados_minuto" if por_minuto else "leituras",
+        "baldes": len(linhas),
+        "leituras": sum(linha[1] for linha in linhas),
+        "points": pontos,
+        "series": montar_serie(linhas, metricas, pontos)
+    })
+
+
+async def exportar_leituras(request):
+    """Exporta leituras em streaming, NDJSON ou CSV (mesmos parâmetros do /export do serve.py)."""
+    device_id = request.query.get('device_id')
+    try:
+        formato, desde, ate = parametros_exportacao(request.query)
+    except ErroPaginacao as e:
+        return resposta_json({"erro": str(e)}, status=400)
+
+    parametros = (desde, ate, device_id) if device_id else (desde, ate)
+    resposta = web.StreamResponse(headers={
+        'Content-Type': TIPOS_CONTEUDO[formato],
+        'Content-Disposition': f'attachment; filename="leituras_sensores.{formato}"'
+    })
+    try:
+        async with request.app[CHAVE_POOL].acquire() as conn:
+            # O cursor do asyncpg só existe dentro de uma transação
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(
+                    sql_exportar_leituras(DatabaseConfig.SCHEMA, por_dispositivo=bool(device_id),
+                                          marcadores=('$1', '$2', '$3')), *parametros)
+                await resposta.prepare(request)
+                inicio = cabecalho(formato, COLUNAS_LEITURAS)
+                if inicio:
+                    await resposta.write(inicio)
+                while True:
+                    linhas = await cursor.fetch(settings.EXPORTACAO_TAMANHO_BLOCO)
+                    if not linhas:
+                        break
+                    # Serializar um bloco leva dezenas de ms: fora do event loop
+                    await resposta.write(await asyncio.to_thread(serializar_bloco, formato, COLUNAS_LEITURAS, linhas))
+    except ConnectionResetError:
+        print("EXPORT: cliente desconectou no meio da exportação")
+        return resposta
+    except Exception as e:
+        if resposta.prepared:
+            raise   # Já começou a enviar: a conexão é cortada e o cliente vê a resposta incompleta
+        return resposta_json({"erro": f"Erro ao exportar leituras: {e}"}, status=500)
+    await resposta.write_eof()
+    return resposta
+
+
+async def status(request):
+    """
+    Retorna status do sistema a partir do estado em memória (mesmo EstadoServidor do modo Flask,
+    alimentado pela ingestão assíncrona): não consulta o banco a cada chamada.
+    ?device_id=... devolve o último registro daquele dispositivo.
+    """
+    device_id = request.query.get('device_id')
+    pool = request.app[CHAVE_POOL]
+    return resposta_json({
+        "status": "online",
+        "banco": "PostgreSQL",
+        "host": DatabaseConfig.HOST,
+        "database": DatabaseConfig.DATABASE,
+        "schema": DatabaseConfig.SCHEMA,
+        "conexao_ok": estado_servidor.banco_ok is not False,
+        "total_registros": estado_servidor.estimativas.get('leituras_sensores', 0),  # Estimativa
+        "estimativas": estado_servidor.estimativas,
+        "estimativas_atualizadas_em": (estado_servidor.atualizado_em.isoformat()
+                                       if estado_servidor.atualizado_em else None),
+        "dispositivos": estado_servidor.dispositivos(),
+        "device_id": device_id,
+        "ultimo_registro": leitura_para_json(estado_servidor.ultima_leitura(device_id)),
+        "pool": {"tamanho": pool.get_size(), "ociosas": pool.get_idle_size(),
+                 "minimo": pool.get_min_size(), "maximo": pool.get_max_size()}
+    })
+
+
+@resposta_em_cache('leituras_sensores', 'dados_meteorologicos', 'leituras_integradas')
+async def get_statistics(request):
+    """Retorna estatísticas dos dados incluindo dados integrados (?device_id=... filtra sensores e integrados)."""
+    device_id = request.query.get('device_id')
+
+    async def ler_resumo(conn):
+        resumo = []
+        desatualizado = False
+        for tabela, dispositivo in (('leituras_sensores', device_id), ('dados_meteorologicos', None),
+                                    ('leituras_integradas', device_id)):
+            parametros = (tabela, dispositivo) if dispositivo is not None else (tabela,)
+            linhas = await conn.fetch(
+                sql_ler_estatisticas(DatabaseConfig.SCHEMA, dispositivo is not None, ('$1', '$2')), *parametros)
+            estatisticas, marcado = montar_estatisticas(linhas)
+            resumo.append(estatisticas)
+            desatualizado = desatualizado or marcado
+        return resumo, desatualizado
+
+    try:
+        async with request.app[CHAVE_POOL].acquire() as conn:
+            resumo, desatualizado = await ler_resumo(conn)
+    except Exception as e:
+        nao_guardar_em_cache()
+        return resposta_json({"erro": f"Erro ao calcular estatísticas: {e}"})
+
+    stats = montar_resposta_stats(*resumo, device_id)
+    if desatualizado:
+        marcar_stats_desatualizado(stats)
+        nao_guardar_em_cache()
+    return resposta_json(stats)
+
+
+@resposta_em_cache('leituras_integradas')
+async def get_integrated_data(request):
+    """Retorna dados da tabela integrada para análise ML (mesmos parâmetros do /integrated_data do serve.py)."""
+    device_id = request.query.get('device_id')
+    try:
+        limite = interpretar_limite(request.query.get('limit'), 50, settings.GET_DATA_LIMITE_MAX)
+        formato = interpretar_formato(request.query.get('format'))
+    except (ErroPaginacao, ErroFormato) as e:
+        return resposta_json({"erro": str(e)}, status=400)
+    filtro = "WHERE device_id = $2" if device_id else ""
+    linhas = []
+    try:
+        linhas = await request.app[CHAVE_POOL].fetch(f"""
+            SELECT * FROM {DatabaseConfig.SCHEMA}.view_ml_completa
+            {filtro}
+            ORDER BY data_hora_leitura DESC
+            LIMIT $1
+        """, limite, *((device_id,) if device_id else ()))
+    except Exception as error:
+        print(f"Erro ao listar dados integrados: {error}")
+        nao_guardar_em_cache()
+
+    colunas = list(linhas[0].keys()) if linhas else []
+    envelope = {
+        "schema": DatabaseConfig.SCHEMA,
+        "view": "view_ml_completa",
+        "total_features": len(colunas),
+        "total_registros": len(linhas)
+    }
+    if formato != FORMATO_LINHAS:
+        return resposta_colunar(formato, envelope, colunas, linhas)
+    return resposta_json({**envelope, "dados": [dict(linha) for linha in linhas]})
+
+
+async def metricas(request):
+    """Métricas da fila assíncrona, do pós-processamento e do pool."""
+    app = request.app
+    pool = app[CHAVE_POOL]
+    fila = app[CHAVE_FILA]
+    return resposta_json({
+        "fila_ingestao": fila.metricas() if fila is not None else None,
+        "meteorologia": app[CHAVE_METEOROLOGIA].metricas(),
+        "deduplicacao": filtro_duplicatas.metricas() if filtro_duplicatas is not None else None,
+        "spool": spool_local.metricas() if spool_local is not None else None,
+        "admissao": controle_admissao.metricas() if controle_admissao is not None else None,
+        "estado_status": estado_servidor.metricas(),
+        "cache_respostas": cache_respostas.metricas(),
+        "pool": {"tamanho": pool.get_size(), "ociosas": pool.get_idle_size(),
+                 "minimo": pool.get_min_size(), "maximo": pool.get_max_size()}
+    })
+
+
+async def ciclo_de_vida(app):
+    """Cria o pool, a fila e o pós-processamento no event loop e encerra na ordem inversa."""
+    params = DatabaseConfig.get_connection_params()
+    pool = await asyncpg.create_pool(
+        min_size=settings.ASYNC_POOL_MIN,
+        max_size=settings.ASYNC_POOL_MAX,
+        server_settings={'search_path': f'{DatabaseConfig.SCHEMA}, public', 'timezone': 'America/Sao_Paulo'},
+        **params
+    )
+    print(f"Pool assíncrono PostgreSQL inicializado ({settings.ASYNC_POOL_MIN}-{settings.ASYNC_POOL_MAX} conexões)")
+
+    fila = None
+    if settings.INGESTAO_FILA_ATIVA:
+        fila = FilaIngestaoAsync(
+            pool,
+            tamanho_lote=settings.INGESTAO_LOTE_MAX,
+            janela_ms=settings.INGESTAO_JANELA_MS,
+            modo_ack=settings.INGESTAO_MODO_ACK,
+            capacidade=settings.INGESTAO_CAPACIDADE,
+            particoes=settings.INGESTAO_PARTICOES
+        )
+        fila.iniciar()
+    meteorologia = MeteorologiaAsync(pool, settings.METEOROLOGIA_WORKERS, settings.METEOROLOGIA_FILA_MAX)
+    if spool_local is not None:
+        spool_local.iniciar()
+    cache_respostas.iniciar()
+    # Estimativas do catálogo do /status: thread em background (pool psycopg2 do serve)
+    estado_servidor.iniciar()
+
+    app[CHAVE_POOL] = pool
+    app[CHAVE_FILA] = fila
+    app[CHAVE_METEOROLOGIA] = meteorologia
+
+    yield
+
+    if fila is not None:
+        await fila.parar()
+    await meteorologia.parar()
+    cache_respostas.parar()
+    await asyncio.to_thread(estado_servidor.parar)
+    await pool.close()
+    print("Pool assíncrono fechado")
+
+
+def criar_app():
+    """Monta a aplicação aiohttp com as rotas do modo Flask."""
+    app = web.Application()
+    app.cleanup_ctx.append(ciclo_de_vida)
+    app.router.add_get('/data', receive_data)
+    app.router.add_get('/get_data', get_all_data)
+    app.router.add_get('/series', get_series)
+    app.router.add_get('/export', exportar_leituras)
+    app.router.add_get('/stats', get_statistics)
+    app.router.add_get('/status', status)
+    app.router.add_get('/integrated_data', get_integrated_data)
+    app.router.add_get('/plotter', plotter)
+    app.router.add_get('/metricas', metricas)
+    return app
+
+
+if __name__ == '__main__':
+    # uvloop é opcional: acelera o event loop quando instalado
+    try:
+        import uvloop
+        uvloop.install()
+        print("Event loop: uvloop")
+    except ImportError:
+        print("Event loop: asyncio padrão")
+
+    print("Iniciando Farm Tech Solutions - Servidor assíncrono (asyncio)")
+    print(f"Database: {DatabaseConfig.DATABASE}")
+    print(f"Schema: {DatabaseConfig.SCHEMA}")
+    print(f"Host: {DatabaseConfig.HOST}")
+    sys.stdout.flush()
+
+    web.run_app(criar_app(), host=settings.FLASK_HOST, port=settings.FLASK_PORT,
+                backlog=settings.ASYNC_BACKLOG, access_log=None)
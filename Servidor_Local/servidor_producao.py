@@ -0,0 +1,147 @@
+"""
+Modo de produção multi-processo do servidor Farm Tech Solutions
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O app.run() de serve.py é o servidor de desenvolvimento do Flask: um
+processo só, debug ligado e sem keep-alive. Este lançador serve o mesmo
+app Flask com gunicorn:
+
+  - PRODUCAO_WORKERS processos pré-criados (fork), cada um com
+    PRODUCAO_THREADS threads (worker gthread) e keep-alive HTTP;
+  - o app é carregado uma vez no processo mestre (schema criado uma vez
+    só) e cada worker cria o SEU pool de conexões depois do fork;
+  - o orçamento global PRODUCAO_CONEXOES_TOTAL é dividido entre os
+    workers, e a fatia de cada um já desconta a conexão dedicada do
+    LISTEN do cache de respostas (fora do pool): pools + listeners nunca
+    passam do max_connections reservado para o servidor. Com o cache
+    ligado, o orçamento precisa de pelo menos 2 conexões por worker;
+  - o limite global de admissão (LIMITE_TAXA_GLOBAL) também é dividido
+    entre os workers. O limite por dispositivo continua por processo:
+    um dispositivo pode chegar a até PRODUCAO_WORKERS vezes a sua taxa.
+
+Uso:
+    python Servidor_Local/servidor_producao.py
+"""
+
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+import serve
+from limite_taxa import ControleAdmissao
+from serve import settings
+
+
+def conexoes_dedicadas():
+    """Conexões de cada worker fora do pool: o LISTEN do cache de respostas, quando ligado."""
+    return 1 if settings.CACHE_RESPOSTAS_ATIVO else 0
+
+
+def dividir_conexoes(total, workers, dedicadas=0):
+    """
+    Tamanho máximo do pool de cada worker: a fatia do orçamento global menos as `dedicadas`.
+    Lança ValueError se o orçamento não dá a cada worker as dedicadas e uma conexão de pool.
+    """
+    workers = max(1, workers)
+    pool = total // workers - dedicadas
+    if pool < 1:
+        raise ValueError(f"PRODUCAO_CONEXOES_TOTAL={total} não basta para {workers} workers: cada um usa "
+                         f"{dedicadas} conexão(ões) dedicada(s) e ao menos 1 de pool "
+                         f"(mínimo {workers * (dedicadas + 1)})")
+    return pool
+
+
+def post_fork(server, worker):
+    """Roda em cada worker logo depois do fork: recursos que não podem ser herdados do mestre."""
+    workers = server.cfg.workers
+    fatia = dividir_conexoes(settings.PRODUCAO_CONEXOES_TOTAL, workers, conexoes_dedicadas())
+    # No modo adaptativo a fatia é o teto: o pool começa em POOL_MAX_CONEXOES e cresce até ela
+    maxconn = min(settings.POOL_MAX_CONEXOES, fatia) if settings.POOL_ADAPTATIVO else fatia
+    minconn = min(settings.POOL_MIN_CONEXOES, maxconn)
+
+    # O pool é recriado sob demanda com estes valores: ajusta para a fatia deste worker
+    settings.POOL_MIN_CONEXOES = minconn
+    settings.POOL_MAX_CONEXOES = maxconn
+    settings.POOL_ADAPTATIVO_MAX = fatia
+    serve.inicializar_pool_conexoes(minconn, maxconn, fatia)
+
+    necessarias = (settings.INGESTAO_PARTICOES if settings.INGESTAO_FILA_ATIVA else 0) \
+        + settings.METEOROLOGIA_WORKERS
+    if fatia < necessarias:
+        print(f"AVISO: pool de {fatia} conexões por worker é menor que as {necessarias} usadas "
+              f"pelas threads de fundo (partições + meteorologia); aumente PRODUCAO_CONEXOES_TOTAL")
+
+    if serve.controle_admissao is not None and settings.LIMITE_TAXA_GLOBAL > 0:
+        serve.controle_admissao = ControleAdmissao(
+            taxa_dispositivo=settings.LIMITE_TAXA_DISPOSITIVO,
+            rajada_dispositivo=settings.LIMITE_RAJADA_DISPOSITIVO,
+            taxa_global=settings.LIMITE_TAXA_GLOBAL / workers,
+            rajada_global=max(1, settings.LIMITE_RAJADA_GLOBAL // workers),
+            max_dispositivos=settings.LIMITE_MAX_DISPOSITIVOS
+        )
+
+    # Todos os workers compartilham o diretório do spool (lock de arquivo entre processos)
+    if serve.spool_local is not None:
+        serve.spool_local.iniciar()
+    serve.estado_servidor.iniciar()
+    serve.cache_respostas.iniciar()
+
+
+def worker_exit(server, worker):
+    """Encerramento do worker: esvazia a fila antes de fechar o pool (mesma ordem do atexit)."""
+    if serve.fila_ingestao is not None:
+        serve.fila_ingestao.parar()
+    if serve.spool_local is not None:
+        serve.spool_local.parar()
+    serve.executor_meteorologia.parar()
+    serve.estado_servidor.parar()
+    serve.cache_respostas.parar()
+    serve.fechar_pool_conexoes()
+
+
+class ServidorProducao(BaseApplication):
+    """Aplicação gunicorn configurada pelas variáveis PRODUCAO_* (config/settings.py)."""
+
+    def __init__(self, app, opcoes):
+        self.app = app
+        self.opcoes = opcoes
+        super().__init__()
+
+    def load_config(self):
+        for chave, valor in self.opcoes.items():
+            self.cfg.set(chave, valor)
+
+    def load(self):
+        return self.app
+
+
+def opcoes_gunicorn():
+    return {
+        'bind': f"{settings.FLASK_HOST}:{settings.FLASK_PORT}",
+        'workers': max(1, settings.PRODUCAO_WORKERS),
+        'worker_class': 'gthread',
+        'threads': max(1, settings.PRODUCAO_THREADS),
+        'keepalive': settings.PRODUCAO_KEEPALIVE,
+        'timeout': settings.PRODUCAO_TIMEOUT,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+if __name__ == '__main__':
+    if os.name == 'nt':
+        sys.exit("O modo multi-processo (gunicorn) não roda no Windows; use python serve.py")
+
+    opcoes = opcoes_gunicorn()
+    dedicadas = conexoes_dedicadas()
+    try:
+        maxconn = dividir_conexoes(settings.PRODUCAO_CONEXOES_TOTAL, opcoes['workers'], dedicadas)
+    except ValueError as e:
+        sys.exit(f"ERRO: {e}")
+    print("Iniciando Farm Tech Solutions - modo de produção")
+    print(f"   {opcoes['workers']} processos x {opcoes['threads']} threads em {opcoes['bind']}")
+    print(f"   Pool por processo: até {maxconn} conexões + {dedicadas} dedicada(s) "
+          f"({opcoes['workers'] * (maxconn + dedicadas)} de {settings.PRODUCAO_CONEXOES_TOTAL} no total)")
+    ServidorProducao(serve.app, opcoes).run()
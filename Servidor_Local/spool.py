@@ -0,0 +1,344 @@
+"""
+Spool local para leituras quando o PostgreSQL está fora do ar
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Se a gravação no banco falha, as leituras são anexadas a um arquivo local
+append-only em vez de devolver ERROR ao ESP32 (que só tenta de novo
+algumas vezes). Cada leitura vira um registro emoldurado:
+
+    offset  tipo     campo
+    0       4 bytes  marcador b'FTSP'
+    4       uint32   tamanho do conteúdo
+    8       uint32   CRC32 do conteúdo
+    12      ...      conteúdo (JSON da tupla de Leitura.registro())
+
+Uma thread de replay verifica o banco periodicamente e, quando ele volta,
+drena o spool em lotes grandes (COPY). O arquivo ativo é renomeado antes
+do replay, então novas leituras continuam sendo anexadas enquanto o
+replay roda. Registros truncados (queda no meio da escrita) ou com CRC
+inválido são ignorados e contados. Como a ingestão é idempotente, um
+replay interrompido pode ser repetido sem duplicar leituras.
+
+Banco fora é uma falha passageira: o arquivo fica para a próxima tentativa.
+Leituras que o banco recusa (ErroPermanente: valor fora da coluna, violação
+de restrição) falhariam em todo replay e travariam os arquivos seguintes;
+elas vão para o arquivo de quarentena (mesmo formato, só anexado, para
+inspeção manual) e o replay continua.
+
+Vários processos (servidor_producao.py) podem compartilhar o mesmo
+diretório: escrita e rotação são serializadas por um lock de arquivo
+(flock) e só um processo por vez faz o replay.
+"""
+
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (um processo só)
+    fcntl = None
+
+MARCADOR = b'FTSP'
+CABECALHO = struct.Struct('<4sII')
+ARQUIVO_ATIVO = 'leituras.spool'
+ARQUIVO_QUARENTENA = 'quarentena.spool'
+SUFIXO_REPLAY = '.replay'
+ARQUIVO_LOCK_ESCRITA = 'spool.lock'
+ARQUIVO_LOCK_REPLAY = 'replay.lock'
+
+
+class ErroPermanente(Exception):
+    """
+    Lançado por gravar_lote quando registros do lote nunca serão aceitos pelo banco.
+    `registros`: os recusados (o resto do lote foi gravado); None = o lote inteiro.
+    """
+
+    def __init__(self, mensagem, registros=None):
+        super().__init__(mensagem)
+        self.registros = registros
+
+
+@contextmanager
+def _lock_arquivo(caminho, bloquear=True):
+    """
+    Lock exclusivo entre processos sobre `caminho`.
+    Entrega True se o lock foi obtido (False só quando bloquear=False e outro processo o tem).
+    """
+    if fcntl is None:
+        yield True
+        return
+    fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _codificar(registro):
+    """Registro (tupla de Leitura.registro()) -> bytes emoldurados."""
+    device_id, data_hora_leitura = registro[0], registro[1]
+    conteudo = json.dumps(
+        [device_id, data_hora_leitura.isoformat(), *registro[2:]],
+        separators=(',', ':')
+    ).encode('utf-8')
+    return CABECALHO.pack(MARCADOR, len(conteudo), zlib.crc32(conteudo)) + conteudo
+
+
+def _decodificar(conteudo):
+    """Conteúdo JSON de um registro -> tupla na ordem de Leitura.registro()."""
+    valores = json.loads(conteudo)
+    valores[1] = datetime.fromisoformat(valores[1])
+    return tuple(valores)
+
+
+def ler_registros(caminho):
+    """
+    Lê os registros válidos de um arquivo de spool.
+    Retorna (registros, corrompidos).
+    """
+    with open(caminho, 'rb') as arquivo:
+        dados = arquivo.read()
+
+    registros = []
+    corrompidos = 0
+    posicao = 0
+    total = len(dados)
+    while posicao + CABECALHO.size <= total:
+        marcador, tamanho, crc = CABECALHO.unpack_from(dados, posicao)
+        inicio = posicao + CABECALHO.size
+        fim = inicio + tamanho
+        if marcador != MARCADOR:
+            # Lixo no meio do arquivo: procura o próximo marcador
+            proximo = dados.find(MARCADOR, posicao + 1)
+            corrompidos += 1
+            if proximo < 0:
+                break
+            posicao = proximo
+            continue
+        if fim > total:
+            # Último registro incompleto (queda durante a escrita)
+            break
+        conteudo = dados[inicio:fim]
+        if zlib.crc32(conteudo) != crc:
+            corrompidos += 1
+        else:
+            try:
+                registros.append(_decodificar(conteudo))
+            except (ValueError, TypeError, IndexError):
+                corrompidos += 1
+        posicao = fim
+    if posicao < total:
+        # Sobra no fim do arquivo: cabeçalho ou conteúdo cortado no meio
+        corrompidos += 1
+    return registros, corrompidos
+
+
+class SpoolLocal:
+    """
+    Arquivo append-only de leituras pendentes com uma thread de replay.
+
+    gravar_lote: função que recebe uma lista de registros e retorna True
+    se o lote foi gravado no banco, False se o banco está indisponível, ou
+    lança ErroPermanente com os registros que o banco recusa.
+    """
+
+    def __init__(self, diretorio, gravar_lote, lote_replay=5000, intervalo_replay=5.0,
+                 intervalo_maximo=60.0, fsync=True):
+        self.diretorio = diretorio
+        self.gravar_lote = gravar_lote
+        self.lote_replay = max(1, lote_replay)
+        self.intervalo_replay = intervalo_replay
+        self.intervalo_maximo = max(intervalo_replay, intervalo_maximo)
+        self.fsync = fsync
+        self._caminho_ativo = os.path.join(diretorio, ARQUIVO_ATIVO)
+        self._caminho_quarentena = os.path.join(diretorio, ARQUIVO_QUARENTENA)
+        self._caminho_lock_escrita = os.path.join(diretorio, ARQUIVO_LOCK_ESCRITA)
+        self._caminho_lock_replay = os.path.join(diretorio, ARQUIVO_LOCK_REPLAY)
+        self._lock_escrita = threading.Lock()
+        self._lock_replay = threading.Lock()
+        self._acordar = threading.Event()
+        self._parando = False
+        self._thread = None
+
+        # Métricas
+        self.leituras_gravadas = 0
+        self.leituras_reenviadas = 0
+        self.registros_corrompidos = 0
+        self.leituras_quarentena = 0
+        self.falhas_escrita = 0
+        self.ultimo_replay = None
+
+    def iniciar(self):
+        """Cria o diretório e inicia a thread de replay (idempotente)."""
+        with self._lock_replay:
+            if self._thread and self._thread.is_alive():
+                return
+            os.makedirs(self.diretorio, exist_ok=True)
+            self._parando = False
+            self._thread = threading.Thread(target=self._loop, name="spool-replay", daemon=True)
+            self._thread.start()
+
+    def gravar(self, registros):
+        """Anexa registros ao spool. Retorna True se ficaram em disco."""
+        if not registros:
+            return True
+        if self._thread is None or not self._thread.is_alive():
+            self.iniciar()
+
+        try:
+            self._anexar(self._caminho_ativo, registros)
+            self.leituras_gravadas += len(registros)
+        except OSError as e:
+            self.falhas_escrita += 1
+            print(f"SPOOL: erro ao gravar {len(registros)} leituras em disco: {e}")
+            return False
+
+        print(f"SPOOL: {len(registros)} leituras guardadas localmente (banco indisponível)")
+        return True
+
+    def quarentenar(self, registros, motivo):
+        """
+        Anexa ao arquivo de quarentena leituras que o banco recusa (fora do replay).
+        Retorna True se ficaram em disco.
+        """
+        if not registros:
+            return True
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            self._anexar(self._caminho_quarentena, registros)
+        except OSError as e:
+            self.falhas_escrita += 1
+            print(f"SPOOL: erro ao gravar {len(registros)} leituras na quarentena: {e}")
+            return False
+        self.leituras_quarentena += len(registros)
+        print(f"SPOOL: {len(registros)} leituras em quarentena ({motivo})")
+        return True
+
+    def _anexar(self, caminho, registros):
+        """Um único write com O_APPEND: os registros inteiros vão para o fim do arquivo."""
+        dados = b''.join(_codificar(registro) for registro in registros)
+        with self._lock_escrita, _lock_arquivo(self._caminho_lock_escrita):
+            fd = os.open(caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, dados)
+                if self.fsync:
+                    os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def arquivos_pendentes(self):
+        """Arquivos aguardando replay (o ativo por último)."""
+        pendentes = sorted(glob.glob(os.path.join(self.diretorio, f'*{SUFIXO_REPLAY}')))
+        if os.path.exists(self._caminho_ativo) and os.path.getsize(self._caminho_ativo) > 0:
+            pendentes.append(self._caminho_ativo)
+        return pendentes
+
+    def bytes_pendentes(self):
+        total = 0
+        for caminho in self.arquivos_pendentes():
+            try:
+                total += os.path.getsize(caminho)
+            except OSError:
+                pass
+        return total
+
+    def drenar(self):
+        """
+        Reenvia todo o spool ao banco em lotes de `lote_replay`.
+        Retorna True se nada ficou pendente.
+        """
+        with self._lock_replay, _lock_arquivo(self._caminho_lock_replay, bloquear=False) as obtido:
+            if not obtido:
+                # Outro processo está drenando o mesmo diretório
+                return False
+            self._rotacionar()
+            for caminho in sorted(glob.glob(os.path.join(self.diretorio, f'*{SUFIXO_REPLAY}'))):
+                registros, corrompidos = ler_registros(caminho)
+                em_quarentena = 0
+                for inicio in range(0, len(registros), self.lote_replay):
+                    lote = registros[inicio:inicio + self.lote_replay]
+                    recusados = []
+                    try:
+                        gravado = self.gravar_lote(lote)
+                    except ErroPermanente as e:
+                        # Repetir não adianta: os recusados saem do caminho e o replay continua
+                        recusados = lote if e.registros is None else e.registros
+                        gravado = self.quarentenar(recusados, f"replay: {e}")
+                    except Exception as e:
+                        print(f"SPOOL: erro no replay: {e}")
+                        gravado = False
+                    if not gravado:
+                        # Banco ainda indisponível: o arquivo fica para a próxima tentativa
+                        return False
+                    self.leituras_reenviadas += len(lote) - len(recusados)
+                    em_quarentena += len(recusados)
+                self.registros_corrompidos += corrompidos
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                self.ultimo_replay = datetime.now().isoformat()
+                print(f"SPOOL: {len(registros) - em_quarentena} leituras reenviadas ao banco"
+                      + (f" ({em_quarentena} em quarentena)" if em_quarentena else "")
+                      + (f" ({corrompidos} registros corrompidos ignorados)" if corrompidos else ""))
+            return True
+
+    def _rotacionar(self):
+        """Renomeia o arquivo ativo para replay; novas leituras vão para um arquivo novo."""
+        with self._lock_escrita, _lock_arquivo(self._caminho_lock_escrita):
+            if os.path.exists(self._caminho_ativo) and os.path.getsize(self._caminho_ativo) > 0:
+                destino = os.path.join(self.diretorio, f"leituras-{time.time_ns()}{SUFIXO_REPLAY}")
+                os.replace(self._caminho_ativo, destino)
+
+    def _loop(self):
+        """Tenta o replay periodicamente, espaçando as tentativas enquanto o banco não volta."""
+        intervalo = self.intervalo_replay
+        while not self._parando:
+            if self.arquivos_pendentes():
+                if self.drenar():
+                    intervalo = self.intervalo_replay
+                else:
+                    intervalo = min(intervalo * 2, self.intervalo_maximo)
+            self._acordar.wait(intervalo)
+            self._acordar.clear()
+
+    def acordar(self):
+        """Antecipa a próxima tentativa de replay (ex.: o banco acabou de voltar)."""
+        self._acordar.set()
+
+    def parar(self, timeout=5.0):
+        """Encerra a thread de replay (o que estiver no spool fica para a próxima execução)."""
+        self._parando = True
+        self._acordar.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do spool."""
+        return {
+            "arquivos_pendentes": len(self.arquivos_pendentes()),
+            "bytes_pendentes": self.bytes_pendentes(),
+            "leituras_gravadas": self.leituras_gravadas,
+            "leituras_reenviadas": self.leituras_reenviadas,
+            "registros_corrompidos": self.registros_corrompidos,
+            "leituras_quarentena": self.leituras_quarentena,
+            "bytes_quarentena": os.path.getsize(self._caminho_quarentena)
+            if os.path.exists(self._caminho_quarentena) else 0,
+            "falhas_escrita": self.falhas_escrita,
+            "ultimo_replay": self.ultimo_replay
+        }
@@ -6,7 +6,10 @@ Este package contém as configurações centralizadas do sistema,
 incluindo configurações de banco de dados e outras constantes.
 """
 
-from .database_config import _config as DatabaseConfig, conectar_postgres, criar_schema_e_tabela, testar_conexao
+from .database_config import (
+    _config as DatabaseConfig, conectar_postgres, criar_schema_e_tabela, testar_conexao,
+    conexao_pool, conexao_leitura, conectar_postgres_leitura, BancoIndisponivel
+)
 from .settings import settings
 
 __version__ = "1.0.0"
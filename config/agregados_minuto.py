@@ -0,0 +1,191 @@
+"""
+Agregados por minuto das leituras dos sensores (fonte do /series)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Agrupar semanas de leituras cruas em baldes de tempo (date_bin) lê cada
+linha do intervalo: três semanas de um ESP32 a 1 leitura/s são 1,8 milhão
+de linhas por gráfico. A tabela leituras_sensores_minuto guarda, por
+dispositivo e minuto, o suficiente para recompor qualquer balde que seja
+múltiplo de um minuto:
+
+    n_<métrica>, soma_<métrica>   -> avg = soma / n
+    min_<métrica>, max_<métrica>  -> min / max
+    ultimo_<métrica>              -> last (valor da leitura mais recente do minuto)
+
+Ela é mantida como o resumo de estatisticas_agregadas.py: um trigger
+AFTER INSERT ... FOR EACH STATEMENT agrega as linhas novas por
+(dispositivo, minuto) e combina com o que já existe. UPDATE e DELETE (CRUD
+do dashboard, poucas linhas) recalculam na hora só os minutos afetados.
+"""
+
+import sys
+
+try:
+    from .gatilhos import criar_gatilho
+except ImportError:  # executado como script (python config/agregados_minuto.py)
+    from gatilhos import criar_gatilho
+
+# Métricas de leituras_sensores (booleanos viram 0/1: avg é a fração do balde ligada/presente)
+METRICAS = {
+    'umidade': 'umidade',
+    'temperatura': 'temperatura',
+    'ph': 'ph',
+    'bomba_dagua': 'bomba_dagua::int',
+    'fosforo': 'fosforo::int',
+    'potassio': 'potassio::int',
+}
+
+
+def _ultimo(expressao, instante):
+    """Valor de `expressao` na linha de maior `instante` (ignorando nulos), sem ordenar."""
+    return (f"(max(ARRAY[extract(epoch FROM {instante})::float8, ({expressao})::float8])"
+            f" FILTER (WHERE {expressao} IS NOT NULL))[2]")
+
+
+def _sql_agregar(schema, origem, juncao=""):
+    """SELECT que agrega as linhas de `origem` (alias s) por (dispositivo, minuto)."""
+    colunas = ",\n               ".join(
+        f"count({expr}), COALESCE(sum({expr}), 0)::float8, min({expr})::float8, max({expr})::float8, "
+        f"{_ultimo(expr, 's.data_hora_leitura')}"
+        for expr in (f"s.{coluna}" for coluna in METRICAS.values()))
+    return f"""
+        SELECT s.device_id, date_trunc('minute', s.data_hora_leitura) AS minuto, count(*), max(s.data_hora_leitura),
+               {colunas}
+        FROM {origem} s
+        {juncao}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """
+
+
+def _colunas():
+    nomes = ["device_id", "minuto", "n", "ultimo_em"]
+    for metrica in METRICAS:
+        nomes += [f"n_{metrica}", f"soma_{metrica}", f"min_{metrica}", f"max_{metrica}", f"ultimo_{metrica}"]
+    return ", ".join(nomes)
+
+
+def _combinar():
+    """SET do ON CONFLICT: soma contagens e somas, mínimo/máximo, e o último da leitura mais recente."""
+    partes = ["n = a.n + EXCLUDED.n", "ultimo_em = GREATEST(a.ultimo_em, EXCLUDED.ultimo_em)"]
+    for m in METRICAS:
+        partes += [
+            f"n_{m} = a.n_{m} + EXCLUDED.n_{m}",
+            f"soma_{m} = a.soma_{m} + EXCLUDED.soma_{m}",
+            f"min_{m} = LEAST(a.min_{m}, EXCLUDED.min_{m})",
+            f"max_{m} = GREATEST(a.max_{m}, EXCLUDED.max_{m})",
+            f"ultimo_{m} = CASE WHEN EXCLUDED.ultimo_em >= a.ultimo_em "
+            f"THEN COALESCE(EXCLUDED.ultimo_{m}, a.ultimo_{m}) ELSE COALESCE(a.ultimo_{m}, EXCLUDED.ultimo_{m}) END",
+        ]
+    return ",\n                    ".join(partes)
+
+
+def criar_agregados_minuto(cursor, schema):
+    """
+    Cria a tabela, as funções e os triggers (idempotente). Na primeira criação agrega
+    as linhas que já existem. Roda na transação do chamador (que faz o commit).
+    """
+    cursor.execute(f"SELECT to_regclass('{schema}.leituras_sensores_minuto')")
+    nova = cursor.fetchone()[0] is None
+
+    metricas = ",\n            ".join(
+        f"n_{m} INTEGER NOT NULL DEFAULT 0, soma_{m} DOUBLE PRECISION NOT NULL DEFAULT 0, "
+        f"min_{m} DOUBLE PRECISION, max_{m} DOUBLE PRECISION, ultimo_{m} DOUBLE PRECISION"
+        for m in METRICAS)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.leituras_sensores_minuto (
+            device_id VARCHAR(64) NOT NULL,
+            minuto TIMESTAMP NOT NULL,
+            n INTEGER NOT NULL,
+            ultimo_em TIMESTAMP NOT NULL,   -- leitura mais recente do minuto
+            {metricas},
+            PRIMARY KEY (device_id, minuto)
+        )
+    """)
+    # /series sem filtro de dispositivo
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS ix_leituras_sensores_minuto_minuto
+        ON {schema}.leituras_sensores_minuto (minuto)
+    """)
+
+    # INSERT (inclusive COPY): soma o lote aos minutos
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {schema}.fn_agregados_minuto() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO {schema}.leituras_sensores_minuto AS a ({_colunas()})
+            {_sql_agregar(schema, 'novas')}
+            ON CONFLICT (device_id, minuto) DO UPDATE SET
+                    {_combinar()};
+            RETURN NULL;
+        END $$
+    """)
+    # UPDATE/DELETE: recalcula os minutos afetados a partir das linhas atuais
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {schema}.fn_agregados_minuto_recalcular() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM {schema}.leituras_sensores_minuto a
+            USING (SELECT DISTINCT device_id, date_trunc('minute', data_hora_leitura) AS minuto FROM alteradas) c
+            WHERE a.device_id = c.device_id AND a.minuto = c.minuto;
+            INSERT INTO {schema}.leituras_sensores_minuto ({_colunas()})
+            {_sql_agregar(schema, f'{schema}.leituras_sensores', '''
+                JOIN (SELECT DISTINCT device_id, date_trunc('minute', data_hora_leitura) AS minuto
+                      FROM alteradas) c
+                  ON s.device_id = c.device_id
+                 AND s.data_hora_leitura >= c.minuto AND s.data_hora_leitura < c.minuto + interval '1 minute'
+            ''')};
+            RETURN NULL;
+        END $$
+    """)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {schema}.fn_agregados_minuto_truncar() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            TRUNCATE {schema}.leituras_sensores_minuto;
+            RETURN NULL;
+        END $$
+    """)
+
+    gatilhos = (
+        ('ins', 'INSERT', 'REFERENCING NEW TABLE AS novas', 'fn_agregados_minuto'),
+        ('upd_velhas', 'UPDATE', 'REFERENCING OLD TABLE AS alteradas', 'fn_agregados_minuto_recalcular'),
+        ('upd_novas', 'UPDATE', 'REFERENCING NEW TABLE AS alteradas', 'fn_agregados_minuto_recalcular'),
+        ('del', 'DELETE', 'REFERENCING OLD TABLE AS alteradas', 'fn_agregados_minuto_recalcular'),
+        ('trunc', 'TRUNCATE', '', 'fn_agregados_minuto_truncar'),
+    )
+    for sufixo, evento, referencia, funcao in gatilhos:
+        criar_gatilho(cursor, schema, 'leituras_sensores', f"trg_minuto_{sufixo}", evento, f"{funcao}()", referencia)
+
+    if nova:
+        reconstruir_agregados_minuto(cursor, schema)
+    return nova
+
+
+def reconstruir_agregados_minuto(cursor, schema):
+    """Recalcula todos os minutos a partir de leituras_sensores (bloqueia gravações até o commit)."""
+    cursor.execute(f"LOCK TABLE {schema}.leituras_sensores IN SHARE MODE")
+    cursor.execute(f"TRUNCATE {schema}.leituras_sensores_minuto")
+    cursor.execute(f"""
+        INSERT INTO {schema}.leituras_sensores_minuto ({_colunas()})
+        {_sql_agregar(schema, f'{schema}.leituras_sensores')}
+    """)
+
+
+# === EXECUÇÃO DIRETA: RECONSTRUÇÃO SOB DEMANDA ===
+if __name__ == "__main__":
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config.database_config import _config, conectar_postgres
+
+    conn, cursor = conectar_postgres()
+    if not conn:
+        sys.exit(1)
+    try:
+        criar_agregados_minuto(cursor, _config.SCHEMA)
+        reconstruir_agregados_minuto(cursor, _config.SCHEMA)
+        conn.commit()
+        print("✅ Agregados por minuto reconstruídos")
+    finally:
+        cursor.close()
+        conn.close()
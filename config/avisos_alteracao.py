@@ -0,0 +1,42 @@
+"""
+Avisos de alteração das tabelas de dados (LISTEN/NOTIFY)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O cache de respostas do servidor (Servidor_Local/cache_respostas.py) precisa
+saber quando uma tabela mudou, mesmo que a gravação tenha vindo de outro
+processo: outro worker do gunicorn, o modo assíncrono, o CRUD do dashboard
+ou o replay do spool. Consultar MAX(id) a cada requisição custaria a
+consulta que o cache quer evitar.
+
+Cada tabela ganha um trigger FOR EACH STATEMENT que faz pg_notify no canal
+do schema com o nome da tabela. O PostgreSQL entrega o aviso no commit (e
+junta avisos iguais da mesma transação), então um lote de 500 leituras
+gera um único aviso.
+"""
+
+try:
+    from .gatilhos import criar_gatilho
+except ImportError:  # executado como script (python config/avisos_alteracao.py)
+    from gatilhos import criar_gatilho
+
+TABELAS_AVISADAS = ('leituras_sensores', 'dados_meteorologicos', 'leituras_integradas')
+
+
+def canal_alteracoes(schema):
+    """Canal do LISTEN/NOTIFY das tabelas de um schema."""
+    return f"alteracoes_{schema.lower()}"
+
+
+def criar_avisos_alteracao(cursor, schema):
+    """Cria a função e os triggers de aviso (idempotente). Roda na transação do chamador."""
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {schema}.fn_avisar_alteracao() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify(TG_ARGV[0], TG_TABLE_NAME);
+            RETURN NULL;
+        END $$
+    """)
+    for tabela in TABELAS_AVISADAS:
+        criar_gatilho(cursor, schema, tabela, "trg_avisar_alteracao", "INSERT OR UPDATE OR DELETE OR TRUNCATE",
+                      f"fn_avisar_alteracao('{canal_alteracoes(schema)}')")
@@ -5,7 +5,18 @@ Farm Tech Solutions - FIAP Fase 4 Cap 1
 
 import psycopg2
 import os
+import sys
+import atexit
+import threading
+import time
+from contextlib import contextmanager
 from .settings import settings
+from .pool_conexoes import PoolConexoes, PoolEsgotado
+from .disjuntor import Disjuntor
+from .roteamento_leitura import RoteadorLeitura, medir_atraso
+from .estatisticas_agregadas import criar_estatisticas_agregadas
+from .agregados_minuto import criar_agregados_minuto
+from .avisos_alteracao import criar_avisos_alteracao
 
 # === CONFIGURAÇÕES DO BANCO DE DADOS POSTGRESQL ===
 class DatabaseConfig:
@@ -35,6 +46,11 @@ class DatabaseConfig:
     def SCHEMA(self):
         return settings.POSTGRES_SCHEMA
     
+    @property
+    def REPLICA_DSN(self):
+        """DSN da réplica somente leitura ('' = sem réplica, tudo no primário)."""
+        return settings.POSTGRES_REPLICA_DSN
+    
     # Para ambiente de desenvolvimento local (opcional)
     LOCAL_SQLITE = "leituras_sensores.db"
     
@@ -50,6 +66,31 @@ class DatabaseConfig:
             'password': config.PASSWORD
         }
     
+    @classmethod
+    def get_session_options(cls):
+        """
+        Configuração da sessão enviada na própria conexão (parâmetro options do libpq):
+        search_path e timezone valem desde o handshake, sem SET a cada uso.
+        """
+        config = cls()
+        return f"-c search_path={config.SCHEMA},public -c timezone=America/Sao_Paulo"
+    
+    @classmethod
+    def get_replica_params(cls):
+        """
+        Parâmetros de conexão da réplica de leitura, ou None se não houver réplica.
+        O DSN pode ser 'host=... port=...' ou uma URL postgresql://; o que não vier
+        nele (usuário, senha, banco) é o mesmo do primário.
+        """
+        config = cls()
+        if not config.REPLICA_DSN:
+            return None
+        parametros = cls.get_connection_params()
+        parametros.pop('host')
+        parametros.pop('port')
+        parametros['dsn'] = config.REPLICA_DSN
+        return parametros
+    
     @classmethod
     def get_connection_string(cls):
         """Retorna string de conexão PostgreSQL."""
@@ -59,29 +100,294 @@ class DatabaseConfig:
 # Instância global para compatibilidade com código existente
 _config = DatabaseConfig()
 
+# === DISJUNTOR (CIRCUIT BREAKER) DO PRIMÁRIO ===
+# Compartilhado por tudo que conecta no primário neste processo (pool do servidor,
+# conexões avulsas do dashboard): com o banco fora, as chamadas falham na hora em vez
+# de esperar o timeout de conexão, e uma sonda periódica detecta a volta do banco.
+disjuntor_banco = Disjuntor(
+    limite_falhas=settings.DISJUNTOR_LIMITE_FALHAS,
+    tempo_aberto=settings.DISJUNTOR_TEMPO_ABERTO,
+    ativo=settings.DISJUNTOR_ATIVO
+)
+
+def banco_em_falha():
+    """True se o disjuntor do primário recusaria uma chamada agora (banco sendo evitado)."""
+    return disjuntor_banco.aberto()
+
 # === FUNÇÕES UTILITÁRIAS DE CONEXÃO ===
 def conectar_postgres():
     """
     Conecta ao banco PostgreSQL e configura o schema.
     Retorna: (conexão, cursor) ou (None, None) em caso de erro
     """
+    if not disjuntor_banco.permitir():
+        print("❌ PostgreSQL indisponível (disjuntor aberto); tentando de novo em instantes")
+        return None, None
     try:
-        conn = psycopg2.connect(**DatabaseConfig.get_connection_params())
+        # Schema de busca e timezone do Brasil definidos na conexão (sem SET + commit)
+        conn = psycopg2.connect(**DatabaseConfig.get_connection_params(),
+                                connect_timeout=settings.POSTGRES_TIMEOUT_CONEXAO,
+                                options=DatabaseConfig.get_session_options())
         cursor = conn.cursor()
-        
-        # Define o schema de busca
-        cursor.execute(f"SET search_path TO {_config.SCHEMA}, public")
-        # Define timezone para Brasil
-        cursor.execute("SET timezone = 'America/Sao_Paulo'")
-        conn.commit()
+        disjuntor_banco.registrar_sucesso()
         
         print(f"✅ Conectado ao PostgreSQL - Schema: {_config.SCHEMA}")
         return conn, cursor
         
     except psycopg2.Error as error:
+        disjuntor_banco.registrar_falha()
         print(f"❌ Erro ao conectar ao PostgreSQL: {error}")
         return None, None
 
+def _conectar_replica():
+    """Conexão somente leitura com a réplica (autocommit: só consultas, sem transação aberta)."""
+    conn = psycopg2.connect(**DatabaseConfig.get_replica_params(),
+                            connect_timeout=settings.REPLICA_TIMEOUT_CONEXAO,
+                            options=DatabaseConfig.get_session_options() + " -c default_transaction_read_only=on")
+    conn.autocommit = True
+    return conn
+
+def conectar_postgres_leitura():
+    """
+    Conexão para leituras pesadas (dashboard, ML, exportação): a réplica se estiver
+    configurada e com atraso dentro de REPLICA_ATRASO_MAX_S, senão o primário.
+    Retorna: (conexão, cursor) ou (None, None) em caso de erro
+    """
+    if DatabaseConfig.get_replica_params() is not None:
+        conn = None
+        try:
+            conn = _conectar_replica()
+            cursor = conn.cursor()
+            atraso = medir_atraso(cursor)
+            if atraso is not None and atraso <= settings.REPLICA_ATRASO_MAX_S:
+                print(f"✅ Conectado à réplica de leitura (atraso {atraso:.1f}s) - Schema: {_config.SCHEMA}")
+                return conn, cursor
+            if atraso is None:
+                print("⚠️ Atraso da réplica desconhecido (nenhuma transação aplicada); usando o primário")
+            else:
+                print(f"⚠️ Réplica atrasada {atraso:.1f}s (máximo {settings.REPLICA_ATRASO_MAX_S}s); usando o primário")
+            conn.close()
+        except psycopg2.Error as error:
+            print(f"⚠️ Réplica de leitura indisponível ({error}); usando o primário")
+            if conn is not None:
+                conn.close()
+    return conectar_postgres()
+
+# === POOL DE CONEXÕES COMPARTILHADO ===
+# Um pool por processo, usado por todas as rotas do servidor. Cada conexão física
+# já nasce com search_path e timezone (get_session_options), então o checkout não
+# executa nada no banco. No modo multi-processo cada worker cria o seu depois do fork.
+class BancoIndisponivel(Exception):
+    """Não foi possível obter uma conexão do pool (banco fora do ar ou pool esgotado)."""
+
+class BancoOcupado(BancoIndisponivel):
+    """Todas as conexões do pool em uso por mais de POOL_TIMEOUT_CHECKOUT (o banco responde)."""
+
+_pool = None
+_pid_pool = None
+_lock_pool = threading.Lock()
+_ultima_tentativa_pool = 0.0
+INTERVALO_TENTATIVA_POOL = 5.0  # Segundos entre tentativas de criar o pool com o banco fora
+
+def _nova_conexao():
+    """Conexão física do pool, já com search_path e timezone da sessão."""
+    return psycopg2.connect(**DatabaseConfig.get_connection_params(),
+                            connect_timeout=settings.POSTGRES_TIMEOUT_CONEXAO,
+                            options=DatabaseConfig.get_session_options())
+
+def nova_conexao_dedicada():
+    """Conexão física fora do pool, para uso contínuo (ex.: LISTEN do cache de respostas)."""
+    return _nova_conexao()
+
+def inicializar_pool_conexoes(minconn=None, maxconn=None, limite_max=None):
+    """
+    Inicializa o pool de conexões deste processo (tamanhos padrão em POOL_MIN/MAX_CONEXOES).
+    limite_max: teto do modo adaptativo (padrão POOL_ADAPTATIVO_MAX).
+    """
+    global _pool, _pid_pool
+    maxconn = settings.POOL_MAX_CONEXOES if maxconn is None else maxconn
+    minconn = min(settings.POOL_MIN_CONEXOES if minconn is None else minconn, maxconn)
+    limite_max = settings.POOL_ADAPTATIVO_MAX if limite_max is None else limite_max
+    try:
+        _pool = PoolConexoes(
+            minconn=minconn,  # Conexões sempre abertas
+            maxconn=maxconn,  # Máximo de conexões simultâneas deste processo
+            conectar=_nova_conexao,
+            timeout_checkout=settings.POOL_TIMEOUT_CHECKOUT,
+            adaptativo=settings.POOL_ADAPTATIVO,
+            limite_max=limite_max,
+            espera_alvo_ms=settings.POOL_ESPERA_ALVO_MS
+        )
+        _pid_pool = os.getpid()
+        print(f"Pool de conexões PostgreSQL inicializado ({minconn}-{maxconn} conexões"
+              f"{f', adaptativo até {_pool.limite_max}' if _pool.adaptativo else ''}, pid {_pid_pool})")
+        return True
+    except Exception as e:
+        print(f"Erro ao inicializar pool: {e}")
+        return False
+
+def garantir_pool_conexoes():
+    """
+    Cria o pool sob demanda: apps importados (gunicorn, testes) não passam pelo __main__,
+    e um pool herdado de um fork pertence ao processo pai e não pode ser usado no filho.
+    Retorna True com o pool pronto, False se a criação falhou e None se ainda está no
+    intervalo entre tentativas (nada foi ao banco).
+    """
+    global _pool, _ultima_tentativa_pool
+    if _pool is not None and _pid_pool == os.getpid():
+        return True
+    with _lock_pool:
+        if _pool is not None and _pid_pool == os.getpid():
+            return True
+        # Pool do processo pai: só descarta a referência (fechar derrubaria as conexões do pai)
+        _pool = None
+        agora = time.monotonic()
+        if agora - _ultima_tentativa_pool < INTERVALO_TENTATIVA_POOL:
+            return None
+        _ultima_tentativa_pool = agora
+        return inicializar_pool_conexoes()
+
+def _emprestar_conexao():
+    """
+    (conexão, cursor) do pool, ou (None, None) se o banco estiver indisponível.
+    Levanta PoolEsgotado se nenhuma conexão ficar livre em POOL_TIMEOUT_CHECKOUT.
+    Só falha ao conectar conta no disjuntor: pool esgotado e a espera entre
+    tentativas de criar o pool não dizem nada sobre o banco.
+    """
+    if not disjuntor_banco.permitir():
+        return None, None
+    pool_pronto = garantir_pool_conexoes()
+    if pool_pronto is None:
+        disjuntor_banco.liberar_sonda()
+        return None, None
+    if pool_pronto:
+        try:
+            conn = _pool.getconn()
+            return conn, conn.cursor()
+        except PoolEsgotado:
+            disjuntor_banco.liberar_sonda()
+            raise
+        except Exception as e:
+            print(f"Erro ao obter conexão do pool: {e}")
+    disjuntor_banco.registrar_falha()
+    return None, None
+
+def obter_conexao_pool():
+    """
+    Obtém (conexão, cursor) do pool, ou (None, None) se não houver conexão
+    (banco indisponível, pool esgotado). Com o disjuntor aberto retorna
+    (None, None) na hora, sem tocar no banco.
+    """
+    try:
+        return _emprestar_conexao()
+    except PoolEsgotado as e:
+        print(f"Erro ao obter conexão do pool: {e}")
+        return None, None
+
+def devolver_conexao_pool(conn):
+    """
+    Devolve a conexão ao pool (conexões quebradas são descartadas).
+    O estado da conexão na devolução é o resultado para o disjuntor: aberta = banco
+    respondeu, fechada = conexão perdida durante o uso.
+    """
+    if conn is None:
+        return
+    if conn.closed:
+        disjuntor_banco.registrar_falha()
+    else:
+        disjuntor_banco.registrar_sucesso()
+    if _pool is not None and _pid_pool == os.getpid():
+        _pool.putconn(conn, close=bool(conn.closed))
+
+@contextmanager
+def conexao_pool(autocommit=False):
+    """
+    Empresta uma conexão do pool: `with conexao_pool() as (conn, cursor): ...`.
+    
+    autocommit=True é para consultas: cada comando roda sozinho, sem BEGIN nem
+    ROLLBACK ao devolver (uma consulta = um round-trip). Sem autocommit quem
+    grava faz conn.commit(); erro dentro do bloco desfaz a transação.
+    Levanta BancoIndisponivel se não houver conexão (BancoOcupado se o pool estiver esgotado).
+    """
+    try:
+        conn, cursor = _emprestar_conexao()
+    except PoolEsgotado as e:
+        raise BancoOcupado(str(e)) from e
+    if conn is None:
+        raise BancoIndisponivel("sem conexão com o PostgreSQL")
+    try:
+        if autocommit:
+            conn.autocommit = True
+        yield conn, cursor
+    except Exception:
+        if not conn.closed and not autocommit:
+            conn.rollback()
+        raise
+    finally:
+        if autocommit and not conn.closed:
+            conn.autocommit = False
+        cursor.close()
+        devolver_conexao_pool(conn)
+
+# === RÉPLICA DE LEITURA (OPCIONAL) ===
+# Consultas analíticas do servidor usam conexao_leitura(): vão para a réplica enquanto
+# ela estiver dentro do atraso máximo e caem no pool do primário em qualquer outro caso.
+_roteador_leitura = RoteadorLeitura(
+    _conectar_replica,
+    atraso_max_s=settings.REPLICA_ATRASO_MAX_S,
+    intervalo_verificacao=settings.REPLICA_INTERVALO_VERIFICACAO,
+    maxconn=settings.REPLICA_POOL_MAX_CONEXOES
+) if DatabaseConfig.get_replica_params() is not None else None
+
+@contextmanager
+def conexao_leitura():
+    """
+    Conexão para consultas somente leitura: `with conexao_leitura() as (conn, cursor): ...`.
+    
+    Usa a réplica (autocommit, default_transaction_read_only) quando configurada e em dia;
+    senão é o mesmo que conexao_pool(autocommit=True). Nunca use para gravar.
+    """
+    conn = _roteador_leitura.obter() if _roteador_leitura is not None else None
+    if conn is None:
+        with conexao_pool(autocommit=True) as (conn, cursor):
+            yield conn, cursor
+        return
+    cursor = conn.cursor()
+    try:
+        yield conn, cursor
+    finally:
+        cursor.close()
+        _roteador_leitura.devolver(conn)
+
+def metricas_disjuntor():
+    """Estado do disjuntor do primário neste processo."""
+    return disjuntor_banco.metricas()
+
+def metricas_replica():
+    """Métricas do roteamento para a réplica (None se não houver réplica configurada)."""
+    return _roteador_leitura.metricas() if _roteador_leitura is not None else None
+
+def metricas_pool():
+    """Métricas do pool deste processo (None se ainda não foi criado)."""
+    if _pool is None or _pid_pool != os.getpid():
+        return None
+    return _pool.metricas()
+
+def fechar_pool_conexoes():
+    """Fecha o pool de conexões (só o pool criado por este processo)."""
+    if _pool is not None and not _pool.closed and _pid_pool == os.getpid():
+        _pool.closeall()
+        print("Pool de conexões fechado")
+
+def fechar_pool_replica():
+    """Fecha o pool da réplica de leitura deste processo."""
+    if _roteador_leitura is not None:
+        _roteador_leitura.fechar()
+
+# Registrado antes dos componentes do servidor: o atexit roda em ordem inversa, então o pool fecha por último
+atexit.register(fechar_pool_conexoes)
+atexit.register(fechar_pool_replica)
+
 def criar_schema_e_tabela():
     """
     Cria o schema e tabela se não existirem.
@@ -155,6 +461,45 @@ def criar_schema_e_tabela():
                 )
             """)
             
+            # Identificação do dispositivo e idempotência por (device_id, data_hora_leitura)
+            cursor.execute(f"""
+                ALTER TABLE {_config.SCHEMA}.leituras_sensores
+                    ADD COLUMN IF NOT EXISTS device_id VARCHAR(64) NOT NULL DEFAULT 'esp32'
+            """)
+            cursor.execute(f"SELECT to_regclass('{_config.SCHEMA}.ux_leituras_sensores_device_data_hora')")
+            if cursor.fetchone()[0] is None:
+                # Com reenvios antigos na tabela o índice único não é criado: apagar linhas é
+                # uma migração explícita (deduplicar_leituras), nunca um efeito de iniciar o servidor
+                cursor.execute("SAVEPOINT indice_unico")
+                try:
+                    criar_indice_unico_leituras(cursor)
+                except psycopg2.errors.UniqueViolation:
+                    cursor.execute("ROLLBACK TO SAVEPOINT indice_unico")
+                    print("⚠️ leituras_sensores tem leituras repetidas (device_id, data_hora_leitura): índice único "
+                          "não criado, reenvios não serão descartados. Rode "
+                          "'python -m config.database_config --deduplicar' para removê-las e criar o índice.")
+            
+            # Páginas do /get_data sem filtro de dispositivo: keyset (data_hora_leitura, id)
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS ix_leituras_sensores_data_hora_id
+                ON {_config.SCHEMA}.leituras_sensores (data_hora_leitura, id)
+            """)
+            
+            # Vínculo da leitura integrada com as linhas de origem (preenchido pela escrita fan-out)
+            # e com o dispositivo que gerou a leitura
+            cursor.execute(f"""
+                ALTER TABLE {_config.SCHEMA}.leituras_integradas
+                    ADD COLUMN IF NOT EXISTS id_leitura_sensor INTEGER,
+                    ADD COLUMN IF NOT EXISTS id_dados_meteorologicos INTEGER,
+                    ADD COLUMN IF NOT EXISTS device_id VARCHAR(64) NOT NULL DEFAULT 'esp32'
+            """)
+            # Consultas por dispositivo (/integrated_data?device_id=, /stats?device_id=)
+            # sem varrer as linhas dos outros; em leituras_sensores o índice único já cobre
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS ix_leituras_integradas_device_data_hora
+                ON {_config.SCHEMA}.leituras_integradas (device_id, data_hora_leitura)
+            """)
+            
             # Criar view para análise ML
             cursor.execute(f"""
                 CREATE OR REPLACE VIEW {_config.SCHEMA}.view_ml_completa AS
@@ -190,11 +535,22 @@ def criar_schema_e_tabela():
                     CASE 
                         WHEN li.temperatura_externa > 30 THEN 1 
                         ELSE 0 
-                    END as dia_quente
+                    END as dia_quente,
+                    li.device_id
                 FROM {_config.SCHEMA}.leituras_integradas li
                 ORDER BY li.data_hora_leitura DESC
             """)
             
+            # Resumo incremental para o /stats (contagem, média, mín/máx, variância por dispositivo)
+            if criar_estatisticas_agregadas(cursor, _config.SCHEMA):
+                print("📊 Estatísticas agregadas calculadas a partir das linhas existentes")
+            # Aviso (NOTIFY) a cada gravação: invalida o cache de respostas de todos os processos
+            criar_avisos_alteracao(cursor, _config.SCHEMA)
+            
+            # Agregados por (dispositivo, minuto) para os gráficos do /series
+            if criar_agregados_minuto(cursor, _config.SCHEMA):
+                print("📈 Agregados por minuto calculados a partir das leituras existentes")
+            
             conn.commit()
             print(f"✅ Schema e tabelas '{_config.SCHEMA}' verificados/criados com nova estrutura.")
             print("📋 Estrutura das tabelas:")
@@ -202,6 +558,8 @@ def criar_schema_e_tabela():
             print("   • dados_meteorologicos - Dados do clima")
             print("   • leituras_integradas - Dados combinados para ML")
             print("   • view_ml_completa - View para análise com 20+ features")
+            print("   • estatisticas_agregadas - Resumo incremental para o /stats")
+            print("   • leituras_sensores_minuto - Agregados por minuto para o /series")
             return True
             
         except psycopg2.Error as error:
@@ -215,6 +573,45 @@ def criar_schema_e_tabela():
                 conn.close()
     return False
 
+def criar_indice_unico_leituras(cursor):
+    """Índice único (device_id, data_hora_leitura): base da idempotência da ingestão (ON CONFLICT)."""
+    cursor.execute(f"""
+        CREATE UNIQUE INDEX ux_leituras_sensores_device_data_hora
+        ON {_config.SCHEMA}.leituras_sensores (device_id, data_hora_leitura)
+    """)
+
+def deduplicar_leituras():
+    """
+    Migração manual (python -m config.database_config --deduplicar): remove os reenvios antigos
+    de leituras_sensores, mantendo a primeira gravação de cada (device_id, data_hora_leitura),
+    e cria o índice único. Apaga linhas: não roda ao iniciar o servidor.
+    """
+    conn, cursor = conectar_postgres()
+    if not conn:
+        return False
+    try:
+        cursor.execute(f"""
+            DELETE FROM {_config.SCHEMA}.leituras_sensores a
+            USING {_config.SCHEMA}.leituras_sensores b
+            WHERE a.device_id = b.device_id
+              AND a.data_hora_leitura = b.data_hora_leitura
+              AND a.id > b.id
+        """)
+        print(f"🧹 {cursor.rowcount} leituras duplicadas removidas de leituras_sensores")
+        cursor.execute(f"SELECT to_regclass('{_config.SCHEMA}.ux_leituras_sensores_device_data_hora')")
+        if cursor.fetchone()[0] is None:
+            criar_indice_unico_leituras(cursor)
+        conn.commit()
+        print("✅ Índice único ux_leituras_sensores_device_data_hora criado")
+        return True
+    except psycopg2.Error as error:
+        print(f"❌ Erro ao deduplicar leituras: {error}")
+        conn.rollback()
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
 def testar_conexao():
     """
     Testa a conexão com o banco de dados.
@@ -263,5 +660,8 @@ if __name__ == "__main__":
         # Cria estrutura do banco
         print("\n🔄 Criando estrutura do banco...")
         criar_schema_e_tabela()
+        if "--deduplicar" in sys.argv:
+            print("\n🧹 Removendo leituras duplicadas...")
+            deduplicar_leituras()
     else:
         print("❌ Configure as credenciais do banco antes de continuar.") 
\ No newline at end of file
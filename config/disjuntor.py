@@ -0,0 +1,145 @@
+"""
+Disjuntor (circuit breaker) do acesso ao PostgreSQL
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Com o banco fora do ar (ou lento demais), cada /data, cada thread de fundo
+e cada rerun do dashboard tentava abrir uma conexão e esperava o timeout
+de conexão inteiro. As threads se acumulavam e o processo todo ficava lento.
+
+O disjuntor tem três estados:
+  - FECHADO:     acesso normal; falhas seguidas são contadas.
+  - ABERTO:      depois de `limite_falhas` falhas seguidas. Toda chamada
+                 falha na hora, sem tocar no banco, por `tempo_aberto`
+                 segundos.
+  - SEMI_ABERTO: passado esse tempo, UMA chamada (a sonda) vai ao banco;
+                 as outras continuam falhando na hora. Se a sonda dá certo
+                 o disjuntor fecha; se falha, abre de novo.
+
+Só falhas de conexão contam (banco inacessível, conexão perdida). Pool
+esgotado é carga com o banco respondendo e não conta, nem erro de SQL de
+uma consulta; a chamada que não chegou ao banco devolve a vez da sonda
+com liberar_sonda(). As funções em `ao_fechar` são chamadas quando o
+banco volta (ex.: acordar o replay do spool em vez de esperar o próximo
+intervalo).
+"""
+
+import threading
+import time
+
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+SEMI_ABERTO = 'semi_aberto'
+
+
+class Disjuntor:
+    """Circuit breaker thread-safe."""
+
+    def __init__(self, limite_falhas=3, tempo_aberto=5.0, ativo=True, nome="banco"):
+        self.limite_falhas = max(1, limite_falhas)
+        self.tempo_aberto = tempo_aberto
+        self.ativo = ativo
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._estado = FECHADO
+        self._falhas_seguidas = 0
+        self._aberto_em = 0.0
+        self._sonda_em_andamento = False
+        self.ao_fechar = []      # Funções sem argumentos chamadas quando o disjuntor fecha
+
+        # Contadores
+        self.aberturas = 0
+        self.recusadas = 0       # Chamadas que falharam na hora (disjuntor aberto)
+        self.sondas = 0
+
+    @property
+    def estado(self):
+        return self._estado
+
+    def aberto(self):
+        """
+        True se uma chamada feita agora seria recusada: aberto dentro de tempo_aberto, ou
+        semi-aberto com a sonda em andamento. Vencido o tempo, a próxima chamada vira a sonda.
+        """
+        if not self.ativo or self._estado == FECHADO:
+            return False
+        if self._estado == SEMI_ABERTO:
+            return self._sonda_em_andamento
+        return time.monotonic() - self._aberto_em < self.tempo_aberto
+
+    def permitir(self):
+        """
+        True se a chamada pode ir ao banco. Com o disjuntor aberto só a sonda passa,
+        uma vez a cada tempo_aberto segundos; quem recebe True deve registrar o resultado.
+        """
+        if not self.ativo:
+            return True
+        with self._lock:
+            if self._estado == FECHADO:
+                return True
+            agora = time.monotonic()
+            if (self._estado == ABERTO and agora - self._aberto_em >= self.tempo_aberto) or \
+                    (self._estado == SEMI_ABERTO and not self._sonda_em_andamento):
+                self._estado = SEMI_ABERTO
+                self._sonda_em_andamento = True
+                self.sondas += 1
+                return True
+            self.recusadas += 1
+            return False
+
+    def registrar_sucesso(self):
+        if not self.ativo:
+            return
+        with self._lock:
+            self._falhas_seguidas = 0
+            if self._estado == FECHADO:
+                return
+            print(f"DISJUNTOR ({self.nome}): sonda OK, fechado depois de "
+                  f"{time.monotonic() - self._aberto_em:.1f}s aberto")
+            self._estado = FECHADO
+            self._sonda_em_andamento = False
+        for funcao in self.ao_fechar:
+            try:
+                funcao()
+            except Exception as e:
+                print(f"DISJUNTOR ({self.nome}): erro ao avisar fechamento: {e}")
+
+    def liberar_sonda(self):
+        """
+        A chamada que recebeu permitir() terminou sem resultado sobre o banco (pool
+        esgotado, espera entre tentativas de conexão): a próxima chamada vira a sonda.
+        """
+        if not self.ativo:
+            return
+        with self._lock:
+            if self._estado == SEMI_ABERTO:
+                self._sonda_em_andamento = False
+
+    def registrar_falha(self):
+        if not self.ativo:
+            return
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._estado == SEMI_ABERTO or \
+                    (self._estado == FECHADO and self._falhas_seguidas >= self.limite_falhas):
+                if self._estado == FECHADO:
+                    self.aberturas += 1
+                    print(f"DISJUNTOR ({self.nome}): aberto após {self._falhas_seguidas} falhas seguidas; "
+                          f"nova tentativa em {self.tempo_aberto}s")
+                self._estado = ABERTO
+                self._aberto_em = time.monotonic()
+                self._sonda_em_andamento = False
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do disjuntor."""
+        with self._lock:
+            return {
+                "ativo": self.ativo,
+                "estado": self._estado,
+                "falhas_seguidas": self._falhas_seguidas,
+                "limite_falhas": self.limite_falhas,
+                "tempo_aberto_s": self.tempo_aberto,
+                "aberto_ha_s": round(time.monotonic() - self._aberto_em, 1) if self._estado != FECHADO else None,
+                "aberturas": self.aberturas,
+                "recusadas": self.recusadas,
+                "sondas": self.sondas
+            }
@@ -0,0 +1,328 @@
+"""
+Estatísticas agregadas mantidas incrementalmente (contagem, soma, mínimo, máximo, média e variância)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+O /stats e o crud_estatisticas do dashboard faziam COUNT/AVG/MIN/MAX sobre as
+tabelas inteiras a cada chamada: o custo crescia com o histórico.
+
+Aqui cada tabela tem um trigger AFTER INSERT ... FOR EACH STATEMENT (com a
+tabela de transição das linhas novas) que agrega só as linhas do comando e
+soma o resultado na tabela estatisticas_agregadas, uma linha por
+(tabela, dispositivo, coluna). Um INSERT de uma leitura, um execute_values
+ou um COPY de milhares de linhas custam um único UPSERT por dispositivo.
+Os UPSERTs seguem sempre a ordem (dispositivo, coluna): dois lotes
+concorrentes com dispositivos em comum bloqueiam as linhas na mesma ordem
+e um só espera o outro, sem deadlock.
+
+Tabelas sem dispositivo (meteorologia, da região) teriam uma única linha
+por coluna disputada por todos os workers que gravam ao mesmo tempo. Nelas
+cada conexão soma na sua linha (slot '#n', n = pid do backend % SLOTS_GLOBAIS);
+a leitura já junta as linhas da tabela, então o total é o mesmo.
+
+Média e variância usam o algoritmo de Welford na forma paralela (Chan et al.):
+cada lote traz (n, média, M2) e é combinado com o acumulado sem reler dados,
+
+    media = media_a + (media_b - media_a) * n_b / (n_a + n_b)
+    M2    = M2_a + M2_b + (media_b - media_a)^2 * n_a * n_b / (n_a + n_b)
+
+e a variância populacional é M2 / n. A leitura do total geral junta os
+dispositivos da mesma forma, então custa O(dispositivos), não O(linhas).
+
+UPDATE e DELETE (CRUD do dashboard) não têm como atualizar mínimo e máximo
+de forma incremental: os triggers só marcam o dispositivo como
+desatualizado. A leitura devolve o resumo anterior com a marca e pede o
+recálculo em background (reconstruir_desatualizadas, só as linhas do
+dispositivo, pelo índice, sem travar a tabela). reconstruir_estatisticas()
+recalcula tudo a partir das tabelas (python config/estatisticas_agregadas.py).
+"""
+
+import sys
+
+try:
+    from .gatilhos import criar_gatilho
+except ImportError:  # executado como script (python config/estatisticas_agregadas.py)
+    from gatilhos import criar_gatilho
+
+# tabela -> (expressão do dispositivo ou None se a tabela não tem dispositivo, {coluna agregada: expressão})
+# '*' (contagem de linhas) é incluída automaticamente.
+TABELAS_AGREGADAS = {
+    'leituras_sensores': ('device_id', {
+        'umidade': 'umidade',
+        'temperatura': 'temperatura',
+        'ph': 'ph',
+    }),
+    # Meteorologia é da região, não de um dispositivo
+    'dados_meteorologicos': (None, {
+        'temperatura_externa': 'temperatura_externa',
+        'umidade_ar': 'umidade_ar',
+        'probabilidade_chuva': 'probabilidade_chuva',
+    }),
+    'leituras_integradas': ('device_id', {
+        'fator_evapotranspiracao': 'fator_evapotranspiracao',
+        # Indicador 0/1: a soma é a quantidade de previsões de chuva
+        'previsao_chuva': 'CASE WHEN probabilidade_chuva > 70 THEN 1 ELSE 0 END',
+    }),
+}
+
+# Linhas de resumo por tabela sem dispositivo (uma por conexão, módulo SLOTS_GLOBAIS)
+SLOTS_GLOBAIS = 16
+SQL_SLOT = f"'#' || mod(pg_backend_pid(), {SLOTS_GLOBAIS})"
+
+
+def _dispositivo(tabela):
+    """Expressão do device_id do resumo: o dispositivo da linha, ou o slot da conexão."""
+    dispositivo, _ = TABELAS_AGREGADAS[tabela]
+    return SQL_SLOT if dispositivo is None else dispositivo
+
+
+# Combinação (Chan) do acumulado `a` com o lote EXCLUDED
+SQL_COMBINAR = """
+    n = a.n + EXCLUDED.n,
+    soma = a.soma + EXCLUDED.soma,
+    minimo = LEAST(a.minimo, EXCLUDED.minimo),
+    maximo = GREATEST(a.maximo, EXCLUDED.maximo),
+    media = a.media + (EXCLUDED.media - a.media) * EXCLUDED.n / (a.n + EXCLUDED.n),
+    m2 = a.m2 + EXCLUDED.m2 + power(EXCLUDED.media - a.media, 2) * a.n * EXCLUDED.n / (a.n + EXCLUDED.n),
+    atualizado_em = now()
+"""
+
+
+def _sql_agregar(schema, tabela, origem, filtro=""):
+    """SELECT que agrega as linhas de `origem` por (dispositivo, coluna) no formato de estatisticas_agregadas."""
+    _, colunas = TABELAS_AGREGADAS[tabela]
+    valores = ", ".join(["('*', 0::float8)"] + [f"('{nome}', ({expressao})::float8)"
+                                                for nome, expressao in colunas.items()])
+    return f"""
+        SELECT '{tabela}', dispositivo, coluna, count(valor), COALESCE(sum(valor), 0), min(valor), max(valor),
+               COALESCE(avg(valor), 0), COALESCE(var_pop(valor) * count(valor), 0)
+        FROM (
+            SELECT {_dispositivo(tabela)} AS dispositivo, v.coluna, v.valor
+            FROM {origem}
+            CROSS JOIN LATERAL (VALUES {valores}) AS v(coluna, valor)
+            {filtro}
+        ) AS lote
+        GROUP BY dispositivo, coluna
+        HAVING count(valor) > 0
+        ORDER BY dispositivo, coluna
+    """
+
+
+def criar_estatisticas_agregadas(cursor, schema):
+    """
+    Cria a tabela de resumo, as funções e os triggers (idempotente).
+    Na primeira criação calcula o resumo a partir das linhas que já existem.
+    Roda na transação do chamador (que faz o commit).
+    """
+    cursor.execute(f"SELECT to_regclass('{schema}.estatisticas_agregadas')")
+    nova = cursor.fetchone()[0] is None
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.estatisticas_agregadas (
+            tabela VARCHAR(64) NOT NULL,
+            device_id VARCHAR(64) NOT NULL,
+            coluna VARCHAR(64) NOT NULL,
+            n BIGINT NOT NULL DEFAULT 0,
+            soma DOUBLE PRECISION NOT NULL DEFAULT 0,
+            minimo DOUBLE PRECISION,
+            maximo DOUBLE PRECISION,
+            media DOUBLE PRECISION NOT NULL DEFAULT 0,
+            m2 DOUBLE PRECISION NOT NULL DEFAULT 0,      -- soma dos quadrados dos desvios (Welford)
+            desatualizado BOOLEAN NOT NULL DEFAULT FALSE,  -- só na linha '*': recalcular o dispositivo
+            atualizado_em TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (tabela, device_id, coluna)
+        )
+    """)
+
+    # TRUNCATE zera o resumo da tabela (função comum a todas)
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION {schema}.fn_estatisticas_truncar() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            DELETE FROM {schema}.estatisticas_agregadas WHERE tabela = TG_TABLE_NAME;
+            RETURN NULL;
+        END $$
+    """)
+
+    for tabela in TABELAS_AGREGADAS:
+        # INSERT (inclusive COPY e INSERT ... ON CONFLICT DO NOTHING): soma o lote ao resumo,
+        # na ordem (dispositivo, coluna) do _sql_agregar
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION {schema}.fn_estatisticas_{tabela}() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                INSERT INTO {schema}.estatisticas_agregadas AS a
+                    (tabela, device_id, coluna, n, soma, minimo, maximo, media, m2)
+                {_sql_agregar(schema, tabela, 'novas')}
+                ON CONFLICT (tabela, device_id, coluna) DO UPDATE SET {SQL_COMBINAR};
+                RETURN NULL;
+            END $$
+        """)
+        # UPDATE/DELETE: marca os dispositivos afetados para recálculo
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION {schema}.fn_estatisticas_{tabela}_marcar() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                INSERT INTO {schema}.estatisticas_agregadas AS a (tabela, device_id, coluna, desatualizado)
+                SELECT DISTINCT '{tabela}', {_dispositivo(tabela)}, '*', TRUE FROM alteradas
+                ORDER BY 2
+                ON CONFLICT (tabela, device_id, coluna) DO UPDATE SET desatualizado = TRUE;
+                RETURN NULL;
+            END $$
+        """)
+        gatilhos = (
+            ('ins', 'INSERT', 'REFERENCING NEW TABLE AS novas', f'fn_estatisticas_{tabela}'),
+            ('upd_velhas', 'UPDATE', 'REFERENCING OLD TABLE AS alteradas', f'fn_estatisticas_{tabela}_marcar'),
+            ('upd_novas', 'UPDATE', 'REFERENCING NEW TABLE AS alteradas', f'fn_estatisticas_{tabela}_marcar'),
+            ('del', 'DELETE', 'REFERENCING OLD TABLE AS alteradas', f'fn_estatisticas_{tabela}_marcar'),
+            ('trunc', 'TRUNCATE', '', 'fn_estatisticas_truncar'),
+        )
+        for sufixo, evento, referencia, funcao in gatilhos:
+            criar_gatilho(cursor, schema, tabela, f"trg_estatisticas_{sufixo}", evento, f"{funcao}()", referencia)
+
+    if nova:
+        for tabela in TABELAS_AGREGADAS:
+            reconstruir_estatisticas(cursor, schema, tabela)
+    return nova
+
+
+def reconstruir_estatisticas(cursor, schema, tabela=None, device_id=None):
+    """
+    Recalcula o resumo a partir das linhas da tabela (todas, ou só um dispositivo;
+    tabelas sem dispositivo são sempre recalculadas inteiras). Roda na transação do chamador.
+
+    A tabela inteira é recalculada com LOCK SHARE (nenhum INSERT concorrente fica fora do
+    resumo): é o caso da criação, da migração manual e da meteorologia, gravada só pelo
+    pós-processamento. Um dispositivo não trava a tabela: ver _reconstruir_dispositivo.
+    """
+    for nome in ([tabela] if tabela else TABELAS_AGREGADAS):
+        dispositivo, _ = TABELAS_AGREGADAS[nome]
+        if device_id is not None and dispositivo is not None:
+            _reconstruir_dispositivo(cursor, schema, nome, dispositivo, device_id)
+            continue
+        cursor.execute(f"LOCK TABLE {schema}.{nome} IN SHARE MODE")
+        cursor.execute(f"DELETE FROM {schema}.estatisticas_agregadas WHERE tabela = %s", (nome,))
+        cursor.execute(f"""
+            INSERT INTO {schema}.estatisticas_agregadas (tabela, device_id, coluna, n, soma, minimo, maximo, media, m2)
+            {_sql_agregar(schema, nome, f'{schema}.{nome}')}
+        """)
+
+
+def _reconstruir_dispositivo(cursor, schema, tabela, dispositivo, device_id):
+    """
+    Recalcula um dispositivo travando só as linhas de resumo dele, na ordem (dispositivo, coluna)
+    dos triggers, em vez da tabela: as gravações dos outros dispositivos seguem normalmente.
+    Um INSERT do dispositivo que já tinha travado essas linhas termina antes e entra na
+    varredura; os que chegam depois esperam no UPSERT da linha '*' (a primeira da ordem, que
+    existe porque o dispositivo foi marcado) e somam o lote ao recálculo depois do commit.
+    """
+    cursor.execute(f"""
+        SELECT coluna FROM {schema}.estatisticas_agregadas
+        WHERE tabela = %s AND device_id = %s
+        ORDER BY coluna
+        FOR UPDATE
+    """, (tabela, device_id))
+    travadas = [linha[0] for linha in cursor.fetchall()]
+    cursor.execute(f"""
+        INSERT INTO {schema}.estatisticas_agregadas AS a (tabela, device_id, coluna, n, soma, minimo, maximo, media, m2)
+        {_sql_agregar(schema, tabela, f'{schema}.{tabela}', f"WHERE {dispositivo} = %s")}
+        ON CONFLICT (tabela, device_id, coluna) DO UPDATE SET
+            n = EXCLUDED.n, soma = EXCLUDED.soma, minimo = EXCLUDED.minimo, maximo = EXCLUDED.maximo,
+            media = EXCLUDED.media, m2 = EXCLUDED.m2, desatualizado = FALSE, atualizado_em = now()
+        RETURNING coluna
+    """, (device_id,))
+    recalculadas = [linha[0] for linha in cursor.fetchall()]
+    # Colunas que ficaram sem valores (linhas removidas): só entre as travadas
+    cursor.execute(f"""
+        DELETE FROM {schema}.estatisticas_agregadas
+        WHERE tabela = %s AND device_id = %s AND coluna = ANY(%s) AND NOT coluna = ANY(%s)
+    """, (tabela, device_id, travadas, recalculadas))
+
+
+def reconstruir_desatualizadas(cursor, schema):
+    """Recalcula os dispositivos marcados por UPDATE/DELETE. Retorna quantos foram recalculados."""
+    cursor.execute(f"""
+        SELECT tabela, device_id FROM {schema}.estatisticas_agregadas
+        WHERE coluna = '*' AND desatualizado
+    """)
+    pendentes = cursor.fetchall()
+    inteiras = set()
+    for tabela, device_id in pendentes:
+        if tabela not in TABELAS_AGREGADAS or tabela in inteiras:
+            continue
+        if TABELAS_AGREGADAS[tabela][0] is None:
+            # Slots marcados de uma tabela sem dispositivo: um recálculo da tabela cobre todos
+            inteiras.add(tabela)
+        reconstruir_estatisticas(cursor, schema, tabela, device_id)
+    return len(pendentes)
+
+
+def sql_ler_estatisticas(schema, por_dispositivo=False, marcadores=('%s', '%s')):
+    """
+    Consulta do resumo de uma tabela: junta os dispositivos num único agregado, sem
+    ordenar, com M2 = sum(M2_i + n_i * media_i^2) - n * media^2 (a combinação de Chan
+    de todos os grupos de uma vez). Custa O(dispositivos), não O(linhas).
+    Parâmetros: tabela e, com por_dispositivo, device_id. `marcadores` troca os %s do
+    psycopg2 pelos $1/$2 do asyncpg.
+    """
+    filtro = f"AND device_id = {marcadores[1]}" if por_dispositivo else ""
+    return f"""
+        SELECT coluna, SUM(n)::bigint, SUM(soma), MIN(minimo), MAX(maximo),
+               SUM(n * media) / NULLIF(SUM(n), 0),
+               SUM(m2 + n * media * media) - power(SUM(n * media), 2) / NULLIF(SUM(n), 0),
+               bool_or(desatualizado)
+        FROM {schema}.estatisticas_agregadas
+        WHERE tabela = {marcadores[0]} {filtro}
+        GROUP BY coluna
+    """
+
+
+def montar_estatisticas(linhas):
+    """
+    Converte as linhas de sql_ler_estatisticas em (estatisticas, desatualizado):
+    estatisticas é {coluna: {n, soma, media, minimo, maximo, variancia, desvio_padrao}}
+    ('*' tem a contagem de linhas); desatualizado indica que algum dispositivo espera
+    reconstruir_desatualizadas() (os valores são os de antes do UPDATE/DELETE).
+    """
+    estatisticas = {}
+    desatualizado = False
+    for coluna, n, soma, minimo, maximo, media, m2, marcado in linhas:
+        desatualizado = desatualizado or marcado
+        variancia = max(m2 or 0.0, 0.0) / n if n else None
+        estatisticas[coluna] = {
+            "n": n,
+            "soma": soma,
+            "media": media if n else None,
+            "minimo": minimo,
+            "maximo": maximo,
+            "variancia": variancia,
+            "desvio_padrao": variancia ** 0.5 if variancia is not None else None
+        }
+    return estatisticas, desatualizado
+
+
+def ler_estatisticas(cursor, schema, tabela, device_id=None):
+    """Estatísticas de uma tabela (todas as linhas, ou um dispositivo); ver montar_estatisticas."""
+    por_dispositivo = device_id is not None
+    cursor.execute(sql_ler_estatisticas(schema, por_dispositivo),
+                   (tabela, device_id) if por_dispositivo else (tabela,))
+    return montar_estatisticas(cursor.fetchall())
+
+
+# === EXECUÇÃO DIRETA: RECONSTRUÇÃO SOB DEMANDA ===
+if __name__ == "__main__":
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config.database_config import _config, conectar_postgres
+
+    tabela = sys.argv[1] if len(sys.argv) > 1 else None
+    conn, cursor = conectar_postgres()
+    if not conn:
+        sys.exit(1)
+    try:
+        criar_estatisticas_agregadas(cursor, _config.SCHEMA)
+        reconstruir_estatisticas(cursor, _config.SCHEMA, tabela)
+        conn.commit()
+        print(f"✅ Estatísticas agregadas reconstruídas ({tabela or 'todas as tabelas'})")
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,113 @@
+"""
+Exportação em streaming das leituras (NDJSON ou CSV)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Exportar o histórico buscava a tabela inteira com fetchall(), montava um
+dict ou um DataFrame e só então serializava tudo de uma vez: o pico de
+memória era várias vezes o tamanho da tabela.
+
+Aqui a consulta roda num cursor nomeado (server-side): o PostgreSQL mantém
+o resultado e entrega `tamanho_bloco` linhas por round-trip. Cada bloco é
+serializado e entregue (resposta HTTP em streaming ou arquivo) antes de ler
+o próximo, então a memória fica em um bloco, com mil ou milhões de linhas.
+"""
+
+import csv
+import io
+import itertools
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+FORMATOS = ('ndjson', 'csv')
+TIPOS_CONTEUDO = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Colunas exportadas de leituras_sensores (ordem das colunas no CSV)
+COLUNAS_LEITURAS = ('id', 'device_id', 'data_hora_leitura', 'criacaots', 'umidade', 'temperatura', 'ph',
+                    'fosforo', 'potassio', 'bomba_dagua')
+
+_contador_cursores = itertools.count(1)
+
+
+def sql_exportar_leituras(schema, colunas=COLUNAS_LEITURAS, por_dispositivo=False,
+                          marcadores=('%s', '%s', '%s')):
+    """
+    Leituras em ordem cronológica (índice (data_hora_leitura, id)).
+    Parâmetros: desde (inclusivo), até (exclusivo) e, com por_dispositivo, device_id.
+    `marcadores` troca os %s do psycopg2 pelos $n do asyncpg.
+    """
+    filtro = f"AND device_id = {marcadores[2]}" if por_dispositivo else ""
+    return f"""
+        SELECT {', '.join(colunas)}
+        FROM {schema}.leituras_sensores
+        WHERE data_hora_leitura >= {marcadores[0]} AND data_hora_leitura < {marcadores[1]} {filtro}
+        ORDER BY data_hora_leitura, id
+    """
+
+
+def ler_em_blocos(conn, sql, parametros=(), tamanho_bloco=5000):
+    """
+    Gera listas de até `tamanho_bloco` linhas lidas por um cursor nomeado.
+    O cursor nomeado só existe dentro de uma transação: uma conexão em autocommit
+    (pool de consultas, réplica) sai do autocommit enquanto o gerador roda e volta
+    ao fim, inclusive se o consumidor parar no meio.
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = False
+    try:
+        with conn.cursor(name=f"exportacao_{next(_contador_cursores)}") as cursor:
+            cursor.itersize = tamanho_bloco
+            cursor.execute(sql, parametros)
+            while True:
+                linhas = cursor.fetchmany(tamanho_bloco)
+                if not linhas:
+                    break
+                yield linhas
+    finally:
+        if not conn.closed:
+            conn.rollback()   # Só leitura: encerra a transação do cursor
+            conn.autocommit = autocommit
+
+
+def _valor_json(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+_codificar_json = json.JSONEncoder(default=_valor_json, ensure_ascii=False, separators=(',', ':')).encode
+
+
+def _csv(linhas):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(linhas)
+    return buffer.getvalue().encode('utf-8')
+
+
+def cabecalho(formato, colunas):
+    """Bytes que abrem a exportação (linha de nomes no CSV; nada no NDJSON)."""
+    return _csv([colunas]) if formato == 'csv' else b""
+
+
+def serializar_bloco(formato, colunas, linhas):
+    """
+    Um bloco de linhas em bytes: NDJSON (um objeto por linha, datas ISO 8601) ou CSV
+    no formato do DataFrame.to_csv (datas 'AAAA-MM-DD HH:MM:SS', booleanos True/False, nulo vazio).
+    """
+    if formato == 'csv':
+        return _csv(linhas)
+    return "".join(_codificar_json(dict(zip(colunas, linha))) + "\n" for linha in linhas).encode('utf-8')
+
+
+def serializar_em_blocos(formato, colunas, blocos):
+    """Gera o cabeçalho e um pedaço de bytes por bloco de `blocos`."""
+    inicio = cabecalho(formato, colunas)
+    if inicio:
+        yield inicio
+    for linhas in blocos:
+        yield serializar_bloco(formato, colunas, linhas)
@@ -0,0 +1,35 @@
+"""
+Criação idempotente dos triggers das tabelas de dados
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+criar_schema_e_tabela() roda a cada início do servidor (e a cada `import serve`
+do serve_async). DROP TRIGGER + CREATE TRIGGER em cada tabela de dados pedem
+um lock que bloqueia as gravações nela: a cada início, o servidor esperava (e
+segurava) a ingestão dos outros workers por causa de uns vinte comandos DDL.
+
+criar_gatilho() só cria o trigger se ele ainda não estiver em pg_trigger;
+depois da primeira vez, cada início custa uma consulta ao catálogo por trigger.
+As funções dos triggers continuam em CREATE OR REPLACE FUNCTION (sem lock nas
+tabelas), então mudar o corpo delas não exige recriar os triggers.
+"""
+
+
+def criar_gatilho(cursor, schema, tabela, nome, evento, funcao, referencia=""):
+    """
+    Cria o trigger `nome` AFTER `evento` ... FOR EACH STATEMENT EXECUTE FUNCTION schema.funcao
+    em schema.tabela, se ele ainda não existir. Um trigger existente não é comparado: para
+    mudar evento ou função, use outro nome (ou apague o antigo). Retorna True se criou.
+    """
+    cursor.execute("""
+        SELECT 1 FROM pg_trigger
+        WHERE tgrelid = to_regclass(%s) AND tgname = %s AND NOT tgisinternal
+    """, (f"{schema}.{tabela}", nome))
+    if cursor.fetchone():
+        return False
+    cursor.execute(f"""
+        CREATE TRIGGER {nome}
+        AFTER {evento} ON {schema}.{tabela}
+        {referencia}
+        FOR EACH STATEMENT EXECUTE FUNCTION {schema}.{funcao}
+    """)
+    return True
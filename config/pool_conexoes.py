@@ -0,0 +1,272 @@
+"""
+Pool de conexões PostgreSQL instrumentado (e opcionalmente adaptativo)
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+Substitui o ThreadedConnectionPool do psycopg2, que:
+  - falha na hora quando todas as conexões estão em uso (sem esperar);
+  - fecha toda conexão devolvida além de minconn, então sob carga cada
+    checkout acima do mínimo abre uma conexão nova (e perde os comandos
+    preparados dela);
+  - não mostra nada sobre o que está acontecendo.
+
+Aqui o checkout espera até `timeout_checkout` segundos por uma conexão
+livre, as conexões ociosas ficam abertas até o máximo do pool, e o pool
+mede o tempo de espera (histograma), conexões em uso/ociosas, falhas de
+checkout e idade das conexões.
+
+No modo adaptativo o máximo do pool é reavaliado a cada `intervalo_ajuste`
+segundos: cresce (até `limite_max`) quando o p95 da espera passa de
+`espera_alvo_ms` ou houve falhas de checkout, e encolhe (até minconn)
+quando ninguém esperou e o pico de uso ficou abaixo da metade.
+"""
+
+import threading
+import time
+
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+
+
+class PoolEsgotado(PoolError):
+    """Nenhuma conexão livre dentro de timeout_checkout (carga, não banco fora do ar)."""
+
+
+# Limites (ms) das faixas do histograma de espera no checkout
+FAIXAS_ESPERA_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolConexoes:
+    """
+    Pool de conexões thread-safe com espera limitada e métricas.
+
+    conectar: função sem argumentos que abre uma conexão nova.
+    """
+
+    def __init__(self, minconn, maxconn, conectar, timeout_checkout=2.0, adaptativo=False,
+                 limite_max=None, espera_alvo_ms=5.0, intervalo_ajuste=10.0):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, self.minconn, maxconn)
+        self.limite_max = max(self.maxconn, limite_max or self.maxconn)
+        self.timeout_checkout = timeout_checkout
+        self.adaptativo = adaptativo
+        self.espera_alvo = espera_alvo_ms / 1000.0
+        self.intervalo_ajuste = intervalo_ajuste
+        self.closed = False
+        self._conectar = conectar
+        self._cond = threading.Condition()
+        self._ociosas = []         # LIFO: a conexão mais recente volta primeiro (cache quente)
+        self._em_uso = {}          # id(conexão) -> conexão
+        self._criada_em = {}       # id(conexão) -> time.monotonic() da criação
+        self._total = 0            # em uso + ociosas + sendo abertas
+        self._aguardando = 0
+
+        # Métricas
+        self.checkouts = 0
+        self.falhas_checkout = 0   # timeout esperando conexão
+        self.falhas_conexao = 0    # erro ao abrir conexão nova
+        self.conexoes_criadas = 0
+        self.conexoes_descartadas = 0
+        self.ajustes = 0
+        self._histograma = [0] * (len(FAIXAS_ESPERA_MS) + 1)
+        self._espera_total = 0.0
+        self._espera_maxima = 0.0
+        self._pico_em_uso = 0
+
+        # Janela do modo adaptativo
+        self._esperas_janela = []
+        self._falhas_janela = 0
+        self._pico_janela = 0
+        self._ultimo_ajuste = time.monotonic()
+
+        for _ in range(self.minconn):
+            conn = self._conectar()
+            self._registrar_criacao(conn)
+            self._total += 1
+            self._ociosas.append(conn)
+
+    def _registrar_criacao(self, conn):
+        """Anota a idade da conexão nova (chamado com o lock)."""
+        self._criada_em[id(conn)] = time.monotonic()
+        self.conexoes_criadas += 1
+
+    def getconn(self):
+        """Empresta uma conexão, esperando até timeout_checkout segundos por uma livre."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout_checkout
+        conn = None
+        with self._cond:
+            self._aguardando += 1
+            try:
+                while True:
+                    if self.closed:
+                        raise PoolError("connection pool is closed")
+                    if self._ociosas:
+                        conn = self._ociosas.pop()
+                        if conn.closed:
+                            # Conexão que caiu enquanto estava ociosa
+                            self._descartar(conn)
+                            conn = None
+                            continue
+                        break
+                    if self._total < self.maxconn:
+                        # Reserva a vaga; a conexão é aberta fora do lock
+                        self._total += 1
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self.falhas_checkout += 1
+                        self._falhas_janela += 1
+                        raise PoolEsgotado(f"connection pool exhausted ({self.maxconn} em uso, "
+                                        f"espera de {self.timeout_checkout}s esgotada)")
+                    self._cond.wait(restante)
+            finally:
+                self._aguardando -= 1
+
+        nova = conn is None
+        if nova:
+            try:
+                conn = self._conectar()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self.falhas_conexao += 1
+                    self._cond.notify()
+                raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            if nova:
+                self._registrar_criacao(conn)
+            self._em_uso[id(conn)] = conn
+            self._registrar_espera(espera)
+            fechar = self._ajustar() if self.adaptativo else []
+        for ociosa in fechar:
+            ociosa.close()
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Devolve a conexão (transação aberta é desfeita; conexão quebrada é descartada)."""
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._cond:
+            if self._em_uso.pop(id(conn), None) is None:
+                raise PoolError("trying to put unkeyed connection")
+            if close or conn.closed or self.closed or self._total > self.maxconn:
+                self._descartar(conn)
+            else:
+                self._ociosas.append(conn)
+                conn = None
+            self._cond.notify()
+        if conn is not None and not conn.closed:
+            conn.close()
+
+    def _descartar(self, conn):
+        """Tira a conexão da contagem (chamado com o lock)."""
+        self._total -= 1
+        self._criada_em.pop(id(conn), None)
+        self.conexoes_descartadas += 1
+
+    def _registrar_espera(self, espera):
+        self.checkouts += 1
+        self._espera_total += espera
+        if espera > self._espera_maxima:
+            self._espera_maxima = espera
+        espera_ms = espera * 1000
+        faixa = len(FAIXAS_ESPERA_MS)
+        for indice, limite in enumerate(FAIXAS_ESPERA_MS):
+            if espera_ms <= limite:
+                faixa = indice
+                break
+        self._histograma[faixa] += 1
+        em_uso = len(self._em_uso)
+        self._pico_em_uso = max(self._pico_em_uso, em_uso)
+        self._pico_janela = max(self._pico_janela, em_uso)
+        if self.adaptativo:
+            self._esperas_janela.append(espera)
+
+    def _ajustar(self):
+        """
+        Modo adaptativo (chamado com o lock): reavalia o máximo do pool uma vez por intervalo.
+        Retorna as conexões ociosas que sobraram e devem ser fechadas fora do lock.
+        """
+        agora = time.monotonic()
+        if agora - self._ultimo_ajuste < self.intervalo_ajuste:
+            return []
+        esperas, falhas, pico = self._esperas_janela, self._falhas_janela, self._pico_janela
+        self._esperas_janela, self._falhas_janela, self._pico_janela = [], 0, 0
+        self._ultimo_ajuste = agora
+        if not esperas:
+            return []
+
+        esperas.sort()
+        p95 = esperas[max(0, int(len(esperas) * 0.95) - 1)]
+        fechar = []
+        if (falhas or p95 > self.espera_alvo) and self.maxconn < self.limite_max:
+            novo = min(self.limite_max, self.maxconn + max(1, self.maxconn // 4))
+            print(f"POOL: espera p95 {p95 * 1000:.1f} ms, {falhas} falhas; máximo {self.maxconn} -> {novo}")
+            self.maxconn = novo
+            self.ajustes += 1
+            self._cond.notify_all()
+        elif p95 <= self.espera_alvo and pico < self.maxconn // 2 and self.maxconn > max(1, self.minconn):
+            novo = max(1, self.minconn, self.maxconn - 1)
+            print(f"POOL: pico de uso {pico}; máximo {self.maxconn} -> {novo}")
+            self.maxconn = novo
+            self.ajustes += 1
+            while self._total > self.maxconn and self._ociosas:
+                conn = self._ociosas.pop(0)
+                self._descartar(conn)
+                fechar.append(conn)
+        return fechar
+
+    def closeall(self):
+        """Fecha todas as conexões do pool."""
+        with self._cond:
+            if self.closed:
+                raise PoolError("connection pool is closed")
+            self.closed = True
+            conexoes = self._ociosas + list(self._em_uso.values())
+            self._ociosas = []
+            self._cond.notify_all()
+        for conn in conexoes:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do pool."""
+        with self._cond:
+            agora = time.monotonic()
+            idades = [agora - criada for criada in self._criada_em.values()]
+            rotulos = [f"<={limite}ms" for limite in FAIXAS_ESPERA_MS] + [f">{FAIXAS_ESPERA_MS[-1]}ms"]
+            return {
+                "em_uso": len(self._em_uso),
+                "ociosas": len(self._ociosas),
+                "total": self._total,
+                "minimo": self.minconn,
+                "maximo": self.maxconn,
+                "limite_max": self.limite_max,
+                "adaptativo": self.adaptativo,
+                "aguardando": self._aguardando,
+                "pico_em_uso": self._pico_em_uso,
+                "checkouts": self.checkouts,
+                "falhas_checkout": self.falhas_checkout,
+                "falhas_conexao": self.falhas_conexao,
+                "conexoes_criadas": self.conexoes_criadas,
+                "conexoes_descartadas": self.conexoes_descartadas,
+                "ajustes": self.ajustes,
+                "espera_media_ms": round(self._espera_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "espera_maxima_ms": round(self._espera_maxima * 1000, 3),
+                # Lista de pares (e não dict) para manter a ordem das faixas no JSON
+                "espera_histograma": [[rotulo, n] for rotulo, n in zip(rotulos, self._histograma)],
+                "idade_media_s": round(sum(idades) / len(idades), 1) if idades else 0.0,
+                "idade_maxima_s": round(max(idades), 1) if idades else 0.0
+            }
@@ -0,0 +1,175 @@
+"""
+Roteamento das consultas analíticas para uma réplica de leitura
+Farm Tech Solutions - FIAP Fase 4 Cap 1
+
+/get_data, /stats, /integrated_data e as leituras pesadas do dashboard
+(ML, exportação para o R) rodavam no mesmo PostgreSQL que recebe as
+gravações dos ESP32. Com POSTGRES_REPLICA_DSN configurado essas consultas
+vão para a réplica (hot standby ou qualquer cópia somente leitura) e a
+ingestão continua no primário.
+
+A réplica só é usada enquanto o atraso de replicação medido nela fica
+dentro de REPLICA_ATRASO_MAX_S. O atraso é medido no máximo uma vez a cada
+`intervalo_verificacao` segundos; réplica atrasada, fora do ar ou com o
+pool esgotado faz a consulta cair no primário (nunca em erro).
+"""
+
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+from .pool_conexoes import PoolConexoes
+
+# Atraso de replay da réplica em segundos. Sem WAL pendente o atraso é 0, mas só com o
+# receptor de WAL em streaming: com o primário ou a rede fora o receptor desconecta, nada
+# chega e receive = replay também, com a réplica parada no passado. Fora do streaming vale
+# o tempo desde a última transação aplicada (primário sem gravações também desvia); sem
+# nenhuma aplicada o atraso é desconhecido (NULL) e a consulta vai ao primário. O status
+# do receptor só é visível com pg_read_all_stats (sem ele vale sempre o tempo).
+# Num servidor que não está em recovery (cópia lógica, banco de teste) não há o que medir.
+SQL_ATRASO_REPLICA = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming')
+             AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def medir_atraso(cursor):
+    """Atraso de replicação (s) do servidor do cursor, ou None se não dá para saber."""
+    cursor.execute(SQL_ATRASO_REPLICA)
+    atraso = cursor.fetchone()[0]
+    return float(atraso) if atraso is not None else None
+
+
+class RoteadorLeitura:
+    """
+    Pool de conexões da réplica com verificação de atraso.
+
+    conectar: função sem argumentos que abre uma conexão com a réplica.
+    """
+
+    def __init__(self, conectar, atraso_max_s=5.0, intervalo_verificacao=2.0, minconn=0, maxconn=5,
+                 timeout_checkout=0.5, intervalo_tentativa=5.0):
+        self._conectar = conectar
+        self.atraso_max = atraso_max_s
+        self.intervalo_verificacao = intervalo_verificacao
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout_checkout = timeout_checkout
+        self.intervalo_tentativa = intervalo_tentativa
+        self._pool = None
+        self._pid_pool = None
+        self._lock = threading.Lock()
+        self._ultima_tentativa = 0.0
+        self._atraso = None            # Última medição (None = réplica inacessível ou atraso desconhecido)
+        self._verificado_em = 0.0
+        self._suspensa_ate = 0.0       # Depois de uma falha de conexão a réplica fica de fora um tempo
+
+        # Contadores
+        self.consultas_replica = 0
+        self.desvios_atraso = 0        # Réplica atrasada além do limite
+        self.desvios_indisponivel = 0  # Réplica fora do ar ou pool esgotado
+
+    def _garantir_pool(self):
+        """Pool da réplica deste processo, criado sob demanda (mesma regra do pool do primário)."""
+        if self._pool is not None and self._pid_pool == os.getpid():
+            return True
+        with self._lock:
+            if self._pool is not None and self._pid_pool == os.getpid():
+                return True
+            self._pool = None
+            agora = time.monotonic()
+            if agora - self._ultima_tentativa < self.intervalo_tentativa:
+                return False
+            self._ultima_tentativa = agora
+            try:
+                self._pool = PoolConexoes(self.minconn, self.maxconn, self._conectar,
+                                          timeout_checkout=self.timeout_checkout)
+                self._pid_pool = os.getpid()
+                print(f"Pool da réplica de leitura inicializado ({self.minconn}-{self.maxconn} conexões, "
+                      f"atraso máximo {self.atraso_max}s, pid {self._pid_pool})")
+                return True
+            except psycopg2.Error as e:
+                print(f"Réplica de leitura indisponível: {e}")
+                return False
+
+    def _atualizar_atraso(self, cursor):
+        """Mede o atraso se a última medição venceu (no máximo uma consulta extra por intervalo)."""
+        agora = time.monotonic()
+        if agora - self._verificado_em < self.intervalo_verificacao:
+            return
+        self._verificado_em = agora
+        try:
+            self._atraso = medir_atraso(cursor)
+        except psycopg2.Error as e:
+            print(f"Erro ao medir atraso da réplica: {e}")
+            self._atraso = None
+
+    def obter(self):
+        """Conexão da réplica (autocommit, somente leitura) ou None se a consulta deve ir ao primário."""
+        if time.monotonic() < self._suspensa_ate or not self._garantir_pool():
+            self.desvios_indisponivel += 1
+            return None
+        try:
+            conn = self._pool.getconn()
+        except PoolError as e:
+            print(f"Réplica de leitura sem conexão livre: {e}")
+            self.desvios_indisponivel += 1
+            return None
+        except psycopg2.Error as e:
+            # Não tenta de novo a cada consulta: cada tentativa custaria um timeout de conexão
+            print(f"Réplica de leitura indisponível por {self.intervalo_tentativa}s: {e}")
+            self._suspensa_ate = time.monotonic() + self.intervalo_tentativa
+            self._atraso = None
+            self.desvios_indisponivel += 1
+            return None
+
+        cursor = conn.cursor()
+        try:
+            self._atualizar_atraso(cursor)
+        finally:
+            cursor.close()
+
+        if self._atraso is None or conn.closed:
+            self.devolver(conn)
+            self.desvios_indisponivel += 1
+            return None
+        if self._atraso > self.atraso_max:
+            self.devolver(conn)
+            self.desvios_atraso += 1
+            return None
+        self.consultas_replica += 1
+        return conn
+
+    def devolver(self, conn):
+        """Devolve a conexão ao pool da réplica (conexões quebradas são descartadas)."""
+        if conn.closed:
+            # A réplica caiu no meio da consulta: a próxima chamada mede o atraso de novo
+            self._verificado_em = 0.0
+        if self._pool is not None and self._pid_pool == os.getpid():
+            self._pool.putconn(conn, close=bool(conn.closed))
+
+    def metricas(self):
+        """Retorna um dicionário com o estado atual do roteamento."""
+        pool = self._pool.metricas() if self._pool is not None and self._pid_pool == os.getpid() else None
+        return {
+            "atraso_s": round(self._atraso, 3) if self._atraso is not None else None,
+            "atraso_max_s": self.atraso_max,
+            "em_uso": self._atraso is not None and self._atraso <= self.atraso_max,
+            "consultas_replica": self.consultas_replica,
+            "desvios_atraso": self.desvios_atraso,
+            "desvios_indisponivel": self.desvios_indisponivel,
+            "pool": pool
+        }
+
+    def fechar(self):
+        """Fecha o pool da réplica (só o criado por este processo)."""
+        if self._pool is not None and not self._pool.closed and self._pid_pool == os.getpid():
+            self._pool.closeall()
+            print("Pool da réplica de leitura fechado")
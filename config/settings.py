@@ -23,15 +23,111 @@ class Settings:
     POSTGRES_USER = os.getenv('POSTGRES_USER', 'fiap')
     POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', 'fiap123456')
     POSTGRES_SCHEMA = os.getenv('POSTGRES_SCHEMA', 'Fase4Cap1')
+    POSTGRES_TIMEOUT_CONEXAO = int(os.getenv('POSTGRES_TIMEOUT_CONEXAO', '5'))  # Segundos (connect_timeout)
+    
+    # Disjuntor (circuit breaker): banco fora = falha imediata em vez de esperar o timeout
+    DISJUNTOR_ATIVO = os.getenv('DISJUNTOR_ATIVO', 'True').lower() == 'true'
+    DISJUNTOR_LIMITE_FALHAS = int(os.getenv('DISJUNTOR_LIMITE_FALHAS', '3'))     # Falhas seguidas para abrir
+    DISJUNTOR_TEMPO_ABERTO = float(os.getenv('DISJUNTOR_TEMPO_ABERTO', '5.0'))   # Segundos entre sondas
+    
+    # Réplica somente leitura para as consultas analíticas (vazio = tudo no primário)
+    POSTGRES_REPLICA_DSN = os.getenv('POSTGRES_REPLICA_DSN', '')              # 'host=... port=...' ou URL
+    REPLICA_ATRASO_MAX_S = float(os.getenv('REPLICA_ATRASO_MAX_S', '5.0'))     # Mais atrasada que isso: primário
+    REPLICA_INTERVALO_VERIFICACAO = float(os.getenv('REPLICA_INTERVALO_VERIFICACAO', '2.0'))  # Medição do atraso
+    REPLICA_POOL_MAX_CONEXOES = int(os.getenv('REPLICA_POOL_MAX_CONEXOES', '5'))  # Por processo
+    REPLICA_TIMEOUT_CONEXAO = int(os.getenv('REPLICA_TIMEOUT_CONEXAO', '2'))   # Segundos (connect_timeout)
     
     # Configurações do Flask
     FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
     FLASK_PORT = int(os.getenv('FLASK_PORT', '8000'))
     FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
+    # Pool de conexões do serve.py (por processo)
+    POOL_MIN_CONEXOES = int(os.getenv('POOL_MIN_CONEXOES', '2'))
+    POOL_MAX_CONEXOES = int(os.getenv('POOL_MAX_CONEXOES', '10'))
+    POOL_TIMEOUT_CHECKOUT = float(os.getenv('POOL_TIMEOUT_CHECKOUT', '2.0'))  # Espera máxima por conexão livre
+    POOL_ADAPTATIVO = os.getenv('POOL_ADAPTATIVO', 'False').lower() == 'true'  # Ajusta o máximo pela espera
+    POOL_ADAPTATIVO_MAX = int(os.getenv('POOL_ADAPTATIVO_MAX', '30'))      # Teto do modo adaptativo
+    POOL_ESPERA_ALVO_MS = float(os.getenv('POOL_ESPERA_ALVO_MS', '5'))     # p95 de espera acima disso faz crescer
+    CONSULTAS_PREPARADAS = os.getenv('CONSULTAS_PREPARADAS', 'True').lower() == 'true'  # PREPARE por conexão
+    
+    # Modo de produção multi-processo (servidor_producao.py)
+    PRODUCAO_WORKERS = int(os.getenv('PRODUCAO_WORKERS', str(os.cpu_count() or 1)))  # Processos
+    PRODUCAO_THREADS = int(os.getenv('PRODUCAO_THREADS', '8'))            # Threads por processo
+    PRODUCAO_CONEXOES_TOTAL = int(os.getenv('PRODUCAO_CONEXOES_TOTAL', '40'))  # Orçamento global no PostgreSQL
+    PRODUCAO_KEEPALIVE = int(os.getenv('PRODUCAO_KEEPALIVE', '5'))        # Segundos de keep-alive HTTP
+    PRODUCAO_TIMEOUT = int(os.getenv('PRODUCAO_TIMEOUT', '30'))           # Worker travado é reiniciado
+    
+    # Paginação do /get_data (keyset: custo constante, independente do tamanho da tabela)
+    GET_DATA_LIMITE_PADRAO = int(os.getenv('GET_DATA_LIMITE_PADRAO', '100'))  # Leituras por página sem ?limit=
+    GET_DATA_LIMITE_MAX = int(os.getenv('GET_DATA_LIMITE_MAX', '1000'))       # Maior ?limit= aceito
+    
+    # /series (baldes de tempo agregados no banco + LTTB opcional)
+    SERIES_PERIODO_PADRAO_H = float(os.getenv('SERIES_PERIODO_PADRAO_H', '24'))  # Intervalo sem ?since=
+    SERIES_BALDES_AUTO = int(os.getenv('SERIES_BALDES_AUTO', '1000'))    # Baldes quando ?bucket= não é informado
+    SERIES_BALDES_MAX = int(os.getenv('SERIES_BALDES_MAX', '20000'))     # Maior número de baldes aceito
+    
+    # /export e exportação do dashboard (cursor server-side, NDJSON/CSV em streaming)
+    EXPORTACAO_TAMANHO_BLOCO = int(os.getenv('EXPORTACAO_TAMANHO_BLOCO', '5000'))  # Linhas por round-trip
+    
+    # Cache de respostas (ETag/304) de /get_data, /stats e /integrated_data
+    CACHE_RESPOSTAS_ATIVO = os.getenv('CACHE_RESPOSTAS_ATIVO', 'True').lower() == 'true'
+    CACHE_RESPOSTAS_CAPACIDADE = int(os.getenv('CACHE_RESPOSTAS_CAPACIDADE', '256'))  # Respostas por processo
+    CACHE_RESPOSTAS_VALIDADE_S = float(os.getenv('CACHE_RESPOSTAS_VALIDADE_S', '30'))  # Idade máxima de uma entrada
+    
+    # /status em memória (sem consultar o banco a cada chamada)
+    STATUS_INTERVALO_ATUALIZACAO = float(os.getenv('STATUS_INTERVALO_ATUALIZACAO', '15.0'))  # Estimativas do catálogo
+    STATUS_MAX_DISPOSITIVOS = int(os.getenv('STATUS_MAX_DISPOSITIVOS', '10000'))  # Últimas leituras em memória
+    
     # Configurações do ESP32
     ESP32_SERVERS = os.getenv('ESP32_SERVERS', '192.168.0.12:8000,192.168.2.126:8000').split(',')
     
+    # Configurações da fila de ingestão (write-behind) do /data
+    INGESTAO_FILA_ATIVA = os.getenv('INGESTAO_FILA_ATIVA', 'True').lower() == 'true'
+    INGESTAO_LOTE_MAX = int(os.getenv('INGESTAO_LOTE_MAX', '500'))          # Leituras por lote
+    INGESTAO_JANELA_MS = int(os.getenv('INGESTAO_JANELA_MS', '20'))         # Janela de agrupamento
+    INGESTAO_MODO_ACK = os.getenv('INGESTAO_MODO_ACK', 'commit')            # 'fila' ou 'commit'
+    INGESTAO_METODO = os.getenv('INGESTAO_METODO', 'values')                # 'values' ou 'copy'
+    INGESTAO_CAPACIDADE = int(os.getenv('INGESTAO_CAPACIDADE', '10000'))    # Máximo de leituras pendentes
+    INGESTAO_BATCH_MAX_ITENS = int(os.getenv('INGESTAO_BATCH_MAX_ITENS', '5000'))  # Limite do /data/batch
+    INGESTAO_FANOUT = os.getenv('INGESTAO_FANOUT', 'False').lower() == 'true'  # 3 tabelas em um round-trip
+    INGESTAO_PARTICOES = int(os.getenv('INGESTAO_PARTICOES', '4'))     # Filas por grupo de dispositivos
+    INGESTAO_GRUPO_COMMIT = os.getenv('INGESTAO_GRUPO_COMMIT', 'True').lower() == 'true'  # Commit compartilhado
+    INGESTAO_GRUPO_JANELA_MS = int(os.getenv('INGESTAO_GRUPO_JANELA_MS', '2'))  # Espera do líder do grupo
+    INGESTAO_GRUPO_MAX = int(os.getenv('INGESTAO_GRUPO_MAX', '200'))          # Operações por commit
+    
+    # Configurações do pós-processamento meteorológico (executor limitado)
+    METEOROLOGIA_WORKERS = int(os.getenv('METEOROLOGIA_WORKERS', '4'))
+    METEOROLOGIA_FILA_MAX = int(os.getenv('METEOROLOGIA_FILA_MAX', '1000'))
+    METEOROLOGIA_POLITICA = os.getenv('METEOROLOGIA_POLITICA', 'descartar')   # 'descartar' ou 'bloquear'
+    METEOROLOGIA_TIMEOUT_BLOQUEIO = float(os.getenv('METEOROLOGIA_TIMEOUT_BLOQUEIO', '1.0'))
+    
+    # Identificação dos dispositivos e idempotência da ingestão
+    DEVICE_ID_PADRAO = os.getenv('DEVICE_ID_PADRAO', 'esp32')      # Usado quando a leitura não traz device_id
+    DEDUP_ATIVO = os.getenv('DEDUP_ATIVO', 'True').lower() == 'true'
+    DEDUP_CAPACIDADE = int(os.getenv('DEDUP_CAPACIDADE', '100000'))  # Chaves (device, timestamp) em memória
+    
+    # Controle de admissão (token buckets) da ingestão
+    LIMITE_ATIVO = os.getenv('LIMITE_ATIVO', 'True').lower() == 'true'
+    LIMITE_TAXA_DISPOSITIVO = float(os.getenv('LIMITE_TAXA_DISPOSITIVO', '2.0'))   # Requisições/s por device_id
+    LIMITE_RAJADA_DISPOSITIVO = int(os.getenv('LIMITE_RAJADA_DISPOSITIVO', '10'))
+    LIMITE_TAXA_GLOBAL = float(os.getenv('LIMITE_TAXA_GLOBAL', '1000.0'))          # Requisições/s no servidor
+    LIMITE_RAJADA_GLOBAL = int(os.getenv('LIMITE_RAJADA_GLOBAL', '2000'))
+    LIMITE_MAX_DISPOSITIVOS = int(os.getenv('LIMITE_MAX_DISPOSITIVOS', '10000'))   # Baldes mantidos em memória
+    
+    # Spool local quando o PostgreSQL está indisponível
+    SPOOL_ATIVO = os.getenv('SPOOL_ATIVO', 'True').lower() == 'true'
+    SPOOL_DIR = os.getenv('SPOOL_DIR', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Servidor_Local', 'spool'))
+    SPOOL_LOTE_REPLAY = int(os.getenv('SPOOL_LOTE_REPLAY', '5000'))           # Leituras por COPY no replay
+    SPOOL_INTERVALO_REPLAY = float(os.getenv('SPOOL_INTERVALO_REPLAY', '5.0'))  # Segundos entre tentativas
+    SPOOL_FSYNC = os.getenv('SPOOL_FSYNC', 'True').lower() == 'true'
+    
+    # Modo assíncrono (serve_async.py)
+    ASYNC_POOL_MIN = int(os.getenv('ASYNC_POOL_MIN', '2'))
+    ASYNC_POOL_MAX = int(os.getenv('ASYNC_POOL_MAX', '10'))
+    ASYNC_BACKLOG = int(os.getenv('ASYNC_BACKLOG', '4096'))        # Conexões aguardando accept()
+    
     # Configurações de logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'farm_tech.log')
@@ -58,8 +154,16 @@ class Settings:
         print("🔧 CONFIGURAÇÃO ATUAL:")
         print(f"   PostgreSQL: {cls.POSTGRES_USER}@{cls.POSTGRES_HOST}:{cls.POSTGRES_PORT}/{cls.POSTGRES_DB}")
         print(f"   Schema: {cls.POSTGRES_SCHEMA}")
+        print(f"   Réplica de leitura: {'configurada' if cls.POSTGRES_REPLICA_DSN else 'não configurada'}"
+              f"{f' (atraso máximo {cls.REPLICA_ATRASO_MAX_S}s)' if cls.POSTGRES_REPLICA_DSN else ''}")
         print(f"   Flask: {cls.FLASK_HOST}:{cls.FLASK_PORT} (Debug: {cls.FLASK_DEBUG})")
         print(f"   ESP32 Servers: {', '.join(cls.ESP32_SERVERS)}")
+        print(f"   Fila de ingestão: {'Ativa' if cls.INGESTAO_FILA_ATIVA else 'Desativada'} "
+              f"(lote {cls.INGESTAO_LOTE_MAX}, janela {cls.INGESTAO_JANELA_MS}ms, "
+              f"ack {cls.INGESTAO_MODO_ACK}, método {cls.INGESTAO_METODO}, "
+              f"{cls.INGESTAO_PARTICOES} partições)")
+        print(f"   Produção: {cls.PRODUCAO_WORKERS} processos x {cls.PRODUCAO_THREADS} threads, "
+              f"{cls.PRODUCAO_CONEXOES_TOTAL} conexões no total")
         print(f"   Log Level: {cls.LOG_LEVEL}")
 
 # Instância global das configurações
@@ -1,12 +1,16 @@
 import streamlit as st
 import requests
 import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
 import plotly.graph_objs as go
 import plotly.express as px
 from datetime import datetime
+import json
 import time
 import sys
 import os
+import threading
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.model_selection import train_test_split
@@ -19,7 +23,10 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
-from config.database_config import _config as DatabaseConfig, conectar_postgres
+from config.database_config import _config as DatabaseConfig, conectar_postgres, conectar_postgres_leitura
+from config.estatisticas_agregadas import ler_estatisticas, reconstruir_desatualizadas
+from config.exportacao import ler_em_blocos, cabecalho, serializar_bloco
+from config.settings import settings
 
 # Configuração da página
 st.set_page_config(
@@ -44,6 +51,15 @@ if 'rscript_path' not in st.session_state:
 
 # URL do servidor Flask local
 FLASK_SERVER_URL = "http://127.0.0.1:8000/get_data"
+FLASK_SERIES_URL = "http://127.0.0.1:8000/series"
+
+# Períodos dos gráficos de tendência (segundos); o /series devolve cada um já reduzido
+PERIODOS_TENDENCIA = {
+    "Última hora": 3600,
+    "Últimas 24 horas": 86400,
+    "Últimos 7 dias": 7 * 86400,
+    "Últimos 30 dias": 30 * 86400,
+}
 
 # === FUNÇÕES CRUD PARA STREAMLIT ===
 
@@ -311,28 +327,58 @@ def crud_remover_dados():
     except Exception as e:
         st.error(f"Erro ao buscar registros: {e}")
 
+@st.cache_resource
+def _trava_recalculo_estatisticas():
+    """Trava do processo (não de cada rerun) para não disparar dois recálculos ao mesmo tempo."""
+    return threading.Lock()
+
+def recalcular_estatisticas_background():
+    """Recalcula no primário, em uma thread, os dispositivos marcados por UPDATE/DELETE."""
+    trava = _trava_recalculo_estatisticas()
+    if not trava.acquire(blocking=False):
+        return
+    
+    def recalcular():
+        try:
+            conn, cursor = conectar_postgres()
+            if conn:
+                try:
+                    reconstruir_desatualizadas(cursor, DatabaseConfig.SCHEMA)
+                    conn.commit()
+                finally:
+                    cursor.close()
+                    conn.close()
+        except Exception as e:
+            print(f"Erro ao recalcular estatísticas: {e}")
+        finally:
+            trava.release()
+    
+    threading.Thread(target=recalcular, name="recalculo-estatisticas", daemon=True).start()
+
 def crud_estatisticas():
     """Interface Streamlit para mostrar estatísticas"""
     st.subheader("Estatísticas dos Dados")
     
     try:
-        conn, cursor = conectar_postgres()
+        # Resumo mantido na ingestão (config/estatisticas_agregadas.py): não varre a tabela
+        conn, cursor = conectar_postgres_leitura()
         if conn:
-            cursor.execute(f"""
-                SELECT 
-                    COUNT(*) as total_registros,
-                    AVG(umidade) as umidade_media,
-                    MIN(umidade) as umidade_min,
-                    MAX(umidade) as umidade_max,
-                    AVG(temperatura) as temp_media,
-                    MIN(temperatura) as temp_min,
-                    MAX(temperatura) as temp_max,
-                    AVG(ph) as ph_medio,
-                    MIN(ph) as ph_min,
-                    MAX(ph) as ph_max
-                FROM {DatabaseConfig.SCHEMA}.leituras_sensores
-            """)
-            stats = cursor.fetchone()
+            estatisticas, desatualizado = ler_estatisticas(cursor, DatabaseConfig.SCHEMA, 'leituras_sensores')
+            if desatualizado:
+                # Registros alterados/removidos pelo CRUD: mostra o resumo anterior e recalcula em background
+                recalcular_estatisticas_background()
+                st.info("Há registros alterados ou removidos ainda não recalculados: "
+                        "os valores abaixo são os anteriores e serão atualizados em instantes.")
+            
+            def valor(coluna, campo):
+                return float(estatisticas.get(coluna, {}).get(campo) or 0)
+            
+            stats = (
+                estatisticas.get('*', {}).get('n', 0),
+                valor('umidade', 'media'), valor('umidade', 'minimo'), valor('umidade', 'maximo'),
+                valor('temperatura', 'media'), valor('temperatura', 'minimo'), valor('temperatura', 'maximo'),
+                valor('ph', 'media'), valor('ph', 'minimo'), valor('ph', 'maximo')
+            )
             
             if stats and stats[0] > 0:
                 # Métricas principais
@@ -435,37 +481,44 @@ def crud_consulta_umidade():
 # === FUNÇÕES PARA ANÁLISE ESTATÍSTICA COM R ===
 
 def exportar_dados_para_r():
-    """Exporta dados do PostgreSQL para CSV que será usado pelo R"""
+    """
+    Exporta dados do PostgreSQL para CSV que será usado pelo R.
+    Lê por um cursor server-side e grava bloco a bloco (config/exportacao.py): a memória
+    não cresce com o histórico. O CSV novo só substitui o anterior quando termina.
+    """
     try:
-        conn, cursor = conectar_postgres()
+        # Leitura pesada: réplica de leitura quando configurada (não disputa com a ingestão)
+        conn, cursor = conectar_postgres_leitura()
         if conn:
-            # Query para buscar todos os dados necessários para análise
-            cursor.execute(f"""
-                SELECT data_hora_leitura as timestamp, umidade, temperatura, ph, fosforo, potassio, bomba_dagua 
-                FROM {DatabaseConfig.SCHEMA}.leituras_sensores 
-                ORDER BY data_hora_leitura
-            """)
-            rows = cursor.fetchall()
-            
-            if rows:
-                # Converte para DataFrame
-                df = pd.DataFrame(rows, columns=[
-                    'timestamp', 'umidade', 'temperatura', 'ph', 'fosforo', 'potassio', 'bomba_dagua'
-                ])
-                
-                # Salva no diretório de análise estatística
-                output_path = os.path.join(parent_dir, 'analise_estatistica', 'leituras_sensores.csv')
-                df.to_csv(output_path, index=False)
+            colunas = ('timestamp', 'umidade', 'temperatura', 'ph', 'fosforo', 'potassio', 'bomba_dagua')
+            output_path = os.path.join(parent_dir, 'analise_estatistica', 'leituras_sensores.csv')
+            temporario = output_path + '.parcial'
+            total = 0
+            try:
+                with open(temporario, 'wb') as arquivo:
+                    arquivo.write(cabecalho('csv', colunas))
+                    for linhas in ler_em_blocos(conn, f"""
+                        SELECT data_hora_leitura as timestamp, umidade, temperatura, ph, fosforo, potassio, bomba_dagua 
+                        FROM {DatabaseConfig.SCHEMA}.leituras_sensores 
+                        ORDER BY data_hora_leitura
+                    """, tamanho_bloco=settings.EXPORTACAO_TAMANHO_BLOCO):
+                        arquivo.write(serializar_bloco('csv', colunas, linhas))
+                        total += len(linhas)
                 
-                st.success(f"Dados exportados com sucesso! {len(rows)} registros salvos em:")
-                st.code(output_path)
-                return True
-            else:
-                st.warning("Nenhum dado encontrado para exportar")
-                return False
-            
-            cursor.close()
-            conn.close()
+                if total:
+                    # Salva no diretório de análise estatística
+                    os.replace(temporario, output_path)
+                    st.success(f"Dados exportados com sucesso! {total} registros salvos em:")
+                    st.code(output_path)
+                    return True
+                else:
+                    st.warning("Nenhum dado encontrado para exportar")
+                    return False
+            finally:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                cursor.close()
+                conn.close()
     except Exception as e:
         st.error(f"Erro ao exportar dados: {e}")
         return False
@@ -951,7 +1004,8 @@ def pagina_crud():
 def preparar_dados_ml():
     """Prepara dados do banco para Machine Learning com dados meteorológicos"""
     try:
-        conn, cursor = conectar_postgres()
+        # Leitura pesada: réplica de leitura quando configurada (não disputa com a ingestão)
+        conn, cursor = conectar_postgres_leitura()
         if conn:
             # Primeiro tenta usar dados integrados (com meteorologia)
             cursor.execute(f"""
@@ -1850,13 +1904,27 @@ def get_clima_atual():
 # --- Função para obter os dados do Flask ---
 @st.cache_data(ttl=2)  # Cache por 2 segundos para refresh mais rápido
 def get_sensor_data():
-    """Obtém dados dos sensores do servidor Flask"""
+    """
+    Obtém dados dos sensores do servidor Flask: o envelope do /get_data com 'dados' já em DataFrame.
+    A página vem em colunas (?format=arrow; servidor sem pyarrow responde 400 e ela vem em JSON
+    colunar), então o DataFrame é montado direto dos arrays, sem um dict por leitura.
+    """
     try:
-        response = requests.get(FLASK_SERVER_URL, timeout=5)
+        # Uma página com as leituras mais recentes (o /get_data não devolve mais a tabela inteira)
+        response = requests.get(FLASK_SERVER_URL, params={'limit': 200, 'format': 'arrow'}, timeout=5)
+        if response.status_code == 400:
+            response = requests.get(FLASK_SERVER_URL, params={'limit': 200, 'format': 'columns'}, timeout=5)
         response.raise_for_status()
-        data = response.json()
         
-        if 'dados' in data and data['dados']:
+        if response.headers.get('Content-Type', '').startswith('application/vnd.apache.arrow.stream'):
+            tabela = pa.ipc.open_stream(response.content).read_all()
+            data = {chave.decode(): json.loads(valor) for chave, valor in (tabela.schema.metadata or {}).items()}
+            data['dados'] = tabela.to_pandas()
+        else:
+            data = response.json()
+            data['dados'] = pd.DataFrame(data['dados'], columns=data['colunas'])
+        
+        if not data['dados'].empty:
             return data
         else:
             return None
@@ -1865,6 +1933,31 @@ def get_sensor_data():
         st.error(f"Erro ao conectar com o servidor Flask: {e}")
         return None
 
+def get_sensor_series(periodo_s, pontos=300):
+    """
+    Séries de umidade, temperatura e pH do período, agregadas em baldes de tempo pelo servidor
+    e reduzidas a no máximo `pontos` pontos (LTTB). Retorna {métrica: DataFrame} ou None.
+    """
+    ate = pd.Timestamp.now(tz='UTC')
+    desde = ate - pd.Timedelta(seconds=periodo_s)
+    try:
+        response = requests.get(FLASK_SERIES_URL, params={
+            'since': desde.isoformat(), 'until': ate.isoformat(), 'points': pontos,
+            'metrics': 'umidade,temperatura,ph'
+        }, timeout=10)
+        response.raise_for_status()
+        series = response.json().get('series', {})
+    except requests.exceptions.RequestException as e:
+        st.error(f"Erro ao buscar séries do servidor Flask: {e}")
+        return None
+    
+    resultado = {}
+    for metrica, serie in series.items():
+        df_serie = pd.DataFrame(serie['pontos'], columns=['data_hora_leitura', metrica])
+        df_serie['data_hora_leitura'] = pd.to_datetime(df_serie['data_hora_leitura'])
+        resultado[metrica] = df_serie
+    return resultado
+
 def init_session_state():
     """Inicializa as variáveis do session_state"""
     if 'current_page' not in st.session_state:
@@ -1974,12 +2067,12 @@ def main():
     # Obtém dados dos sensores
     sensor_data = get_sensor_data()
     
-    if sensor_data and sensor_data.get('dados'):
+    if sensor_data:
         # Status de conexão
         status_placeholder.success(f"Conectado - {sensor_data.get('total_registros', 0)} registros")
         
         # Converte para DataFrame
-        df = pd.DataFrame(sensor_data['dados'])
+        df = sensor_data['dados']
         
         # Processa timestamps com diferentes formatos
         if 'data_hora_leitura' in df.columns:
@@ -2086,27 +2179,21 @@ def main():
             # === SEÇÃO 3: GRÁFICOS ===
             st.header("Tendências")
             
-            if len(df) > 1:
-                # Prepara dados para gráficos (últimos 20 registros)
-                df_plot = df.head(20).copy()
-                
-                # Converte colunas numéricas para garantir que sejam números
-                for col in ['umidade', 'temperatura', 'ph']:
-                    if col in df_plot.columns:
-                        df_plot[col] = pd.to_numeric(df_plot[col], errors='coerce')
-                
-                # Remove linhas com valores NaN
-                df_plot = df_plot.dropna(subset=['data_hora_leitura'])
-                df_plot = df_plot.sort_values('data_hora_leitura')
+            periodo = st.selectbox("Período", list(PERIODOS_TENDENCIA), index=1)
+            series = get_sensor_series(PERIODOS_TENDENCIA[periodo])
+            
+            if series is not None:
+                # Séries já agregadas pelo servidor (/series): poucos pontos, qualquer que seja o período
+                graficos_vazios = all(serie.empty for serie in series.values())
                 
-                if not df_plot.empty:
+                if not graficos_vazios:
                     col1, col2 = st.columns(2)
                     
                     with col1:
                         # Gráfico de Umidade
-                        if 'umidade' in df_plot.columns:
+                        if 'umidade' in series:
                             fig_umidade = px.line(
-                                df_plot, 
+                                series['umidade'], 
                                 x='data_hora_leitura', 
                                 y='umidade',
                                 title='Umidade do Solo',
@@ -2117,9 +2204,9 @@ def main():
                     
                     with col2:
                         # Gráfico de Temperatura
-                        if 'temperatura' in df_plot.columns:
+                        if 'temperatura' in series:
                             fig_temperatura = px.line(
-                                df_plot, 
+                                series['temperatura'], 
                                 x='data_hora_leitura', 
                                 y='temperatura',
                                 title='Temperatura do Solo',
@@ -2129,9 +2216,9 @@ def main():
                             st.plotly_chart(fig_temperatura, use_container_width=True)
                     
                     # Gráfico de pH
-                    if 'ph' in df_plot.columns:
+                    if 'ph' in series:
                         fig_ph = px.line(
-                            df_plot, 
+                            series['ph'], 
                             x='data_hora_leitura', 
                             y='ph',
                             title='Nível de pH',
@@ -2208,11 +2295,11 @@ def main():
                 height=400
             )
         else:
-            if sensor_data and sensor_data.get('dados'):
+            if sensor_data:
                 st.warning("Nenhum dado encontrado")
     
     # Mensagem de erro de conexão
-    if not sensor_data or not sensor_data.get('dados'):
+    if not sensor_data:
         status_placeholder.error("Erro ao conectar com o servidor ou sem dados")
         st.error("Verifique se o servidor Flask está rodando em http://127.0.0.1:8000")
     
@@ -137,6 +137,36 @@ const char* servidores[] = {
 };
 const uint8_t NUM_SERVIDORES = sizeof(servidores) / sizeof(servidores[0]);
 
+// --- Protocolo binário compacto (POST /data/bin) ---
+// OTIMIZAÇÃO: 13 bytes por leitura em vez de ~150 caracteres de query string
+// Layout little-endian: uint16 device_id | uint32 epoch UTC | int16 umidade*10 |
+//                       int16 temperatura*10 | int16 ph*100 | uint8 flags (bit0 P, bit1 K, bit2 bomba)
+#define USAR_PROTOCOLO_BINARIO 0      // 1 = envia registro binário, 0 = query string no GET /data
+const uint16_t DEVICE_ID = 1;         // Identificador deste ESP32 (device_id no GET /data e no /data/bin)
+const uint8_t TAMANHO_REGISTRO = 13;
+
+// --- Monta o registro binário de uma leitura ---
+void montarRegistroBinario(uint8_t* registro, float t, float h, uint8_t phValue, bool fosforo, bool potassio, bool bomba) {
+  uint32_t epoch = (uint32_t) time(nullptr);
+  int16_t umidade = (int16_t) lroundf(h * 10.0f);
+  int16_t temperatura = (int16_t) lroundf(t * 10.0f);
+  int16_t ph = (int16_t) (phValue * 100);
+
+  // Escrita byte a byte: layout independente de alinhamento/padding do compilador
+  registro[0] = DEVICE_ID & 0xFF;
+  registro[1] = DEVICE_ID >> 8;
+  for (uint8_t i = 0; i < 4; i++) {
+    registro[2 + i] = (epoch >> (8 * i)) & 0xFF;
+  }
+  registro[6] = umidade & 0xFF;
+  registro[7] = (umidade >> 8) & 0xFF;
+  registro[8] = temperatura & 0xFF;
+  registro[9] = (temperatura >> 8) & 0xFF;
+  registro[10] = ph & 0xFF;
+  registro[11] = (ph >> 8) & 0xFF;
+  registro[12] = (fosforo ? 0x01 : 0) | (potassio ? 0x02 : 0) | (bomba ? 0x04 : 0);
+}
+
 // --- Função para enviar dados ao servidor ---
 void enviarDadosServidor(float t, float h, uint8_t phValue, const char* fosforo, const char* potassio, const char* releStatus) {
   if (millis() - ultimoEnvioHTTP >= INTERVALO_HTTP) {
@@ -160,12 +190,22 @@ void enviarDadosServidor(float t, float h, uint8_t phValue, const char* fosforo,
     // Obtém timestamp atual para esta leitura
     String timestamp = obterTimestamp();
     
+#if USAR_PROTOCOLO_BINARIO
+    uint8_t registro[TAMANHO_REGISTRO];
+    montarRegistroBinario(registro, t, h, phValue, fosforo == STR_PRESENTE, potassio == STR_PRESENTE, releStatus == STR_ON);
+#endif
+
     for (uint8_t i = 0; i < NUM_SERVIDORES && !envioSucesso; i++) {
+#if USAR_PROTOCOLO_BINARIO
+      char urlBuffer[48];
+      snprintf(urlBuffer, sizeof(urlBuffer), "http://%s/data/bin", servidores[i]);
+#else
       // OTIMIZAÇÃO: Usando snprintf em vez de concatenação de String para economizar heap
       char urlBuffer[300]; // Buffer aumentado para incluir timestamp
       snprintf(urlBuffer, sizeof(urlBuffer), 
-               "http://%s/data?timestamp=%s&umidade=%.1f&temperatura=%.1f&ph=%d&fosforo=%s&potassio=%s&rele=%s",
-               servidores[i], timestamp.c_str(), h, t, phValue, fosforo, potassio, releStatus);
+               "http://%s/data?device_id=%u&timestamp=%s&umidade=%.1f&temperatura=%.1f&ph=%d&fosforo=%s&potassio=%s&rele=%s",
+               servidores[i], DEVICE_ID, timestamp.c_str(), h, t, phValue, fosforo, potassio, releStatus);
+#endif
 
       Serial.print("Tentando servidor [");
       Serial.print(i + 1);
@@ -179,7 +219,12 @@ void enviarDadosServidor(float t, float h, uint8_t phValue, const char* fosforo,
       // OTIMIZAÇÃO: Reutiliza a conexão HTTP
       http.begin(httpClient, urlBuffer);
       
+#if USAR_PROTOCOLO_BINARIO
+      http.addHeader("Content-Type", "application/octet-stream");
+      int httpResponseCode = http.POST(registro, TAMANHO_REGISTRO);
+#else
       int httpResponseCode = http.GET();
+#endif
 
       if (httpResponseCode > 0) {
         // OTIMIZAÇÃO: Não lê a resposta completa se não for necessário